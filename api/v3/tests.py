@@ -1,4 +1,6 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from core.tasks import save_query_with_metadata
@@ -62,6 +64,21 @@ class TestTailoredSkillsViewSet:
     def test_tailoredskillsviewset_has_correct_data_format(self, response):
         assert "application/json" in str(response)
 
+    def test_tailoredskillsviewset_does_not_load_vacancy_content(self, client, monkeypatch, fetched_columns):
+        monkeypatch.setattr(save_query_with_metadata, "delay", lambda query, user_agent, ip_address: None)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path=self.url, data={"q": "python", "limit": 5}, secure=True)
+        assert response.status_code == 200
+        assert len(context.captured_queries) == 2
+        assert not {"content", "search_vector"} & set(fetched_columns)
+
+    def test_tailoredskillsviewset_without_query(self, client, monkeypatch):
+        monkeypatch.setattr(save_query_with_metadata, "delay", lambda query, user_agent, ip_address: None)
+        response = client.get(path=self.url, data={"format": "json"}, secure=True)
+        assert response.status_code == 200
+        assert response.json()["number_of_vacancies"] == 0
+        assert response.json()["rated_skills"] == []
+
 
 @pytest.mark.django_db
 class TestTailoredVacanciesViewSet:
@@ -88,3 +105,16 @@ class TestTailoredVacanciesViewSet:
             response = client.post(path=self.url, data={"file": resume}, secure=True)
         assert response.status_code == 200
         assert response.json() == []
+
+    def test_tailoredvacanciesviewset_with_frequency_scoring(self, client):
+        with open("resume_analyzer/test_resumes/correct_resume.pdf", "rb") as resume:
+            response = client.post(path=self.url + "?scoring=frequency", data={"file": resume}, secure=True)
+        assert response.status_code == 200
+        frequencies = [vacancy["skills_frequency"] for vacancy in response.json()]
+        assert frequencies == sorted(frequencies, reverse=True)
+
+    def test_tailoredvacanciesviewset_with_unknown_scoring(self, client):
+        with open("resume_analyzer/test_resumes/correct_resume.pdf", "rb") as resume:
+            response = client.post(path=self.url + "?scoring=unknown", data={"file": resume}, secure=True)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Unknown scoring."
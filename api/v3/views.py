@@ -1,4 +1,4 @@
-from django.contrib.postgres.search import SearchQuery
+from django.utils.html import escape
 from drf_spectacular.utils import OpenApiParameter, extend_schema
 from pypdf.errors import PdfStreamError
 from rest_framework import status, viewsets
@@ -7,7 +7,8 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from core.tasks import save_query_with_metadata
-from core.utils.common import parse_request, sort_skills
+from core.utils.common import get_cached_tailored_skills, parse_request
+from core.utils.vacancies import SCORINGS
 from resume_analyzer.analyzer import analyze_resume
 from scrapers.models import Job, Skill, Vacancy
 
@@ -45,8 +46,7 @@ class TailoredSkillsViewSet(viewsets.GenericViewSet):
     pagination_class = None
 
     def get_queryset(self, query):
-        search_query = SearchQuery(query)
-        return Vacancy.objects.filter(search_vector=search_query)
+        return Vacancy.objects.search(query).for_skills()
 
     @extend_schema(
         parameters=[
@@ -68,10 +68,11 @@ class TailoredSkillsViewSet(viewsets.GenericViewSet):
         query, limit, user_agent, ip_address = parse_request(request)
         save_query_with_metadata.delay(query, user_agent, ip_address)
         queryset = self.get_queryset(query)
-        tailored_skills = sort_skills(queryset)[:limit]
+        number_of_vacancies, tailored_skills = get_cached_tailored_skills(query, queryset, limit)
         data = {
-            "vacancy_name": query,
-            "number_of_vacancies": queryset.count(),
+            # The API has always returned the query escaped, since clients may render it as it is.
+            "vacancy_name": escape(query) if query is not None else None,
+            "number_of_vacancies": number_of_vacancies,
             "rated_skills": tailored_skills,
         }
         return Response(data)
@@ -86,12 +87,24 @@ class TailoredVacanciesViewSet(viewsets.ViewSet):
     LIMIT_OF_VACANCIES = 200
 
     @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="scoring",
+                required=False,
+                enum=SCORINGS,
+                default="count",
+                description="Rank vacancies by the number of matched skills or by how often they mention them.",
+            ),
+        ],
         responses={200: TailoredVacancySerializer(many=True)},
         description="Upload resume in PDF and get tailored vacancies.",
     )
     def create(self, request):
+        scoring = request.query_params.get("scoring", "count")
+        if scoring not in SCORINGS:
+            return Response({"detail": "Unknown scoring."}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            tailored_vacancies = analyze_resume(request.FILES["file"])
-            return Response(tailored_vacancies[: self.LIMIT_OF_VACANCIES], status=status.HTTP_200_OK)
+            tailored_vacancies = analyze_resume(request.FILES["file"], limit=self.LIMIT_OF_VACANCIES, scoring=scoring)
+            return Response(tailored_vacancies, status=status.HTTP_200_OK)
         except PdfStreamError:
             return Response({"detail": "Error processing resume."}, status=status.HTTP_400_BAD_REQUEST)
@@ -2,6 +2,7 @@ import logging
 
 import pytest
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import IntegrityError
 
 
@@ -47,3 +48,18 @@ def enable_log_propagation():
     for logger_name, original_setting in original_propagation_settings.items():
         logger = logging.getLogger(logger_name)
         logger.propagate = original_setting
+
+
+@pytest.fixture
+def fetched_columns():
+    # Record the names of the columns returned by every query, i.e. the data that actually leaves the database.
+    columns = []
+
+    def record_columns(execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if (description := context["cursor"].description) is not None:
+            columns.extend(column.name for column in description)
+        return result
+
+    with connection.execute_wrapper(record_columns):
+        yield columns
@@ -127,14 +127,21 @@ CACHES = {
 }
 
 
+# Skills matcher
+# Set it to "aho_corasick" to also find the skills that start inside a partial match of a longer one. Since it rates
+# the skills of new vacancies differently, run the rerate_vacancies command after switching the engine.
+SKILLS_MATCHER_ENGINE = config("SKILLS_MATCHER_ENGINE", default="compact")
+
+
 # Celery
 # https://docs.celeryproject.org/en/stable/django/first-steps-with-django.html
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="amqp://rabbitmq")
 CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default="redis://redis")
 CELERY_BEAT_SCHEDULE = {
+    # A safety net for the caches that are warmed up on data changes, e.g. after Redis is flushed or on a fresh deploy.
     "warmup-cache": {
         "task": "resume_analyzer.tasks.task_warmup_cache",
-        "schedule": crontab(*config("WARMUP_CACHE_SCHEDULE", default="* * * * *").split(" "))
+        "schedule": crontab(*config("WARMUP_CACHE_SCHEDULE", default="*/30 * * * *").split(" "))
         if config("ENABLE_WARMUP_CACHE", default=False, cast=bool)
         else None,
     },
@@ -162,7 +169,16 @@ CELERY_BEAT_SCHEDULE = {
         if config("ENABLE_SCRAPE_SH", default=False, cast=bool)
         else None,
     },
+    # Scrapes all the sites at once instead of the scheduled runs of each site above, which are skipped during it.
+    "scrape-all": {
+        "task": "scrapers.tasks.task_scrape_all",
+        "schedule": crontab(*config("SCRAPE_ALL_SCHEDULE", default="30 21,9 * * *").split(" "))
+        if config("ENABLE_SCRAPE_ALL", default=False, cast=bool)
+        else None,
+    },
 }
+# The work units of the orchestrated scraping runs are consumed by the workers dedicated to scraping.
+CELERY_TASK_ROUTES = {"scrapers.tasks.task_scrape_job_title": {"queue": "scraping"}}
 
 
 # Password validation
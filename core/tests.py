@@ -1,20 +1,55 @@
+import json
+import pickle
 import time
 from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from io import StringIO
-from unittest.mock import patch
+from operator import itemgetter
+from unittest.mock import Mock, call, patch
+from uuid import uuid4
 
 import pytest
 from celery.exceptions import Retry
 from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
 from django.core.management import call_command
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from storages.backends.s3boto3 import S3Boto3Storage
 
-from scrapers.models import Search
+from scrapers.models import Job, Search, SkillAggregate, Vacancy
 
 from .storage_backends import MediaStorage, StaticStorage
 from .tasks import save_query_with_metadata
-from .utils.celery import lock_task
+from .utils.cache import LocalLRUCache, get_or_revalidate
+from .utils.celery import hold_lock, keep_lock_renewed, lock_task, redis_client
+from .utils.common import (
+    aggregate_skills,
+    build_aggregate_skills_sql,
+    get_cached_tailored_skills,
+    get_tailored_skills,
+    precompute_tailored_skills,
+    refresh_skill_aggregates,
+    sort_skills,
+)
+from .utils.encoding import decode_skills, decode_vacancy_shard, encode_skills, encode_vacancy_shard
+from .utils.scraping import ScrapeCheckpoint, ScrapeRun, acquire_site_slot
+from .utils.skills import build_skills_matcher, get_skills_version
+from .utils.vacancies import (
+    VACANCIES_MANIFEST_KEY,
+    VacancyShard,
+    VacancySkillMatrix,
+    _build_vacancy_shards,
+    bump_vacancies_version,
+    cache_vacancy_shards,
+    drop_vacancy_shards,
+    get_vacancies_version,
+    get_vacancy_shards,
+    local_vacancy_shards,
+)
 
 
 class TestSettings:
@@ -121,6 +156,54 @@ class TestLockTaskDecorator:
         task = self.mock_task("test_lock_release", raise_exception=False)
         assert task() == "Executed"
 
+    def test_lock_is_renewed_while_task_runs(self):
+        key = f"test_lock_renewal:{uuid4().hex}"
+
+        @lock_task(key, timeout=1, auto_renew=True)
+        def task():
+            time.sleep(2)
+            return "Executed"
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first_task = executor.submit(task)
+            time.sleep(1.5)
+            # The lock is still held after its timeout, so the task can't run twice.
+            assert redis_client.exists(key)
+            assert task() is None
+            assert first_task.result() == "Executed"
+        assert not redis_client.exists(key)
+
+    def test_hold_lock_waits_for_the_lock(self):
+        key = f"test_hold_lock:{uuid4().hex}"
+
+        def hold_for_a_while():
+            with hold_lock(key, timeout=1):
+                time.sleep(1.5)
+                return time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first_holder = executor.submit(hold_for_a_while)
+            time.sleep(0.2)
+            # The lock is renewed past its timeout, so the second holder waits for the first one to finish.
+            with hold_lock(key, timeout=1):
+                assert first_holder.done()
+                assert time.monotonic() >= first_holder.result()
+        assert not redis_client.exists(key)
+
+    def test_expired_lock_taken_by_another_task_is_not_released(self):
+        key = f"test_lock_expiry:{uuid4().hex}"
+
+        @lock_task(key, timeout=1)
+        def task():
+            time.sleep(1.5)
+            # The lock has expired and been taken by another task.
+            redis_client.set(key, "another token", ex=10)
+            return "Executed"
+
+        assert task() == "Executed"
+        assert redis_client.get(key) == b"another token"
+        redis_client.delete(key)
+
     def test_concurrent_execution_with_lock(self):
         task = self.mock_task("test_concurrent_execution")
         with ThreadPoolExecutor(max_workers=2) as executor:
@@ -133,3 +216,599 @@ class TestLockTaskDecorator:
 
             # Validate that one task executed successfully and the other raised an exception.
             assert (first_result == "Executed") != (second_result == "Simulated Task Failure")
+
+
+class TestScrapeRun:
+    units = [("hh.ru", "Python developer"), ("hh.ru", "Data scientist"), ("indeed.com", "Python developer")]
+
+    @pytest.fixture(autouse=True)
+    def current_run_key(self, monkeypatch):
+        # Keep the runs of each test apart, since the tests share the Redis server.
+        current_run_key = f"test_scrape_run:{uuid4().hex}"
+        monkeypatch.setattr("core.utils.scraping.CURRENT_SCRAPE_RUN_KEY", current_run_key)
+        yield
+        redis_client.delete(current_run_key)
+
+    @pytest.fixture
+    def run(self):
+        run = ScrapeRun.start(self.units)
+        yield run
+        redis_client.delete(run.key, run._seen_links_key, run._days_key, run._finished_units_key)
+
+    def test_start_makes_run_current(self, run):
+        assert ScrapeRun.get_current().run_id == run.run_id
+        progress = run.get_progress()
+        assert progress["total"] == 3
+        assert progress["finished"] == 0
+        assert progress["started_at"] <= time.time()
+        assert {site: site_progress["total"] for site, site_progress in progress["sites"].items()} == {
+            "hh.ru": 2,
+            "indeed.com": 1,
+        }
+
+    def test_links_are_claimed_once(self, run):
+        assert run.claim_links(["link_1", "link_2"]) == {"link_1", "link_2"}
+        assert run.claim_links(["link_2", "link_3"]) == {"link_3"}
+        assert run.claim_links([]) == set()
+        assert ScrapeRun(uuid4().hex).claim_links(["link_1"]) == {"link_1"}
+
+    def test_last_unit_learns_run_is_finished(self, run):
+        today = date.today()
+
+        assert run.finish_unit("hh.ru", "Python developer", 5, [today]) == (1, 3)
+        assert run.finish_unit("hh.ru", "Data scientist", 0, [], failed=True) == (2, 3)
+        # A work unit delivered again isn't counted twice.
+        assert run.finish_unit("hh.ru", "Data scientist", 0, [], failed=True) == (2, 3)
+        assert run.finish_unit("indeed.com", "Python developer", 2, [today, today - timedelta(days=1)]) == (3, 3)
+
+        assert run.get_days() == {today, today - timedelta(days=1)}
+        assert run.get_progress()["sites"] == {
+            "hh.ru": {"total": 2, "finished": 2, "failed": 1, "vacancies": 5},
+            "indeed.com": {"total": 1, "finished": 1, "failed": 0, "vacancies": 2},
+        }
+
+    def test_finish_keeps_next_run_current(self, run):
+        run.finish()
+        assert ScrapeRun.get_current() is None
+
+        next_run = ScrapeRun.start(self.units)
+        run.finish()
+        assert ScrapeRun.get_current().run_id == next_run.run_id
+        redis_client.delete(next_run.key)
+
+    def test_site_slots_are_limited(self):
+        site = f"test-{uuid4().hex}.com"
+        slots = [acquire_site_slot(site, limit=2, timeout=10) for _ in range(3)]
+
+        assert slots[0] is not None and slots[1] is not None
+        assert slots[2] is None
+
+        slots[0].release()
+        assert (slot := acquire_site_slot(site, limit=2, timeout=10)) is not None
+        slot.release()
+        slots[1].release()
+
+    def test_site_slot_is_kept_while_renewed(self):
+        site = f"test-{uuid4().hex}.com"
+        slot = acquire_site_slot(site, limit=1, timeout=1)
+
+        with keep_lock_renewed(slot, slot.timeout / 3):
+            time.sleep(1.5)
+            # The slot outlives its timeout, so a slow work unit doesn't let another one take it.
+            assert acquire_site_slot(site, limit=1, timeout=1) is None
+        assert slot.owned()
+        slot.release()
+
+
+class TestScrapeCheckpoint:
+    @pytest.fixture
+    def checkpoint(self):
+        checkpoint = ScrapeCheckpoint(f"test_scrape_checkpoint:{uuid4().hex}", window=60)
+        yield checkpoint
+        checkpoint.clear()
+
+    def test_stopped_run_is_resumed(self, checkpoint):
+        vacancy = {"url": "link_1", "title": "Python developer", "content": "Python and Django"}
+        assert checkpoint.start() is False
+        checkpoint.save_links("Python developer", {"link_1", "link_2"})
+        checkpoint.save_page("Python developer", vacancy)
+        checkpoint.save_links("Data scientist", set())
+        checkpoint.complete("Data scientist")
+
+        resumed_checkpoint = ScrapeCheckpoint(checkpoint.key, window=60)
+        assert resumed_checkpoint.start() is True
+        assert resumed_checkpoint.started_at == checkpoint.started_at
+        assert resumed_checkpoint.get_links("Python developer") == {"link_1", "link_2"}
+        assert resumed_checkpoint.get_pages("Python developer") == {"link_1": vacancy}
+        assert resumed_checkpoint.is_completed("Data scientist")
+        assert not resumed_checkpoint.is_completed("Python developer")
+        assert resumed_checkpoint.get_links("Data scientist") is None
+
+    def test_checkpoints_expire_with_window(self, checkpoint):
+        checkpoint.start()
+        checkpoint.save_links("Python developer", {"link_1"})
+        checkpoint.save_page("Python developer", {"url": "link_1", "title": "Python developer", "content": "Python"})
+
+        assert 0 < redis_client.ttl(checkpoint.key) <= 60
+        assert 0 < redis_client.ttl(checkpoint._get_pages_key("Python developer")) <= 60
+
+    def test_complete_and_clear_drop_state(self, checkpoint):
+        checkpoint.start()
+        for job_title in ("Python developer", "Data scientist"):
+            checkpoint.save_links(job_title, {"link_1"})
+            checkpoint.save_page(job_title, {"url": "link_1", "title": job_title, "content": "Python"})
+
+        checkpoint.complete("Python developer")
+        assert checkpoint.get_pages("Python developer") == {}
+        assert checkpoint.get_links("Python developer") is None
+
+        checkpoint.clear()
+        assert not redis_client.exists(checkpoint.key, checkpoint._get_pages_key("Data scientist"))
+        assert checkpoint.start() is False
+
+    def test_days_are_kept_until_cleared(self, checkpoint):
+        today = timezone.localdate()
+        checkpoint.start()
+        checkpoint.save_days([today])
+        checkpoint.save_days([today - timedelta(days=1), today])
+        checkpoint.save_days([])
+
+        # The days outlive the completed job titles, and expire with the rest of the checkpoints.
+        checkpoint.complete("Python developer")
+        assert checkpoint.get_days() == {today, today - timedelta(days=1)}
+        assert 0 < redis_client.ttl(checkpoint._days_key) <= 60
+
+        checkpoint.clear()
+        assert checkpoint.get_days() == set()
+
+
+@pytest.mark.django_db
+class TestSkillsMatcher:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    def test_get_skills_version_is_stable(self):
+        assert get_skills_version() == get_skills_version()
+
+    def test_build_skills_matcher_caches_snapshot(self):
+        skills_version = get_skills_version()
+        keyword_processor = build_skills_matcher(skills_version)
+        assert keyword_processor.engine == "compact"
+        assert cache.get(f"skills_matcher:{skills_version}") == keyword_processor.dumps()
+
+    def test_build_skills_matcher_with_aho_corasick_engine(self, settings):
+        settings.SKILLS_MATCHER_ENGINE = "aho_corasick"
+        keyword_processor = build_skills_matcher(get_skills_version())
+        assert keyword_processor.engine == "aho_corasick"
+        assert "Python" in keyword_processor.extract_keywords("Python developer")
+
+    def test_build_skills_matcher_loads_snapshot(self):
+        skills_version = get_skills_version()
+        build_skills_matcher(skills_version)
+        with patch("core.utils.skills.Skill.objects.values_list") as mock_values_list:
+            keyword_processor = build_skills_matcher(skills_version)
+        assert mock_values_list.call_count == 0
+        assert "Python" in keyword_processor.extract_keywords("Python developer")
+
+    def test_missing_snapshot_is_built_once(self):
+        skills_version = get_skills_version()
+        snapshot_cache_key = f"skills_matcher:{skills_version}"
+        snapshot = build_skills_matcher(skills_version).dumps()
+        cache.delete(snapshot_cache_key)
+
+        def build_slowly(snapshot_cache_key):
+            time.sleep(0.2)
+            cache.set(snapshot_cache_key, snapshot, None)
+            return snapshot
+
+        with patch("core.utils.skills._build_missing_skills_snapshot", side_effect=build_slowly) as mock_build:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                keyword_processors = list(executor.map(build_skills_matcher, [skills_version] * 4))
+        assert mock_build.call_count == 1
+        assert all(keyword_processor.dumps() == snapshot for keyword_processor in keyword_processors)
+
+
+@pytest.mark.django_db
+class TestVacancySkillMatrix:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    @pytest.fixture
+    def vacancy_matrix(self):
+        vacancies = [
+            {"url": "url_1", "title": "Job 1", "rated_skills": {"Python": 2, "Go": 1}},
+            {"url": "url_2", "title": "Job 2", "rated_skills": {}},
+            {"url": "url_3", "title": "Job 3", "rated_skills": {"python": 1, "Go": 3}},
+        ]
+        return VacancySkillMatrix.from_vacancies(vacancies)
+
+    def test_vacancy_matrix_rows(self, vacancy_matrix):
+        assert vacancy_matrix.skill_ids == {"Python": 0, "Go": 1, "python": 2}
+        assert list(vacancy_matrix.offsets) == [0, 1, 3, 4]
+        assert list(vacancy_matrix.positions) == [0, 0, 2, 2]
+        assert list(vacancy_matrix.frequencies) == [2, 1, 3, 1]
+
+    @pytest.mark.parametrize(
+        "skills, scoring, expected",
+        [
+            ({"Python", "Go"}, "count", {0: 2, 2: 1}),
+            ({"Python", "Go"}, "frequency", {0: 3, 2: 3}),
+            ({"python"}, "count", {2: 1}),
+            ({"Unknown"}, "count", {}),
+        ],
+    )
+    def test_vacancy_matrix_score(self, vacancy_matrix, skills, scoring, expected):
+        assert vacancy_matrix.score(skills, scoring) == expected
+
+    def test_vacancy_matrix_unknown_scoring(self, vacancy_matrix):
+        with pytest.raises(ValueError):
+            vacancy_matrix.score({"Python"}, "unknown")
+
+
+@pytest.mark.django_db
+class TestVacancyShards:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    @pytest.fixture
+    def today(self):
+        return timezone.localdate()
+
+    @pytest.fixture
+    def vacancies(self, today):
+        Vacancy.objects.all().delete()
+        for days_ago in (0, 0, 1, 3):
+            Vacancy.objects.create(
+                url=f"http://unique-url.com/{uuid4()}",
+                title=f"Vacancy from {days_ago} days ago",
+                rated_skills={"Python": days_ago + 1},
+                created_date=timezone.now() - timedelta(days=days_ago),
+            )
+
+    def test_shards_are_split_by_day(self, vacancies, today):
+        shards = get_vacancy_shards()
+        assert [shard.day for shard in shards] == [today - timedelta(days=3), today - timedelta(days=1), today]
+        assert [len(shard.vacancies) for shard in shards] == [1, 1, 2]
+        for shard in shards:
+            assert shard.vacancy_matrix == VacancySkillMatrix.from_vacancies(shard.vacancies)
+
+    def test_shards_are_kept_in_process_memory(self, vacancies):
+        local_vacancy_shards.clear()
+        shards = get_vacancy_shards()
+        # A worker that starts with an already cached manifest fetches the shards once.
+        local_vacancy_shards.clear()
+        assert get_vacancy_shards() == shards
+        with patch("core.utils.vacancies.cache.get_many", wraps=cache.get_many) as mock_get_many:
+            with CaptureQueriesContext(connection) as context:
+                assert get_vacancy_shards() == shards
+        assert mock_get_many.call_count == 0
+        assert len(context.captured_queries) == 0
+
+    def test_only_given_days_are_rebuilt(self, vacancies, today):
+        get_vacancy_shards()
+        manifest = cache.get(VACANCIES_MANIFEST_KEY)
+        Vacancy.objects.create(url="http://unique-url.com/new", title="New", rated_skills={"Go": 1})
+
+        cache_vacancy_shards(days=[today])
+
+        new_manifest = cache.get(VACANCIES_MANIFEST_KEY)
+        assert new_manifest[today] != manifest[today]
+        assert {day: token for day, token in new_manifest.items() if day != today} == {
+            day: token for day, token in manifest.items() if day != today
+        }
+        with CaptureQueriesContext(connection) as context:
+            assert len(get_vacancy_shards()[-1].vacancies) == 3
+        assert len(context.captured_queries) == 0
+
+    def test_replaced_shards_are_kept_for_a_while(self, vacancies, today):
+        get_vacancy_shards()
+        shard_key = f"vacancy_shard:{today.isoformat()}:{cache.get(VACANCIES_MANIFEST_KEY)[today]}"
+        with patch("core.utils.vacancies.cache.touch", wraps=cache.touch) as mock_touch:
+            cache_vacancy_shards(days=[today])
+        assert mock_touch.call_args_list == [call(shard_key, 60 * 60)]
+        assert cache.get(shard_key) is not None
+
+    def test_all_days_are_rebuilt_without_manifest(self, vacancies, today):
+        cache_vacancy_shards(days=[today])
+        assert len(cache.get(VACANCIES_MANIFEST_KEY)) == 3
+
+    def test_expired_shards_are_dropped(self, vacancies, today):
+        get_vacancy_shards()
+        drop_vacancy_shards(before=today - timedelta(days=1))
+        assert [shard.day for shard in get_vacancy_shards()] == [today - timedelta(days=1), today]
+
+    def test_concurrent_manifest_updates_are_kept(self, vacancies, today):
+        get_vacancy_shards()
+        Vacancy.objects.create(url="http://unique-url.com/new", title="New", rated_skills={"Go": 1})
+
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        def build_and_drop_meanwhile(days=None):
+            # Purge the old shards while a scraper rebuilds the shard of today after it has read the manifest.
+            dropping = executor.submit(drop_vacancy_shards, before=today - timedelta(days=1))
+            time.sleep(0.2)
+            # The purge waits for the scraper to swap the manifest first.
+            assert not dropping.done()
+            return _build_vacancy_shards(days)
+
+        with executor, patch("core.utils.vacancies._build_vacancy_shards", side_effect=build_and_drop_meanwhile):
+            cache_vacancy_shards(days=[today])
+
+        shards = get_vacancy_shards()
+        assert [shard.day for shard in shards] == [today - timedelta(days=1), today]
+        assert len(shards[-1].vacancies) == 3
+
+    def test_cold_shards_are_rebuilt_once(self, vacancies):
+        shards = _build_vacancy_shards()
+
+        def build_slowly(days=None):
+            time.sleep(0.2)
+            return shards
+
+        with patch("core.utils.vacancies._build_vacancy_shards", side_effect=build_slowly) as mock_build:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda _: get_vacancy_shards(), range(4)))
+        assert mock_build.call_count == 1
+        assert all(result == [shards[day] for day in sorted(shards)] for result in results)
+
+    def test_evicted_shard_is_rebuilt_once(self, vacancies, today):
+        get_vacancy_shards()
+        cache.delete(f"vacancy_shard:{today.isoformat()}:{cache.get(VACANCIES_MANIFEST_KEY)[today]}")
+        local_vacancy_shards.clear()
+        shards = _build_vacancy_shards([today])
+
+        def build_slowly(days=None):
+            time.sleep(0.2)
+            return shards
+
+        with patch("core.utils.vacancies._build_vacancy_shards", side_effect=build_slowly) as mock_build:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda _: get_vacancy_shards(), range(4)))
+        assert mock_build.call_count == 1
+        assert all(result[-1] == shards[today] for result in results)
+
+    def test_evicted_shard_is_rebuilt(self, vacancies, today):
+        shards = get_vacancy_shards()
+        shard_key = f"vacancy_shard:{today.isoformat()}:{cache.get(VACANCIES_MANIFEST_KEY)[today]}"
+        cache.delete(shard_key)
+        local_vacancy_shards.clear()
+        assert get_vacancy_shards() == shards
+        assert decode_vacancy_shard(cache.get(shard_key)) == shards[-1]
+
+
+@pytest.mark.django_db
+class TestSkillAggregates:
+    query = "python developer"
+
+    @pytest.fixture
+    def vacancies(self):
+        return Vacancy.objects.filter(search_vector=SearchQuery(self.query))
+
+    def test_refresh_skill_aggregates(self, vacancies):
+        assert refresh_skill_aggregates() == Job.objects.count()
+        skill_aggregate = SkillAggregate.objects.get(job__title__iexact=self.query)
+        assert skill_aggregate.number_of_vacancies == vacancies.count() > 0
+        assert sorted(skill_aggregate.rated_skills, key=itemgetter("skill")) == sorted(
+            sort_skills(vacancies), key=itemgetter("skill")
+        )
+
+    def test_refresh_skill_aggregates_matches_separate_searches(self):
+        with CaptureQueriesContext(connection) as context:
+            refresh_skill_aggregates()
+        assert len(context.captured_queries) == 1
+        for skill_aggregate in SkillAggregate.objects.select_related("job"):
+            assert (skill_aggregate.number_of_vacancies, skill_aggregate.rated_skills) == aggregate_skills(
+                Vacancy.objects.search(skill_aggregate.job.title)
+            )
+
+    def test_refresh_skill_aggregates_updates_existing_rows(self):
+        refresh_skill_aggregates()
+        SkillAggregate.objects.update(number_of_vacancies=0, rated_skills=[])
+        refresh_skill_aggregates()
+        assert SkillAggregate.objects.count() == Job.objects.count()
+        assert SkillAggregate.objects.get(job__title__iexact=self.query).number_of_vacancies > 0
+
+    def test_get_tailored_skills_from_aggregate(self, vacancies):
+        refresh_skill_aggregates()
+        with patch("core.utils.common.aggregate_skills") as mock_aggregate_skills:
+            number_of_vacancies, tailored_skills = get_tailored_skills(self.query.upper(), vacancies, 5)
+        assert mock_aggregate_skills.call_count == 0
+        assert number_of_vacancies == vacancies.count()
+        assert len(tailored_skills) == 5
+
+    def test_get_tailored_skills_without_aggregate(self, vacancies):
+        with CaptureQueriesContext(connection) as context:
+            number_of_vacancies, tailored_skills = get_tailored_skills(self.query, vacancies, 5)
+        # One query looks up the aggregate, and one both counts the vacancies and sums their skills.
+        assert len(context.captured_queries) == 2
+        assert (number_of_vacancies, tailored_skills) == aggregate_skills(vacancies, 5)
+
+    def test_aggregate_skills_matches_sort_skills(self, vacancies):
+        number_of_vacancies, rated_skills = aggregate_skills(vacancies)
+        assert number_of_vacancies == vacancies.count()
+        assert {item["skill"]: item["frequency"] for item in rated_skills} == {
+            item["skill"]: item["frequency"] for item in sort_skills(vacancies)
+        }
+        assert [item["frequency"] for item in rated_skills] == sorted(
+            (item["frequency"] for item in rated_skills), reverse=True
+        )
+        assert aggregate_skills(vacancies, 3) == (number_of_vacancies, rated_skills[:3])
+
+    @pytest.mark.parametrize("query", ["", "nothing matches this query"])
+    def test_aggregate_skills_without_vacancies(self, query):
+        assert aggregate_skills(Vacancy.objects.search(query)) == (0, [])
+        assert aggregate_skills(Vacancy.objects.none()) == (0, [])
+
+    def test_aggregate_skills_scans_search_vector_index_once(self, vacancies):
+        sql, params = build_aggregate_skills_sql(vacancies, 20)
+        with connection.cursor() as cursor:
+            # The test database is tiny, so make sure the planner isn't tempted by a sequential scan.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            query_plan = "\n".join(row[0] for row in cursor.fetchall())
+        assert query_plan.count("search_vector_idx") == 1
+
+
+class TestGetOrRevalidate:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    def test_fresh_value_is_computed_once(self):
+        compute = Mock(return_value="value")
+        assert get_or_revalidate("key", "v1", compute) == "value"
+        assert get_or_revalidate("key", "v1", compute) == "value"
+        assert compute.call_count == 1
+
+    def test_value_of_old_version_is_revalidated_by_one_caller(self):
+        get_or_revalidate("key", "v1", lambda: "old value")
+        # Another caller is already recomputing the value, so the stale one is served.
+        cache.add("key:revalidate", True, 60)
+        assert get_or_revalidate("key", "v2", lambda: "new value") == "old value"
+
+        cache.delete("key:revalidate")
+        assert get_or_revalidate("key", "v2", lambda: "new value") == "new value"
+        assert get_or_revalidate("key", "v2", lambda: "newer value") == "new value"
+
+    def test_expired_value_is_revalidated(self):
+        get_or_revalidate("key", "v1", lambda: "old value", timeout=0)
+        assert get_or_revalidate("key", "v1", lambda: "new value") == "new value"
+
+
+class TestEncoding:
+    @pytest.fixture
+    def shard(self):
+        vacancies = [
+            {"url": "https://example.com/1", "title": "Python developer", "rated_skills": {"Python": 2, "Go": 1}},
+            {"url": "https://example.com/2", "title": "Разработчик", "rated_skills": {}},
+            {"url": "https://example.com/3", "title": "C++ developer", "rated_skills": {"C++": 1, "Go": 3}},
+        ]
+        return VacancyShard.from_vacancies(date(2024, 1, 31), vacancies)
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_vacancy_shard_round_trip(self, shard, compress):
+        decoded_shard = decode_vacancy_shard(encode_vacancy_shard(shard, compress))
+        assert decoded_shard == shard
+        assert decoded_shard.vacancies == shard.vacancies
+
+    def test_vacancy_shard_with_large_values(self, shard):
+        vacancies = [
+            {"url": f"https://example.com/{idx}", "title": "", "rated_skills": {"Go": 300}} for idx in range(300)
+        ]
+        large_shard = VacancyShard.from_vacancies(shard.day, vacancies)
+        assert decode_vacancy_shard(encode_vacancy_shard(large_shard)).vacancies == vacancies
+
+    def test_strings_with_nul_are_rejected(self):
+        with pytest.raises(ValueError):
+            encode_skills([("Go", ["go\0lang"])])
+
+    def test_vacancy_shard_transposes_matrix(self, shard):
+        assert [vacancy["rated_skills"] for vacancy in shard.vacancies] == [
+            {"Python": 2, "Go": 1},
+            {},
+            {"C++": 1, "Go": 3},
+        ]
+
+    def test_vacancy_shard_is_smaller_than_pickle(self, shard):
+        # Load the vacancies from JSON, just as from the database, so that pickle can't share the repeated strings.
+        vacancies = json.loads(json.dumps(shard.vacancies * 100))
+        large_shard = VacancyShard.from_vacancies(shard.day, vacancies)
+        assert len(encode_vacancy_shard(large_shard)) < len(pickle.dumps(vacancies))
+        assert len(encode_vacancy_shard(large_shard, compress=True)) < len(encode_vacancy_shard(large_shard))
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_skills_round_trip(self, compress):
+        skills = [("Python", ["python", "python3"]), ("C#", ["c#", "с#"]), ("Go", [])]
+        assert decode_skills(encode_skills(skills, compress)) == skills
+        assert decode_skills(encode_skills([])) == []
+
+    @pytest.mark.parametrize("data", [b"", b"VSHD", b"SKLS" + bytes(20), b"VSHD\x02\x00" + bytes(20)])
+    def test_invalid_vacancy_shard(self, data):
+        with pytest.raises(ValueError):
+            decode_vacancy_shard(data)
+
+
+class TestLocalLRUCache:
+    def test_value_of_other_version_is_a_miss(self):
+        local_cache = LocalLRUCache(maxsize=2)
+        local_cache.set("key", "v1", "value")
+        assert local_cache.get("key", "v1") == "value"
+        assert local_cache.get("key", "v2") is None
+        assert local_cache.get("missing", "v1", "default") == "default"
+        assert local_cache.stats == {"size": 1, "hits": 1, "misses": 2, "evictions": 0}
+
+    def test_least_recently_used_value_is_evicted(self):
+        local_cache = LocalLRUCache(maxsize=2)
+        local_cache.set("a", "v1", 1)
+        local_cache.set("b", "v1", 2)
+        assert local_cache.get("a", "v1") == 1
+        local_cache.set("c", "v1", 3)
+        assert local_cache.get("b", "v1") is None
+        assert (local_cache.get("a", "v1"), local_cache.get("c", "v1")) == (1, 3)
+        assert local_cache.stats["evictions"] == 1
+
+    def test_clear(self):
+        local_cache = LocalLRUCache()
+        local_cache.set("key", "v1", "value")
+        local_cache.get("key", "v1")
+        local_cache.clear()
+        assert local_cache.get("key", "v1") is None
+        assert local_cache.stats == {"size": 0, "hits": 0, "misses": 1, "evictions": 0}
+
+
+@pytest.mark.django_db
+class TestCachedTailoredSkills:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    def test_cache_key_is_normalized_query(self):
+        vacancies = Vacancy.objects.search("python")
+        expected = get_cached_tailored_skills("python", vacancies, 5)
+        with CaptureQueriesContext(connection) as context:
+            assert get_cached_tailored_skills("  PYTHON ", vacancies, 5) == expected
+        assert len(context.captured_queries) == 0
+
+    def test_cache_is_invalidated_by_vacancies_version(self):
+        vacancies = Vacancy.objects.search("python")
+        version = get_vacancies_version()
+        get_cached_tailored_skills("python", vacancies, 5)
+        bump_vacancies_version()
+        assert get_vacancies_version() != version
+        with CaptureQueriesContext(connection) as context:
+            get_cached_tailored_skills("python", vacancies, 5)
+        assert len(context.captured_queries) == 2
+
+    def test_precompute_tailored_skills(self, settings):
+        # Make room for the skills of every job title, so that the cache doesn't cull its version key.
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "OPTIONS": {"MAX_ENTRIES": 10_000},
+            }
+        }
+        version = get_vacancies_version()
+        # The job titles that differ only in case share the same cache key.
+        job_titles = {job_title.lower() for job_title in Job.objects.values_list("title", flat=True)}
+        assert precompute_tailored_skills(limits=(5, None)) == 2 * len(job_titles)
+        assert get_vacancies_version() != version
+        skill_aggregate = SkillAggregate.objects.get(job__title__iexact="python developer")
+        vacancies = Vacancy.objects.search(skill_aggregate.job.title)
+        with CaptureQueriesContext(connection) as context:
+            assert get_cached_tailored_skills("Python Developer", vacancies, 5) == (
+                skill_aggregate.number_of_vacancies,
+                skill_aggregate.rated_skills[:5],
+            )
+            assert get_cached_tailored_skills("python developer", vacancies, None) == (
+                skill_aggregate.number_of_vacancies,
+                skill_aggregate.rated_skills,
+            )
+        assert len(context.captured_queries) == 0
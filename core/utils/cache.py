@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import Lock
+from typing import Any, TypeVar
+
+from django.core.cache import cache
+
+T = TypeVar("T")
+
+
+def get_or_revalidate(
+    key: str, version: str, compute: Callable[[], T], timeout: int = 12 * 60 * 60, stale_timeout: int = 12 * 60 * 60
+) -> T:
+    """
+    Returns the cached value of the key, serving it stale while a single caller recomputes it.
+
+    A value goes stale once it's older than the timeout or was computed for another version
+    of the data, but it's kept in the cache for the stale timeout on top. So when a popular
+    key goes stale, only the caller that wins the revalidation lock recomputes it, while the
+    other callers keep getting the stale value instead of all hitting the database at once.
+
+    Args:
+        key (str): The cache key of the value.
+        version (str): The version token of the data the value is computed from.
+        compute (Callable[[], T]): A function that computes a fresh value.
+        timeout (int): For how long the value is fresh, in seconds. Defaults to 12 hours.
+        stale_timeout (int): For how long a stale value can be served, in seconds. Defaults to 12 hours.
+
+    Returns:
+        T: The cached or freshly computed value.
+    """
+    revalidation_key = f"{key}:revalidate"
+    entry = cache.get(key)
+    if entry is not None:
+        is_fresh = entry["version"] == version and entry["fresh_until"] > time.time()
+        # The lock expires on its own if the caller holding it fails to recompute the value.
+        if is_fresh or not cache.add(revalidation_key, True, 60):
+            return entry["value"]
+
+    value = compute()
+    cache_fresh_values({key: value}, version, timeout, stale_timeout)
+    cache.delete(revalidation_key)
+    return value
+
+
+def cache_fresh_values(
+    values: dict[str, T], version: str, timeout: int = 12 * 60 * 60, stale_timeout: int = 12 * 60 * 60
+) -> None:
+    """
+    Caches precomputed values in the format of `get_or_revalidate`, e.g. to warm up the cache in bulk.
+
+    Args:
+        values (dict[str, T]): The values by their cache keys.
+        version (str): The version token of the data the values are computed from.
+        timeout (int): For how long the values are fresh, in seconds. Defaults to 12 hours.
+        stale_timeout (int): For how long stale values can be served, in seconds. Defaults to 12 hours.
+    """
+    fresh_until = time.time() + timeout
+    entries = {key: {"value": value, "version": version, "fresh_until": fresh_until} for key, value in values.items()}
+    cache.set_many(entries, timeout + stale_timeout)
+
+
+class LocalLRUCache:
+    """A size-bounded LRU cache in the memory of the process, in front of the shared cache.
+
+    Large values, such as the shards of vacancies, are expensive to transfer from Redis and
+    unpickle on every request, although they rarely change. The local tier keeps the decoded
+    values of the recently used keys, each tagged with a version token that the caller reads
+    from a cheap version key in the shared cache, so an outdated value is never returned.
+    Once the cache is full, the least recently used value is evicted.
+
+    Attributes:
+        maxsize (int): The maximum number of values kept in the cache.
+        hits (int): Number of lookups served by an up-to-date value.
+        misses (int): Number of lookups of missing or outdated values.
+        evictions (int): Number of values evicted to stay within the size.
+
+    Args:
+        maxsize (int): The maximum number of values kept in the cache. Defaults to 128.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[Hashable, Any]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value of the key if it was cached for the given version.
+
+        Args:
+            key (Hashable): The key of the value.
+            version (Hashable): The current version token of the value.
+            default (Any): The value to return on a miss. Defaults to None.
+
+        Returns:
+            Any: The cached value, or the default if it's missing or outdated.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, version: Hashable, value: Any) -> None:
+        """
+        Caches the value of the key for the given version, evicting the least recently used values if full.
+
+        Args:
+            key (Hashable): The key of the value.
+            version (Hashable): The version token of the value.
+            value (Any): The value to cache.
+        """
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the size and the hit, miss and eviction counters of the cache.
+
+        Returns:
+            dict[str, int]: The counters of the cache.
+        """
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def clear(self) -> None:
+        """
+        Drops all cached values and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
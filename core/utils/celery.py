@@ -1,9 +1,12 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
 from functools import wraps
+from threading import Event, Thread
 
 from celery.utils.log import get_task_logger
 from decouple import config
 from redis import Redis
+from redis.exceptions import LockError
 from redis.lock import Lock
 
 logger = get_task_logger(__name__)
@@ -11,7 +14,60 @@ logger = get_task_logger(__name__)
 redis_client: Redis = Redis.from_url(config("REDIS_URL", default="redis://redis"))
 
 
-def lock_task(key: str, timeout: float = 3600) -> Callable:
+def _renew_lock(lock: Lock, interval: float, stopped: Event) -> None:
+    # Reset the timeout of the lock every interval, until the task holding it is done.
+    while not stopped.wait(interval):
+        try:
+            lock.reacquire()
+        except LockError as e:
+            logger.error(f"Error renewing lock {lock.name}.", exc_info=e)
+            return
+
+
+@contextmanager
+def keep_lock_renewed(lock: Lock, interval: float) -> Iterator[None]:
+    """
+    Renews the lock in the background while the block runs, so that it can be held with a short timeout.
+
+    The lock must be created with `thread_local=False`, since the renewing thread needs its token.
+
+    Args:
+        lock (Lock): The acquired lock.
+        interval (float): How often the lock is renewed, in seconds, which must be shorter than its timeout.
+    """
+    stopped = Event()
+    renewer = Thread(target=_renew_lock, args=(lock, interval, stopped), daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        # Stop renewing the lock before it's released.
+        stopped.set()
+        renewer.join()
+
+
+@contextmanager
+def hold_lock(key: str, timeout: float = 60) -> Iterator[None]:
+    """
+    Waits for the lock and holds it while the block runs, renewing it in the background.
+
+    Args:
+        key (str): A unique string to identify the lock.
+        timeout (float): Timeout for the lock, in seconds, so that the lock of a crashed worker is freed soon.
+                         Defaults to 60.
+    """
+    lock = redis_client.lock(key, timeout=timeout, thread_local=False)
+    lock.acquire()
+    try:
+        with keep_lock_renewed(lock, timeout / 3):
+            yield
+    finally:
+        # The lock could have expired and been taken by another worker in the meantime.
+        if lock.owned():
+            lock.release()
+
+
+def lock_task(key: str, timeout: float = 3600, auto_renew: bool = False) -> Callable:
     """
     Decorator to add a Redis lock mechanism to a Celery task. Prevents task execution
     if the task is already running.
@@ -19,6 +75,9 @@ def lock_task(key: str, timeout: float = 3600) -> Callable:
     Args:
         key (str): A unique string to identify the lock.
         timeout (float): Timeout for the lock, in seconds. Defaults to 3600.
+        auto_renew (bool): If True, the lock is renewed in the background while the task runs,
+                           so that a long task keeps it with a short timeout, while the lock of
+                           a crashed worker is freed soon. Defaults to False.
 
     Returns:
         Callable: The decorated task function.
@@ -27,18 +86,25 @@ def lock_task(key: str, timeout: float = 3600) -> Callable:
     def decorator(task: Callable) -> Callable:
         @wraps(task)
         def wrapper(*args, **kwargs):
-            lock: Lock = redis_client.lock(key, timeout=timeout)
+            # The renewing thread needs the token of the lock, which is thread-local by default.
+            lock: Lock = (
+                redis_client.lock(key, timeout=timeout, thread_local=False)
+                if auto_renew
+                else redis_client.lock(key, timeout=timeout)
+            )
             have_lock = False
 
             try:
                 if have_lock := lock.acquire(blocking=False):
-                    return task(*args, **kwargs)
+                    with keep_lock_renewed(lock, timeout / 3) if auto_renew else nullcontext():
+                        return task(*args, **kwargs)
                 else:
                     logger.info(f"Task {task.__name__} is already running.")
             except Exception as e:
                 logger.error(f"Error acquiring lock for task {task.__name__}.", exc_info=e)
             finally:
-                if have_lock and lock.locked():
+                # The lock could have expired and been taken by another task in the meantime.
+                if have_lock and lock.owned():
                     lock.release()
 
         return wrapper
@@ -1,14 +1,23 @@
+import hashlib
 from collections import Counter
+from collections.abc import Iterable
 
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
 from django.db.models.query import QuerySet
-from django.utils.html import escape
+from django.utils import timezone
 from rest_framework.request import Request
 
+from scrapers.models import Job, SkillAggregate, Vacancy
 
-def parse_request(request: Request) -> tuple[str, int | None, str, str]:
+from .cache import cache_fresh_values, get_or_revalidate
+from .vacancies import bump_vacancies_version, get_vacancies_version
+
+
+def parse_request(request: Request) -> tuple[str | None, int | None, str, str]:
+    # The query is returned as it is, so that it matches the job titles and the cache keys of their skills.
+    # It's escaped only where it's rendered, e.g. by the autoescaping of the templates.
     query = request.GET.get("q")
-    if query is not None:
-        query = escape(query)
 
     limit = request.GET.get("limit")
     if limit is not None:
@@ -36,3 +45,138 @@ def sort_skills(vacancies: QuerySet | list[dict[str, int]]) -> list[dict[str, in
     ]
 
     return sorted_skills_dicts
+
+
+def build_aggregate_skills_sql(vacancies: QuerySet, limit: int | None = None) -> tuple[str, tuple]:
+    # Build a query that counts the vacancies and sums the frequencies of their skills in one go. The vacancies
+    # are referenced twice, so PostgreSQL materializes the CTE and runs the full-text search only once.
+    vacancies_sql, params = vacancies.order_by().values("rated_skills").query.sql_with_params()
+    limit_sql = "" if limit is None else "LIMIT %s"
+    # Only the SQL generated by Django is interpolated, while the values are passed as parameters.
+    sql = f"""
+        WITH vacancy AS ({vacancies_sql}),
+        rated_skill AS (
+            SELECT skill, SUM(frequency::integer) AS frequency
+            FROM vacancy, jsonb_each_text(vacancy.rated_skills) AS rated_skill(skill, frequency)
+            GROUP BY skill
+            ORDER BY frequency DESC, skill
+            {limit_sql}
+        )
+        SELECT (SELECT COUNT(*) FROM vacancy), rated_skill.skill, rated_skill.frequency
+        FROM (SELECT 1) AS single_row LEFT JOIN rated_skill ON TRUE
+        ORDER BY rated_skill.frequency DESC, rated_skill.skill
+    """  # nosec B608
+    return sql, params if limit is None else (*params, max(limit, 0))
+
+
+def aggregate_skills(vacancies: QuerySet, limit: int | None = None) -> tuple[int, list[dict[str, int]]]:
+    # Count the vacancies, expand their skills with jsonb_each_text() and sum the frequencies in PostgreSQL
+    # within a single round-trip, so that only the top skills leave the database instead of every vacancy.
+    try:
+        sql, params = build_aggregate_skills_sql(vacancies, limit)
+    except EmptyResultSet:
+        return 0, []
+
+    with connections[vacancies.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    # A search without any skills still returns one row with the number of vacancies.
+    number_of_vacancies = rows[0][0]
+    return number_of_vacancies, [
+        {"skill": skill, "frequency": frequency} for _, skill, frequency in rows if skill is not None
+    ]
+
+
+def refresh_skill_aggregates() -> int:
+    # Precompute the ranked skills of every job title in a single statement, which matches all the job titles
+    # against the vacancies in one pass through the GIN index instead of running a separate search for each of them.
+    # Only the names of the tables are interpolated, while the values are passed as parameters.
+    sql = f"""
+        WITH job_vacancy AS (
+            SELECT job.id AS job_id, vacancy.rated_skills
+            FROM {Job._meta.db_table} AS job
+            JOIN {Vacancy._meta.db_table} AS vacancy ON vacancy.search_vector @@ plainto_tsquery(job.title)
+        ),
+        job_count AS (
+            SELECT job_id, COUNT(*) AS number_of_vacancies FROM job_vacancy GROUP BY job_id
+        ),
+        job_skill AS (
+            SELECT job_id, skill, SUM(frequency::integer) AS frequency
+            FROM job_vacancy, jsonb_each_text(job_vacancy.rated_skills) AS rated_skill(skill, frequency)
+            GROUP BY job_id, skill
+        ),
+        job_rated_skills AS (
+            SELECT
+                job_id,
+                jsonb_agg(jsonb_build_object('skill', skill, 'frequency', frequency) ORDER BY frequency DESC, skill)
+                    AS rated_skills
+            FROM job_skill
+            GROUP BY job_id
+        )
+        INSERT INTO {SkillAggregate._meta.db_table} (job_id, number_of_vacancies, rated_skills, updated_date)
+        SELECT
+            job.id,
+            COALESCE(job_count.number_of_vacancies, 0),
+            COALESCE(job_rated_skills.rated_skills, '[]'::jsonb),
+            %s
+        FROM {Job._meta.db_table} AS job
+        LEFT JOIN job_count ON job_count.job_id = job.id
+        LEFT JOIN job_rated_skills ON job_rated_skills.job_id = job.id
+        ON CONFLICT (job_id) DO UPDATE SET
+            number_of_vacancies = EXCLUDED.number_of_vacancies,
+            rated_skills = EXCLUDED.rated_skills,
+            updated_date = EXCLUDED.updated_date
+    """  # nosec B608
+    with connections[SkillAggregate.objects.db].cursor() as cursor:
+        cursor.execute(sql, [timezone.now()])
+        return cursor.rowcount
+
+
+def precompute_tailored_skills(limits: Iterable[int | None]) -> int:
+    # Refresh the skills of every job title and put them in the cache for each limit in advance, so that
+    # the searches for the job titles, which the sitemap links to, are answered from the cache alone.
+    refresh_skill_aggregates()
+    # Invalidate the cached searches only once the skills of the job titles are refreshed,
+    # otherwise they could be recomputed from the outdated skills in the meantime.
+    bump_vacancies_version()
+
+    tailored_skills = {}
+    for job_title, number_of_vacancies, rated_skills in SkillAggregate.objects.values_list(
+        "job__title", "number_of_vacancies", "rated_skills"
+    ):
+        for limit in limits:
+            tailored_skills[get_tailored_skills_cache_key(job_title, limit)] = (
+                number_of_vacancies,
+                rated_skills[:limit],
+            )
+    cache_fresh_values(tailored_skills, get_vacancies_version())
+    return len(tailored_skills)
+
+
+def get_tailored_skills(query: str, vacancies: QuerySet, limit: int | None = None) -> tuple[int, list[dict[str, int]]]:
+    # Answer a search for a job title from its precomputed aggregate, and any other search from the vacancies.
+    skill_aggregate = SkillAggregate.objects.filter(job__title__iexact=query).first()
+    if skill_aggregate is not None:
+        return skill_aggregate.number_of_vacancies, skill_aggregate.rated_skills[:limit]
+    return aggregate_skills(vacancies, limit)
+
+
+def get_tailored_skills_cache_key(query: str | None, limit: int | None = None) -> str:
+    # Normalize the query, since the full-text search ignores the case and extra whitespace anyway.
+    # A missing query finds no vacancies, just like an empty one.
+    normalized_query = " ".join((query or "").lower().split())
+    query_hash = hashlib.md5(normalized_query.encode(), usedforsecurity=False).hexdigest()
+    return f"tailored_skills:{query_hash}:{limit}"
+
+
+def get_cached_tailored_skills(
+    query: str, vacancies: QuerySet, limit: int | None = None
+) -> tuple[int, list[dict[str, int]]]:
+    # Cache the tailored skills by the normalized query and limit, since most searches repeat the same job titles.
+    # The cached skills go stale once the vacancies change, and are recomputed by a single request meanwhile.
+    return get_or_revalidate(
+        get_tailored_skills_cache_key(query, limit),
+        get_vacancies_version(),
+        lambda: get_tailored_skills(query, vacancies, limit),
+    )
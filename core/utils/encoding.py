@@ -0,0 +1,235 @@
+"""A compact binary encoding of the cached vacancy shards and skills.
+
+Pickled lists of dicts repeat every key and skill name for each vacancy, so both the size
+of the blob fetched from Redis and the time to unpickle it grow with the number of skill
+mentions. Here every skill name is stored once and referred to by its id, the urls and
+titles are kept in columns, and the integer arrays use the smallest item size that fits
+their values. The payload after the header can be compressed with zlib. All integers are
+little-endian.
+
+Vacancy shard layout:
+    header: magic (4s), format version (H), flags (H), typecodes of the offsets, positions
+            and frequencies arrays (3s, padded to 4), day ordinal (I), vacancy count (I),
+            skill count (I), entry count (I)
+    payload: matrix offsets (skill count + 1 items), matrix positions and frequencies
+             (entry count items each), then the string tables of skills, urls and titles
+
+Skills layout:
+    header: magic (4s), format version (H), flags (H), skill count (I), unclean name count (I)
+    payload: unclean name offsets (skill count + 1 unsigned ints) into the unclean names of the skills,
+             then the string tables of clean names and unclean names
+
+String table layout:
+    size in bytes (I), UTF-8 encoded strings separated by NUL characters
+"""
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .vacancies import VacancyShard
+
+FORMAT_VERSION = 1
+FLAG_COMPRESSED = 1
+
+VACANCY_SHARD_MAGIC = b"VSHD"
+VACANCY_SHARD_HEADER = struct.Struct("<4sHH3sxIIII")
+SKILLS_MAGIC = b"SKLS"
+SKILLS_HEADER = struct.Struct("<4sHHII")
+SIZE = struct.Struct("<I")
+SEPARATOR = "\0"
+
+
+class _Reader:
+    # A cursor over the payload that reads the sections in the order they were written.
+    def __init__(self, buffer: bytes) -> None:
+        self.buffer = buffer
+        self.offset = 0
+
+    def read_array(self, length: int, typecode: str = "I") -> array:
+        values = array(typecode)
+        values.frombytes(self.buffer[self.offset : self.offset + length * values.itemsize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        self.offset += length * values.itemsize
+        return values
+
+    def read_strings(self, count: int) -> list[str]:
+        (size,) = SIZE.unpack_from(self.buffer, self.offset)
+        self.offset += SIZE.size
+        # Decode all the strings at once and split them in C instead of slicing them one by one.
+        text = self.buffer[self.offset : self.offset + size].decode()
+        self.offset += size
+        return text.split(SEPARATOR) if count else []
+
+
+def _get_typecode(values: array) -> str:
+    # Pick the smallest unsigned typecode that fits every value, e.g. a byte for the frequencies of skills.
+    max_value = max(values, default=0)
+    return next(typecode for typecode in "BHI" if max_value < 1 << 8 * array(typecode).itemsize)
+
+
+def _pack_array(values: array, typecode: str = "I") -> bytes:
+    if values.typecode != typecode or sys.byteorder == "big":
+        values = array(typecode, values)
+        if sys.byteorder == "big":
+            values.byteswap()
+    return values.tobytes()
+
+
+def _pack_strings(strings: list[str]) -> bytes:
+    if any(SEPARATOR in string for string in strings):
+        raise ValueError("The strings can't contain NUL characters.")
+    encoded = SEPARATOR.join(strings).encode()
+    return SIZE.pack(len(encoded)) + encoded
+
+
+def _unpack_header(data: bytes, header: struct.Struct, magic: bytes) -> tuple[tuple, bytes]:
+    if len(data) < header.size:
+        raise ValueError("The data is too short to be an encoded snapshot.")
+
+    fields = header.unpack_from(data)
+    if fields[0] != magic:
+        raise ValueError(f"The data is not an encoded snapshot of type {magic.decode()}.")
+    if fields[1] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {fields[1]}.")
+
+    payload = data[header.size :]
+    if fields[2] & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+    return fields[3:], payload
+
+
+def encode_vacancy_shard(shard: "VacancyShard", compress: bool = False) -> bytes:
+    """
+    Encodes a vacancy shard into bytes.
+
+    The rated skills of the vacancies aren't stored separately, since they are the transposed
+    skill matrix of the shard, whose rows already refer to the skills by their ids.
+
+    Args:
+        shard (VacancyShard): The shard to encode.
+        compress (bool): If True, compresses the payload with zlib. Defaults to False.
+
+    Returns:
+        bytes: The encoded shard.
+    """
+    vacancy_matrix = shard.vacancy_matrix
+    typecodes = [_get_typecode(values) for values in (vacancy_matrix.offsets, vacancy_matrix.positions)]
+    typecodes.append(_get_typecode(vacancy_matrix.frequencies))
+    payload = b"".join(
+        (
+            _pack_array(vacancy_matrix.offsets, typecodes[0]),
+            _pack_array(vacancy_matrix.positions, typecodes[1]),
+            _pack_array(vacancy_matrix.frequencies, typecodes[2]),
+            _pack_strings(list(vacancy_matrix.skill_ids)),
+            _pack_strings(shard.urls),
+            _pack_strings(shard.titles),
+        )
+    )
+    if compress:
+        payload = zlib.compress(payload)
+
+    header = VACANCY_SHARD_HEADER.pack(
+        VACANCY_SHARD_MAGIC,
+        FORMAT_VERSION,
+        FLAG_COMPRESSED if compress else 0,
+        "".join(typecodes).encode(),
+        shard.day.toordinal(),
+        len(shard.urls),
+        len(vacancy_matrix.skill_ids),
+        len(vacancy_matrix.positions),
+    )
+    return header + payload
+
+
+def decode_vacancy_shard(data: bytes) -> "VacancyShard":
+    """
+    Decodes a vacancy shard encoded by `encode_vacancy_shard`.
+
+    Args:
+        data (bytes): The encoded shard.
+
+    Raises:
+        ValueError: If the data isn't an encoded shard or was written by an unsupported format version.
+
+    Returns:
+        VacancyShard: The decoded shard.
+    """
+    # Imported here, since the vacancies module itself caches the shards in this encoding.
+    from .vacancies import VacancyShard, VacancySkillMatrix
+
+    (typecodes, day_ordinal, vacancy_count, skill_count, entry_count), payload = _unpack_header(
+        data, VACANCY_SHARD_HEADER, VACANCY_SHARD_MAGIC
+    )
+    offsets_typecode, positions_typecode, frequencies_typecode = typecodes.decode()
+    reader = _Reader(payload)
+    offsets = reader.read_array(skill_count + 1, offsets_typecode)
+    positions = reader.read_array(entry_count, positions_typecode)
+    frequencies = reader.read_array(entry_count, frequencies_typecode)
+    skill_ids = {skill: skill_id for skill_id, skill in enumerate(reader.read_strings(skill_count))}
+    urls = reader.read_strings(vacancy_count)
+    titles = reader.read_strings(vacancy_count)
+
+    vacancy_matrix = VacancySkillMatrix(skill_ids, offsets, positions, frequencies)
+    return VacancyShard(date.fromordinal(day_ordinal), urls, titles, vacancy_matrix)
+
+
+def encode_skills(skills: list[tuple[str, list[str]]], compress: bool = False) -> bytes:
+    """
+    Encodes the clean names of skills together with their unclean names into bytes.
+
+    Args:
+        skills (list[tuple[str, list[str]]]): The clean names and unclean names of the skills.
+        compress (bool): If True, compresses the payload with zlib. Defaults to False.
+
+    Returns:
+        bytes: The encoded skills.
+    """
+    unclean_name_offsets = array("I", [0])
+    all_unclean_names = []
+    for _, unclean_names in skills:
+        all_unclean_names.extend(unclean_names)
+        unclean_name_offsets.append(len(all_unclean_names))
+
+    payload = b"".join(
+        (
+            _pack_array(unclean_name_offsets),
+            _pack_strings([clean_name for clean_name, _ in skills]),
+            _pack_strings(all_unclean_names),
+        )
+    )
+    if compress:
+        payload = zlib.compress(payload)
+
+    header = SKILLS_HEADER.pack(
+        SKILLS_MAGIC, FORMAT_VERSION, FLAG_COMPRESSED if compress else 0, len(skills), len(all_unclean_names)
+    )
+    return header + payload
+
+
+def decode_skills(data: bytes) -> list[tuple[str, list[str]]]:
+    """
+    Decodes the skills encoded by `encode_skills`.
+
+    Args:
+        data (bytes): The encoded skills.
+
+    Raises:
+        ValueError: If the data isn't encoded skills or was written by an unsupported format version.
+
+    Returns:
+        list[tuple[str, list[str]]]: The clean names and unclean names of the skills.
+    """
+    (skill_count, unclean_name_count), payload = _unpack_header(data, SKILLS_HEADER, SKILLS_MAGIC)
+    reader = _Reader(payload)
+    unclean_name_offsets = reader.read_array(skill_count + 1)
+    clean_names = reader.read_strings(skill_count)
+    unclean_names = reader.read_strings(unclean_name_count)
+    return [
+        (clean_name, unclean_names[unclean_name_offsets[idx] : unclean_name_offsets[idx + 1]])
+        for idx, clean_name in enumerate(clean_names)
+    ]
@@ -0,0 +1,375 @@
+import json
+import time
+from collections import Counter
+from collections.abc import Iterable
+from datetime import date
+from uuid import uuid4
+
+from redis.lock import Lock
+
+from .celery import redis_client
+
+# How long the state of a run is kept, which also bounds how long a crashed run blocks the next one.
+SCRAPE_RUN_TIMEOUT = 24 * 60 * 60
+CURRENT_SCRAPE_RUN_KEY = "scrape_run:current"
+# How long after its start a run that has stopped can be resumed, i.e. until the next scheduled run.
+SCRAPE_WINDOW = 12 * 60 * 60
+
+
+class ScrapeRun:
+    """The state of an orchestrated scraping run, shared in Redis by its work units.
+
+    A run fans out a work unit for every pair of site and job title onto the scraping queue.
+    The units count their progress in the hash of the run, and take the vacancy links they
+    scrape from a set of links seen during the run, so that a vacancy found by the searches
+    of several job titles is fetched once. The unit that finishes last learns it from the
+    counter of finished units, since the counter is incremented atomically.
+
+    Attributes:
+        run_id (str): The id of the run.
+        key (str): The key of the hash with the progress of the run.
+
+    Args:
+        run_id (str): The id of the run.
+    """
+
+    def __init__(self, run_id: str) -> None:
+        self.run_id = run_id
+        self.key = f"scrape_run:{run_id}"
+        self._seen_links_key = f"{self.key}:seen_links"
+        self._days_key = f"{self.key}:days"
+        self._finished_units_key = f"{self.key}:finished_units"
+
+    @classmethod
+    def start(cls, units: Iterable[tuple[str, str]]) -> "ScrapeRun":
+        """
+        Starts a run of the given work units and makes it the current one.
+
+        Args:
+            units (Iterable[tuple[str, str]]): The sites and job titles to scrape.
+
+        Returns:
+            ScrapeRun: The started run.
+        """
+        run = cls(uuid4().hex)
+        site_totals = Counter(site for site, _ in units)
+        progress = {"started_at": time.time(), "total": site_totals.total()}
+        progress |= {f"total:{site}": total for site, total in site_totals.items()}
+        with redis_client.pipeline() as pipeline:
+            pipeline.hset(run.key, mapping=progress)
+            pipeline.expire(run.key, SCRAPE_RUN_TIMEOUT)
+            pipeline.set(CURRENT_SCRAPE_RUN_KEY, run.run_id, ex=SCRAPE_RUN_TIMEOUT)
+            pipeline.execute()
+        return run
+
+    @classmethod
+    def get_current(cls) -> "ScrapeRun | None":
+        """
+        Returns the run that was started last, unless it has finished or expired.
+
+        Returns:
+            ScrapeRun | None: The current run, or None if there is none.
+        """
+        run_id = redis_client.get(CURRENT_SCRAPE_RUN_KEY)
+        return cls(run_id.decode()) if run_id else None
+
+    def claim_links(self, links: Iterable[str]) -> set[str]:
+        """
+        Marks the links as seen during the run, returning the ones no other work unit has seen before.
+
+        Args:
+            links (Iterable[str]): The vacancy links found by a work unit.
+
+        Returns:
+            set[str]: The links left to the work unit to scrape.
+        """
+        links = list(links)
+        if not links:
+            return set()
+
+        with redis_client.pipeline() as pipeline:
+            for link in links:
+                pipeline.sadd(self._seen_links_key, link)
+            pipeline.expire(self._seen_links_key, SCRAPE_RUN_TIMEOUT)
+            is_added = pipeline.execute()[:-1]
+        return {link for link, is_new in zip(links, is_added) if is_new}
+
+    def finish_unit(
+        self, site: str, job_title: str, vacancies: int, days: Iterable[date], failed: bool = False
+    ) -> tuple[int, int]:
+        """
+        Counts a work unit as finished, unless it has already been counted, e.g. before it was delivered again.
+
+        Args:
+            site (str): The site of the work unit.
+            job_title (str): The job title of the work unit.
+            vacancies (int): The number of new vacancies the work unit has saved.
+            days (Iterable[date]): The days the new vacancies were created on.
+            failed (bool): If True, counts the work unit as failed too. Defaults to False.
+
+        Returns:
+            tuple[int, int]: The number of finished work units, including this one, and the total number of them.
+        """
+        if not redis_client.sadd(self._finished_units_key, f"{site}\0{job_title}"):
+            finished, total = redis_client.hmget(self.key, "finished", "total")
+            return int(finished or 0), int(total or 0)
+
+        days = {day.isoformat() for day in days}
+        with redis_client.pipeline() as pipeline:
+            pipeline.expire(self._finished_units_key, SCRAPE_RUN_TIMEOUT)
+            pipeline.hincrby(self.key, f"finished:{site}", 1)
+            pipeline.hincrby(self.key, f"failed:{site}", int(failed))
+            pipeline.hincrby(self.key, f"vacancies:{site}", vacancies)
+            if days:
+                pipeline.sadd(self._days_key, *days)
+                pipeline.expire(self._days_key, SCRAPE_RUN_TIMEOUT)
+            pipeline.hincrby(self.key, "finished", 1)
+            pipeline.hget(self.key, "total")
+            *_, finished, total = pipeline.execute()
+        return finished, int(total or 0)
+
+    def finish(self) -> None:
+        """
+        Stops treating the run as the current one, so that the next run can start.
+        """
+        with redis_client.pipeline() as pipeline:
+            # Compare and delete atomically, in case the next run has already started.
+            pipeline.watch(CURRENT_SCRAPE_RUN_KEY)
+            if pipeline.get(CURRENT_SCRAPE_RUN_KEY) == self.run_id.encode():
+                pipeline.multi()
+                pipeline.delete(CURRENT_SCRAPE_RUN_KEY)
+                pipeline.execute()
+
+    def get_checkpoint(self, site: str) -> "ScrapeCheckpoint":
+        """
+        Returns the checkpoints of the work units of a site, so that a redelivered work unit resumes where it stopped.
+
+        Args:
+            site (str): The site of the work units.
+
+        Returns:
+            ScrapeCheckpoint: The checkpoints, which expire together with the run.
+        """
+        return ScrapeCheckpoint(f"{self.key}:checkpoint:{site}", window=SCRAPE_RUN_TIMEOUT)
+
+    def get_days(self) -> set[date]:
+        """
+        Returns the days the new vacancies of the run were created on.
+
+        Returns:
+            set[date]: The days of the new vacancies.
+        """
+        return {date.fromisoformat(day.decode()) for day in redis_client.smembers(self._days_key)}
+
+    def get_progress(self) -> dict:
+        """
+        Returns the progress of the run, in total and by sites.
+
+        Returns:
+            dict: The start time, the total and finished number of work units, and the same numbers by sites
+                  together with the failed work units and the new vacancies.
+        """
+        fields = {field.decode(): value.decode() for field, value in redis_client.hgetall(self.key).items()}
+        sites = {}
+        for field, value in fields.items():
+            if ":" in field:
+                counter, site = field.split(":", 1)
+                sites.setdefault(site, {"total": 0, "finished": 0, "failed": 0, "vacancies": 0})[counter] = int(value)
+        return {
+            "started_at": float(fields.get("started_at", 0)),
+            "total": int(fields.get("total", 0)),
+            "finished": int(fields.get("finished", 0)),
+            "sites": sites,
+        }
+
+
+class ScrapeCheckpoint:
+    """Checkpoints of the job titles of a scraping run in Redis, so that a restarted run resumes where it stopped.
+
+    For every job title, the new links found by its search are saved once scanned, and every vacancy
+    page once fetched, so a resumed run neither scans the search again nor refetches the pages, and
+    skips the job titles completed already. The vacancies inserted before a crash are left out of the
+    resumed job title by the usual check of the links already in the database.
+
+    The checkpoints expire once the scrape window since the start of the run is over, since the search
+    results are outdated by then, e.g. when the next scheduled run starts. The run clears them itself
+    when it finishes.
+
+    Attributes:
+        key (str): The key of the hash with the state of the job titles.
+        window (float): For how long since the start of the run it can be resumed, in seconds.
+        started_at (float | None): The timestamp of the start of the run, once started or resumed.
+
+    Args:
+        key (str): The key of the hash with the state of the job titles.
+        window (float): For how long since the start of the run it can be resumed, in seconds.
+                        Defaults to SCRAPE_WINDOW.
+    """
+
+    def __init__(self, key: str, window: float = SCRAPE_WINDOW) -> None:
+        self.key = key
+        self.window = window
+        self.started_at: float | None = None
+
+    def _get_pages_key(self, job_title: str) -> str:
+        return f"{self.key}:pages:{job_title}"
+
+    @property
+    def _days_key(self) -> str:
+        return f"{self.key}:days"
+
+    def start(self) -> bool:
+        """
+        Starts the checkpoints of a run, or resumes the ones of a stopped run within the scrape window.
+
+        Returns:
+            bool: True if the checkpoints of a stopped run are resumed.
+        """
+        started_at = redis_client.hget(self.key, "started_at")
+        if is_resumed := started_at is not None:
+            started_at = float(started_at)
+        else:
+            started_at = time.time()
+            with redis_client.pipeline() as pipeline:
+                pipeline.hset(self.key, "started_at", started_at)
+                pipeline.expireat(self.key, int(started_at + self.window))
+                pipeline.execute()
+        self.started_at = started_at
+        return is_resumed
+
+    def is_completed(self, job_title: str) -> bool:
+        """
+        Checks if the job title has already been scraped in the run.
+
+        Args:
+            job_title (str): The job title.
+
+        Returns:
+            bool: True if the job title is completed.
+        """
+        return bool(redis_client.hexists(self.key, f"completed:{job_title}"))
+
+    def get_links(self, job_title: str) -> set[str] | None:
+        """
+        Returns the new links found by the search of the job title.
+
+        Args:
+            job_title (str): The job title.
+
+        Returns:
+            set[str] | None: The new links, or None if the search hasn't been scanned yet.
+        """
+        links = redis_client.hget(self.key, f"links:{job_title}")
+        return set(json.loads(links)) if links is not None else None
+
+    def save_links(self, job_title: str, links: set[str]) -> None:
+        """
+        Saves the new links found by the search of the job title.
+
+        Args:
+            job_title (str): The job title.
+            links (set[str]): The new links.
+        """
+        redis_client.hset(self.key, f"links:{job_title}", json.dumps(sorted(links)))
+
+    def get_pages(self, job_title: str) -> dict[str, dict[str, str]]:
+        """
+        Returns the vacancy pages of the job title fetched so far.
+
+        Args:
+            job_title (str): The job title.
+
+        Returns:
+            dict[str, dict[str, str]]: The URL, title and content of the vacancies by their links.
+        """
+        pages = redis_client.hgetall(self._get_pages_key(job_title))
+        return {link.decode(): json.loads(vacancy) for link, vacancy in pages.items()}
+
+    def save_page(self, job_title: str, vacancy: dict[str, str]) -> None:
+        """
+        Saves a fetched vacancy page of the job title.
+
+        Args:
+            job_title (str): The job title.
+            vacancy (dict[str, str]): The URL, title and content of the vacancy.
+        """
+        pages_key = self._get_pages_key(job_title)
+        with redis_client.pipeline() as pipeline:
+            pipeline.hset(pages_key, vacancy["url"], json.dumps(vacancy))
+            # The pages expire together with the rest of the checkpoints.
+            pipeline.expireat(pages_key, int(self.started_at + self.window))
+            pipeline.execute()
+
+    def save_days(self, days: Iterable[date]) -> None:
+        """
+        Saves the days the new vacancies of a job title are created on, before they are inserted.
+
+        The days are saved ahead, so that the vacancies inserted right before a crash are added to the cached
+        shards once the run is over, although the resumed run finds them in the database already.
+
+        Args:
+            days (Iterable[date]): The days of the new vacancies.
+        """
+        if days := {day.isoformat() for day in days}:
+            with redis_client.pipeline() as pipeline:
+                pipeline.sadd(self._days_key, *days)
+                pipeline.expireat(self._days_key, int(self.started_at + self.window))
+                pipeline.execute()
+
+    def get_days(self) -> set[date]:
+        """
+        Returns the days the new vacancies of the run are created on, including the ones before a restart.
+
+        Returns:
+            set[date]: The days of the new vacancies.
+        """
+        return {date.fromisoformat(day.decode()) for day in redis_client.smembers(self._days_key)}
+
+    def complete(self, job_title: str) -> None:
+        """
+        Marks the job title as completed, dropping its links and pages.
+
+        Args:
+            job_title (str): The job title.
+        """
+        with redis_client.pipeline() as pipeline:
+            pipeline.hset(self.key, f"completed:{job_title}", 1)
+            pipeline.hdel(self.key, f"links:{job_title}")
+            pipeline.delete(self._get_pages_key(job_title))
+            pipeline.execute()
+
+    def clear(self) -> None:
+        """
+        Drops the checkpoints, e.g. once the run has finished, so that the next run starts afresh.
+        """
+        # Every job title with fetched pages has its links saved first.
+        job_titles = [
+            field.decode().removeprefix("links:")
+            for field in redis_client.hkeys(self.key)
+            if field.startswith(b"links:")
+        ]
+        redis_client.delete(self.key, self._days_key, *(self._get_pages_key(job_title) for job_title in job_titles))
+
+
+def acquire_site_slot(site: str, limit: int, timeout: float = 60) -> Lock | None:
+    """
+    Takes one of the limited slots of a site, so that only so many of its work units are scraped at once.
+
+    The slot is meant to be renewed with `keep_lock_renewed` while the work unit is scraped, so that
+    a slow work unit keeps it however long it takes, while the slot of a killed worker is freed soon.
+
+    Args:
+        site (str): The site to scrape.
+        limit (int): The number of work units of the site that can be scraped at once.
+        timeout (float): For how long the slot is held if it isn't renewed, e.g. by a killed worker, in seconds.
+                         Defaults to 1 minute.
+
+    Returns:
+        Lock | None: The acquired slot to release once done, or None if all the slots are taken.
+    """
+    for slot in range(limit):
+        # The slot is renewed from another thread, which needs its token.
+        lock = redis_client.lock(f"lock:scrape_slot:{site}:{slot}", timeout=timeout, thread_local=False)
+        if lock.acquire(blocking=False):
+            return lock
+    return None
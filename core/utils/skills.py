@@ -0,0 +1,84 @@
+from functools import partial
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from keyword_processor import KeywordProcessor, matcher_registry
+from scrapers.models import Skill
+
+from .celery import hold_lock
+from .encoding import decode_skills, encode_skills
+
+# Set when the skills change, until the warmup swaps in a matcher built from them.
+SKILLS_CHANGED_KEY = "skills_changed"
+
+
+def get_skills_version() -> str:
+    # Get the version token of the skills, which is bumped whenever the Skill rows change.
+    skills_version = cache.get("skills_version")
+    if skills_version is None:
+        # Use add() so that concurrent workers agree on the same token.
+        cache.add("skills_version", uuid4().hex, None)
+        # Fall back to a one-off token if the cache can't store it (e.g. DummyCache).
+        skills_version = cache.get("skills_version") or uuid4().hex
+    return skills_version
+
+
+def _build_skills_snapshot(skills_from_db: list[tuple[str, list[str]]]) -> bytes:
+    keyword_processor = KeywordProcessor()
+    dict_of_skills = {clean_name: unclean_names for clean_name, unclean_names in skills_from_db}
+    keyword_processor.add_keywords_from_dict(dict_of_skills)
+    return keyword_processor.dumps()
+
+
+def build_skills_matcher(skills_version: str) -> KeywordProcessor:
+    # Load the matcher from its snapshot in the cache, so that a cold worker skips building the Trie.
+    # Both the compact and the Aho–Corasick engines work on the arrays of the snapshot in place.
+    snapshot_cache_key = f"skills_matcher:{skills_version}"
+    if (snapshot := cache.get(snapshot_cache_key)) is None:
+        # Only one process builds the missing snapshot, while the others wait for the lock and then load it.
+        with hold_lock(f"lock:{snapshot_cache_key}"):
+            if (snapshot := cache.get(snapshot_cache_key)) is None:
+                snapshot = _build_missing_skills_snapshot(snapshot_cache_key)
+    return KeywordProcessor.loads(snapshot, engine=settings.SKILLS_MATCHER_ENGINE)
+
+
+def _build_missing_skills_snapshot(snapshot_cache_key: str) -> bytes:
+    # The skills cached as a plain list by an older release are loaded from the database again.
+    if isinstance(encoded_skills := cache.get("skills_from_db"), bytes):
+        skills_from_db = decode_skills(encoded_skills)
+    else:
+        skills_from_db = list(Skill.objects.values_list("clean_name", "unclean_names"))
+        cache.set("skills_from_db", encode_skills(skills_from_db, compress=True), None)
+
+    snapshot = _build_skills_snapshot(skills_from_db)
+    cache.set(snapshot_cache_key, snapshot, None)
+    return snapshot
+
+
+def refresh_skills_matcher() -> str:
+    # Build the snapshot of the current skills under a new version first, and only then switch the readers to it,
+    # so that they keep using the previous matcher instead of building the new one inside a request.
+    skills_from_db = list(Skill.objects.values_list("clean_name", "unclean_names"))
+    skills_version = uuid4().hex
+    cache.set_many(
+        {
+            "skills_from_db": encode_skills(skills_from_db, compress=True),
+            f"skills_matcher:{skills_version}": _build_skills_snapshot(skills_from_db),
+        },
+        None,
+    )
+
+    previous_skills_version = cache.get("skills_version")
+    cache.set("skills_version", skills_version, None)
+    if previous_skills_version is not None:
+        # Keep the previous snapshot for a while for the processes that have just read its version.
+        cache.touch(f"skills_matcher:{previous_skills_version}", 60 * 60)
+    return skills_version
+
+
+def get_skills_matcher() -> KeywordProcessor:
+    # Get the compiled skills matcher of this process, rebuilding it only when the skills have changed.
+    skills_version = get_skills_version()
+    return matcher_registry.get("skills", skills_version, partial(build_skills_matcher, skills_version))
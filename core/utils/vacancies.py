@@ -0,0 +1,293 @@
+from array import array
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models.functions import TruncDate
+
+from scrapers.models import Vacancy
+
+from .cache import LocalLRUCache
+from .celery import hold_lock
+from .encoding import decode_vacancy_shard, encode_vacancy_shard
+
+SCORINGS = ("count", "frequency")
+VACANCIES_MANIFEST_KEY = "vacancies_manifest"
+VACANCIES_MANIFEST_LOCK_KEY = "lock:vacancies_manifest"
+
+
+@dataclass(frozen=True)
+class VacancySkillMatrix:
+    """A sparse skill × vacancy matrix of the cached vacancies in CSR format.
+
+    The row of a skill is the slice [offsets[id], offsets[id + 1]) of `positions`, the positions
+    of the vacancies in the cached list that require the skill, and `frequencies`, how many times
+    each of them mentions it. Since a row is a posting list of the skill, multiplying the matrix by
+    the skills of a resume touches only the vacancies that require at least one of them.
+
+    Attributes:
+        skill_ids (dict[str, int]): Row ids of the skills.
+        offsets (array): Offsets of each skill's row in the entry arrays.
+        positions (array): Positions of the vacancies in the cached list of vacancies.
+        frequencies (array): Frequencies of the skills in the vacancies.
+    """
+
+    skill_ids: dict[str, int]
+    offsets: array
+    positions: array
+    frequencies: array
+
+    @classmethod
+    def from_vacancies(cls, vacancies: list[dict]) -> "VacancySkillMatrix":
+        # Group the entries by skill first, so that each row is sorted by the position of the vacancy.
+        rows = defaultdict(list)
+        for position, vacancy in enumerate(vacancies):
+            for skill, frequency in vacancy["rated_skills"].items():
+                rows[skill].append((position, frequency))
+
+        skill_ids, offsets, positions, frequencies = {}, array("I", [0]), array("I"), array("I")
+        for skill_id, (skill, entries) in enumerate(rows.items()):
+            skill_ids[skill] = skill_id
+            for position, frequency in entries:
+                positions.append(position)
+                frequencies.append(frequency)
+            offsets.append(len(positions))
+        return cls(skill_ids, offsets, positions, frequencies)
+
+    def score(self, skills: Iterable[str], scoring: str = "count") -> dict[int, int]:
+        """
+        Multiplies the matrix by the vector of the given skills.
+
+        Args:
+            skills (Iterable[str]): The distinct skills to score the vacancies against.
+            scoring (str): Either "count" to score a vacancy by the number of the skills it requires,
+                           or "frequency" to sum up how many times it mentions them. Defaults to "count".
+
+        Raises:
+            ValueError: If the scoring is unknown.
+
+        Returns:
+            dict[int, int]: The scores of the vacancies that require any of the skills, by their positions.
+        """
+        if scoring not in SCORINGS:
+            raise ValueError(f"Unknown scoring: {scoring}. Choose one of: {', '.join(SCORINGS)}.")
+
+        offsets, positions, frequencies = self.offsets, self.positions, self.frequencies
+        is_weighted = scoring == "frequency"
+        scores = {}
+        for skill in skills:
+            if (skill_id := self.skill_ids.get(skill)) is None:
+                continue
+            for entry in range(offsets[skill_id], offsets[skill_id + 1]):
+                position = positions[entry]
+                scores[position] = scores.get(position, 0) + (frequencies[entry] if is_weighted else 1)
+        return scores
+
+
+@dataclass(frozen=True)
+class VacancyShard:
+    """The cached vacancies created on one day, stored in columns together with their skill matrix.
+
+    The rated skills of the vacancies aren't kept separately, since they are the columns of the matrix.
+
+    Attributes:
+        day (date): The day the vacancies were created.
+        urls (list[str]): The urls of the vacancies.
+        titles (list[str]): The titles of the vacancies.
+        vacancy_matrix (VacancySkillMatrix): The skill matrix of the vacancies, by their positions in the shard.
+    """
+
+    day: date
+    urls: list[str]
+    titles: list[str]
+    vacancy_matrix: VacancySkillMatrix
+
+    @classmethod
+    def from_vacancies(cls, day: date, vacancies: list[dict]) -> "VacancyShard":
+        urls = [vacancy["url"] for vacancy in vacancies]
+        titles = [vacancy["title"] for vacancy in vacancies]
+        return cls(day, urls, titles, VacancySkillMatrix.from_vacancies(vacancies))
+
+    @property
+    def vacancies(self) -> list[dict]:
+        """
+        Returns the url, title and rated skills of each vacancy, by transposing the skill matrix.
+
+        Returns:
+            list[dict]: The vacancies of the shard.
+        """
+        vacancy_matrix = self.vacancy_matrix
+        all_rated_skills = [{} for _ in self.urls]
+        for skill, skill_id in vacancy_matrix.skill_ids.items():
+            for entry in range(vacancy_matrix.offsets[skill_id], vacancy_matrix.offsets[skill_id + 1]):
+                all_rated_skills[vacancy_matrix.positions[entry]][skill] = vacancy_matrix.frequencies[entry]
+        return [
+            {"url": url, "title": title, "rated_skills": rated_skills}
+            for url, title, rated_skills in zip(self.urls, self.titles, all_rated_skills)
+        ]
+
+
+# Decoded shards kept in the memory of the process between requests by their days, validated by the manifest.
+# It holds more days than a week, which vacancies are kept for, so that the current shards are never evicted.
+local_vacancy_shards = LocalLRUCache(maxsize=32)
+
+
+def get_vacancies_version() -> str:
+    # Get the version token of the vacancies, which is bumped whenever scrapers or purge_db change them.
+    vacancies_version = cache.get("vacancies_version")
+    if vacancies_version is None:
+        # Use add() so that concurrent workers agree on the same token.
+        cache.add("vacancies_version", uuid4().hex, None)
+        # Fall back to a one-off token if the cache can't store it (e.g. DummyCache).
+        vacancies_version = cache.get("vacancies_version") or uuid4().hex
+    return vacancies_version
+
+
+def bump_vacancies_version() -> None:
+    # Mark everything computed from the previous vacancies as stale.
+    cache.set("vacancies_version", uuid4().hex, None)
+
+
+def _get_vacancy_shard_key(day: date, token: str) -> str:
+    # Shards are never overwritten in place, so a new token is generated whenever a day is rebuilt.
+    return f"vacancy_shard:{day.isoformat()}:{token}"
+
+
+def _build_vacancy_shards(days: Iterable[date] | None = None) -> dict[date, VacancyShard]:
+    # Load the vacancies of the given days, or all of them, grouped by the day they were created.
+    vacancies = Vacancy.objects.annotate(day=TruncDate("created_date")).order_by("created_date", "id")
+    if days is not None:
+        vacancies = vacancies.filter(day__in=days)
+
+    vacancies_by_day = defaultdict(list)
+    for vacancy in vacancies.values("url", "title", "rated_skills", "day"):
+        vacancies_by_day[vacancy.pop("day")].append(vacancy)
+    return {day: VacancyShard.from_vacancies(day, day_vacancies) for day, day_vacancies in vacancies_by_day.items()}
+
+
+def cache_vacancy_shards(days: Iterable[date] | None = None) -> dict[date, VacancyShard]:
+    """
+    Rebuilds the cached shards of the given days, or all of them, and points the manifest to them.
+
+    The shards of the other days are left untouched, so that scrapers only rebuild the shard
+    of the day they added vacancies to. If the manifest itself is missing, all the shards are
+    rebuilt, since the other days would be lost otherwise. The current shards don't expire,
+    since they are replaced whenever the vacancies change, so readers never find them cold.
+    The manifest is updated under a lock, since its writers, e.g. a scraper and purge_db, merge
+    their changes into it, so that they don't undo each other's changes.
+
+    Args:
+        days (Iterable[date] | None): The days to rebuild the shards of. Defaults to None, i.e. all the days.
+
+    Returns:
+        dict[date, VacancyShard]: The rebuilt shards by their days.
+    """
+    with hold_lock(VACANCIES_MANIFEST_LOCK_KEY):
+        return _cache_vacancy_shards(days)
+
+
+def _cache_vacancy_shards(days: Iterable[date] | None = None) -> dict[date, VacancyShard]:
+    # Rebuild the shards and swap the manifest to them, while the caller holds the lock of the manifest.
+    manifest = cache.get(VACANCIES_MANIFEST_KEY)
+    if manifest is None:
+        days = None
+    if days is not None:
+        days = set(days)
+
+    shards = _build_vacancy_shards(days)
+    tokens = {day: uuid4().hex for day in shards}
+    # The shards are stored before the manifest, so that readers never find a manifest pointing to missing shards.
+    cache.set_many(
+        {
+            _get_vacancy_shard_key(day, tokens[day]): encode_vacancy_shard(shard, compress=True)
+            for day, shard in shards.items()
+        },
+        None,
+    )
+    for day, shard in shards.items():
+        local_vacancy_shards.set(day, tokens[day], shard)
+
+    # Swap the manifest to the new shards at once. The days without vacancies left are dropped from it.
+    replaced_tokens = {}
+    if manifest is not None:
+        replaced_tokens = {day: token for day, token in manifest.items() if days is None or day in days}
+    if days is not None:
+        tokens = {day: token for day, token in manifest.items() if day not in days} | tokens
+    cache.set(VACANCIES_MANIFEST_KEY, tokens, None)
+
+    # Keep the replaced shards for a while for the readers that have just loaded the previous manifest.
+    for day, token in replaced_tokens.items():
+        cache.touch(_get_vacancy_shard_key(day, token), 60 * 60)
+    return shards
+
+
+def drop_vacancy_shards(before: date) -> None:
+    # Drop the shards of the days before the given one, e.g. the days whose vacancies are all purged.
+    with hold_lock(VACANCIES_MANIFEST_LOCK_KEY):
+        manifest = cache.get(VACANCIES_MANIFEST_KEY)
+        if manifest is None:
+            return
+
+        expired_days = {day for day in manifest if day < before}
+        cache.set(
+            VACANCIES_MANIFEST_KEY,
+            {day: token for day, token in manifest.items() if day not in expired_days},
+            None,
+        )
+    cache.delete_many([_get_vacancy_shard_key(day, manifest[day]) for day in expired_days])
+
+
+def get_vacancy_shards() -> list[VacancyShard]:
+    """
+    Returns the shards of the cached vacancies, ordered by day.
+
+    Only the small manifest is fetched on every call, while the shards themselves are decoded
+    once and kept in the local LRU tier until the manifest points to a newer token of their day.
+    Shards that are missing from the cache are rebuilt from the database by a single process.
+
+    Returns:
+        list[VacancyShard]: The shards of the cached vacancies.
+    """
+    manifest = cache.get(VACANCIES_MANIFEST_KEY)
+    if manifest is None:
+        # Only one process rebuilds the shards on a cold cache, e.g. after Redis is flushed, while the others
+        # wait for the lock and then read the shards it has cached.
+        with hold_lock(VACANCIES_MANIFEST_LOCK_KEY):
+            if (manifest := cache.get(VACANCIES_MANIFEST_KEY)) is None:
+                shards = _cache_vacancy_shards()
+                return [shards[day] for day in sorted(shards)]
+
+    shards, missing_tokens = {}, {}
+    for day, token in manifest.items():
+        if (shard := local_vacancy_shards.get(day, token)) is not None:
+            shards[day] = shard
+        else:
+            missing_tokens[day] = token
+
+    if missing_tokens:
+        shard_keys = {day: _get_vacancy_shard_key(day, token) for day, token in missing_tokens.items()}
+        encoded_shards = cache.get_many(shard_keys.values())
+        if evicted_shard_keys := {day: key for day, key in shard_keys.items() if key not in encoded_shards}:
+            encoded_shards |= _rebuild_evicted_vacancy_shards(evicted_shard_keys)
+        for day, token in missing_tokens.items():
+            shard = decode_vacancy_shard(encoded_shards[shard_keys[day]])
+            local_vacancy_shards.set(day, token, shard)
+            shards[day] = shard
+
+    return [shards[day] for day in sorted(shards)]
+
+
+def _rebuild_evicted_vacancy_shards(shard_keys: dict[date, str]) -> dict[str, bytes]:
+    # Rebuild the evicted shards under the same keys, so that the manifest stays valid. Only one process rebuilds
+    # them, while the others wait for the lock and then find them cached.
+    with hold_lock(VACANCIES_MANIFEST_LOCK_KEY):
+        encoded_shards = cache.get_many(shard_keys.values())
+        for day, shard_key in shard_keys.items():
+            if shard_key not in encoded_shards:
+                shard = _build_vacancy_shards([day]).get(day) or VacancyShard.from_vacancies(day, [])
+                encoded_shards[shard_key] = encode_vacancy_shard(shard, compress=True)
+                cache.set(shard_key, encoded_shards[shard_key], None)
+    return encoded_shards
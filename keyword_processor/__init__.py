@@ -1 +1,2 @@
 from .processor import KeywordProcessor  # noqa
+from .registry import MatcherRegistry, matcher_registry  # noqa
@@ -0,0 +1,202 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Iterable, Iterator
+from heapq import heappop, heappush
+from itertools import chain
+
+from . import snapshot
+from .compact import CompactTrie
+
+MATCH_POLICIES = ("longest", "all")
+
+
+class AhoCorasickAutomaton(CompactTrie):
+    """An Aho–Corasick automaton on top of the array-backed Trie.
+
+    Unlike the plain Trie walk, which jumps back to the root on a mismatch and never
+    looks at the skipped characters again, the automaton follows failure links to the
+    longest proper suffix of the current path that is also a path in the Trie. Hence a
+    single pass over the text finds every occurrence of every keyword, including the
+    ones that start inside a partial match of a longer keyword, e.g. "java" in "jjava".
+
+    Only whole words are matched: a keyword can't be preceded or followed by an
+    alphanumeric character, unless the keyword itself starts with a non-alphanumeric
+    character (e.g. ".net" in "asp.net").
+
+    Args:
+        data (bytes | bytearray | memoryview): The binary snapshot made by `snapshot.encode`.
+    """
+
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        super().__init__(data)
+        node_count = self.snapshot.node_count
+        edge_offsets, edge_chars, edge_targets = (
+            self.snapshot.edge_offsets,
+            self.snapshot.edge_chars,
+            self.snapshot.edge_targets,
+        )
+        terminals = self.snapshot.terminals
+
+        self.fail = array("I", bytes(4 * node_count))
+        # The length of the longest keyword bounds how long a match has to wait for a longer overlapping one.
+        self.max_length = 0
+        depths = array("I", bytes(4 * node_count))
+        # Keywords ending at each node: its own one plus the ones reachable by failure links, longest first.
+        self.outputs: list[tuple[tuple[int, int], ...]] = [()] * node_count
+
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            for edge in range(edge_offsets[node], edge_offsets[node + 1]):
+                char, target = chr(edge_chars[edge]), edge_targets[edge]
+                depths[target] = depths[node] + 1
+                if node != 0:
+                    self.fail[target] = self.transition(self.fail[node], char)
+
+                own_output = ()
+                if (clean_name_id := terminals[target]) != snapshot.NO_CLEAN_NAME:
+                    own_output = ((clean_name_id, depths[target]),)
+                    self.max_length = max(self.max_length, depths[target])
+                self.outputs[target] = own_output + self.outputs[self.fail[target]]
+                queue.append(target)
+
+    def transition(self, node: int, char: str) -> int:
+        """
+        Returns the next state of the automaton, following failure links on a mismatch.
+
+        Args:
+            node (int): The index of the current node.
+            char (str): The next character of the text.
+
+        Returns:
+            int: The index of the next node, which is the root if no keyword continues with the character.
+        """
+        while (next_node := self.child(node, char)) is None:
+            if node == 0:
+                return 0
+            node = self.fail[node]
+        return next_node
+
+    def extract_keywords(
+        self, text: str, span_info: bool = False, match_policy: str = "longest"
+    ) -> list[str | tuple[str, int, int]]:
+        """
+        Extracts keywords from an already normalized text.
+
+        Args:
+            text (str): The normalized text to extract keywords from.
+            span_info (bool): If True, returns tuples with the keyword and its span. Defaults to False.
+            match_policy (str): Either "longest" to keep the leftmost-longest matches that don't overlap,
+                                or "all" to keep every match, ordered by where it ends. Defaults to "longest".
+
+        Returns:
+            list[str | tuple[str, int, int]]: A list of extracted keywords, or tuples with their spans.
+        """
+        return list(self.iter_keywords(text, span_info, match_policy))
+
+    def iter_keywords(
+        self, text: str, span_info: bool = False, match_policy: str = "longest"
+    ) -> Iterator[str | tuple[str, int, int]]:
+        """
+        Lazily yields keywords from an already normalized text, in the order of `extract_keywords`.
+
+        With the "longest" policy, a match is held back only until no longer overlapping match
+        can start before it, i.e. for at most the length of the longest keyword.
+
+        Args:
+            text (str): The normalized text to extract keywords from.
+            span_info (bool): If True, yields tuples with the keyword and its span. Defaults to False.
+            match_policy (str): Either "longest" or "all". Defaults to "longest".
+
+        Yields:
+            str | tuple[str, int, int]: An extracted keyword, or a tuple with its span.
+        """
+        return self.iter_keywords_from_chunks((text,), span_info, match_policy)
+
+    def iter_keywords_from_chunks(
+        self, chunks: Iterable[str], span_info: bool = False, match_policy: str = "longest"
+    ) -> Iterator[str | tuple[str, int, int]]:
+        """
+        Lazily yields keywords from a text split into already normalized chunks.
+
+        The state of the automaton is carried across the chunks, together with the tail of
+        the previous chunk that is needed to check the word boundary before a keyword, so
+        the matches and their spans are the same as for the concatenated text.
+
+        Args:
+            chunks (Iterable[str]): The normalized chunks of the text.
+            span_info (bool): If True, yields tuples with the keyword and its span. Defaults to False.
+            match_policy (str): Either "longest" or "all". Defaults to "longest".
+
+        Yields:
+            str | tuple[str, int, int]: An extracted keyword, or a tuple with its span.
+        """
+        clean_names = self.snapshot.clean_names
+        edge_offsets = self.snapshot.edge_offsets
+        edge_chars = self.snapshot.edge_chars
+        edge_targets = self.snapshot.edge_targets
+        root_children = self._root_children
+        fail = self.fail
+        outputs = self.outputs
+        max_length = self.max_length
+        keep_longest = match_policy == "longest"
+        # A heap of candidate matches as tuples of start index, negated end index and clean name id.
+        candidates = []
+        last_end_idx = 0
+        node = 0
+        offset = 0
+        window = ""
+
+        # The trailing non-alphanumeric sentinel closes a keyword that ends the text.
+        for chunk in chain(chunks, (" ",)):
+            # The window keeps enough of the previous chunks to look at the character before any keyword.
+            window = window[-(max_length + 1) :] + chunk
+            window_offset = offset + len(chunk) - len(window)
+
+            for idx, char in enumerate(chunk, offset):
+                # The keywords ending at the previous character are checked once the next one is known.
+                if outputs[node] and not char.isalnum():
+                    for clean_name_id, length in outputs[node]:
+                        start_idx = idx - length
+                        if (
+                            start_idx > 0
+                            and window[start_idx - window_offset - 1].isalnum()
+                            and window[start_idx - window_offset].isalnum()
+                        ):
+                            continue
+                        if keep_longest:
+                            heappush(candidates, (start_idx, -idx, clean_name_id))
+                        else:
+                            clean_name = clean_names[clean_name_id]
+                            yield (clean_name, start_idx, idx) if span_info else clean_name
+
+                    # Any later match ends after this position, so it can't start before the threshold.
+                    threshold = idx + 1 - max_length
+                    while candidates and candidates[0][0] < threshold:
+                        start_idx, end_idx, clean_name_id = heappop(candidates)
+                        if start_idx >= last_end_idx:
+                            last_end_idx = -end_idx
+                            clean_name = clean_names[clean_name_id]
+                            yield (clean_name, start_idx, -end_idx) if span_info else clean_name
+
+                # The transition() is inlined, since it's the hot path of the whole automaton.
+                while True:
+                    if node == 0:
+                        node = root_children.get(char, 0)
+                        break
+                    lo, hi = edge_offsets[node], edge_offsets[node + 1]
+                    code_point = ord(char)
+                    edge = bisect_left(edge_chars, code_point, lo, hi)
+                    if edge < hi and edge_chars[edge] == code_point:
+                        node = edge_targets[edge]
+                        break
+                    node = fail[node]
+            offset += len(chunk)
+
+        while candidates:
+            start_idx, end_idx, clean_name_id = heappop(candidates)
+            if start_idx >= last_end_idx:
+                last_end_idx = -end_idx
+                clean_name = clean_names[clean_name_id]
+                yield (clean_name, start_idx, -end_idx) if span_info else clean_name
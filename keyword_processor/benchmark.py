@@ -0,0 +1,96 @@
+"""Compares the memory footprint and throughput of the KeywordProcessor engines.
+
+Run it with the skills fixture of the project or with synthetic keywords:
+
+    python -m keyword_processor.benchmark --skills scrapers/fixtures/skills.json
+    python -m keyword_processor.benchmark --synthetic 20000
+"""
+import argparse
+import json
+import random
+import string
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from .processor import ENGINES, KeywordProcessor
+
+
+def load_skills(path: str) -> dict[str, list[str]]:
+    # Read the clean names and their aliases from a Django fixture of the Skill model.
+    with open(path) as file:
+        fixture = json.load(file)
+    return {item["fields"]["clean_name"]: item["fields"]["unclean_names"] for item in fixture}
+
+
+def generate_skills(amount: int, rng: random.Random) -> dict[str, list[str]]:
+    # Generate random clean names with a few aliases each.
+    def word():
+        return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 12)))
+
+    return {f"Skill {idx}": [word() for _ in range(rng.randint(1, 6))] for idx in range(amount)}
+
+
+def generate_text(keyword_dict: dict[str, list[str]], size: int, rng: random.Random) -> str:
+    # Generate a text where roughly every tenth word is a keyword.
+    keywords = [keyword for keywords in keyword_dict.values() for keyword in keywords]
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(keywords) if rng.random() < 0.1 else "".join(rng.choices(string.ascii_lowercase, k=6))
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def measure(function: Callable) -> tuple[object, float, int]:
+    # Return the result of the function, its duration in seconds and the memory it has allocated in bytes.
+    # The duration is measured separately, because tracing the allocations slows them down considerably.
+    started_at = time.perf_counter()
+    function()
+    duration = time.perf_counter() - started_at
+    tracemalloc.start()
+    result = function()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, duration, allocated
+
+
+def run(keyword_dict: dict[str, list[str]], text: str) -> None:
+    def build():
+        keyword_processor = KeywordProcessor()
+        keyword_processor.add_keywords_from_dict(keyword_dict)
+        return keyword_processor
+
+    keyword_processor, build_duration, trie_memory = measure(build)
+    data = keyword_processor.dumps()
+    print(f"Keywords: {sum(len(keywords) for keywords in keyword_dict.values())}, text: {len(text)} chars")
+    print(f"Building the node-based Trie: {build_duration * 1000:.1f} ms, {trie_memory / 2**20:.2f} MiB")
+    print(f"Snapshot: {len(data) / 2**20:.2f} MiB")
+
+    for engine in ENGINES:
+        loaded_processor, load_duration, load_memory = measure(lambda: KeywordProcessor.loads(data, engine=engine))
+        started_at = time.perf_counter()
+        loaded_processor.extract_keywords(text)
+        extract_duration = time.perf_counter() - started_at
+        print(
+            f"{engine}: loading {load_duration * 1000:.1f} ms, {load_memory / 2**20:.2f} MiB excluding the snapshot, "
+            f"extracting {len(text) / extract_duration / 2**20:.2f} MiB of text per second"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skills", help="Path to a Django fixture with Skill records.")
+    parser.add_argument("--synthetic", type=int, default=10_000, help="Number of synthetic clean names.")
+    parser.add_argument("--text-size", type=int, default=2_000_000, help="Size of the text in characters.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)  # nosec B311
+    keyword_dict = load_skills(args.skills) if args.skills else generate_skills(args.synthetic, rng)
+    run(keyword_dict, generate_text(keyword_dict, args.text_size, rng))
+
+
+if __name__ == "__main__":
+    main()
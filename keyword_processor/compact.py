@@ -0,0 +1,139 @@
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from itertools import chain
+
+from . import snapshot
+
+
+class CompactTrie:
+    """A read-only Trie stored in contiguous arrays.
+
+    The transitions are kept in CSR-style tables of the binary snapshot: the edges of
+    node N are the slice [edge_offsets[N], edge_offsets[N + 1]) of the `edge_chars` and
+    `edge_targets` arrays, sorted by code point, so a transition is a binary search
+    instead of a dictionary lookup on a per-node object. Since the arrays are used in
+    place, a Trie loaded from a memory-mapped snapshot is shared between processes by
+    the OS page cache. Transitions of the root, which are tried for almost every
+    character of a text, are additionally kept in a small dictionary.
+
+    Attributes:
+        data (bytes | bytearray | memoryview): The binary snapshot the Trie is backed by.
+        snapshot (snapshot.Snapshot): The decoded arrays of the snapshot.
+
+    Args:
+        data (bytes | bytearray | memoryview): The binary snapshot made by `snapshot.encode`.
+    """
+
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        self.data = data
+        self.snapshot = snapshot.decode(data)
+        self._root_children = {
+            chr(self.snapshot.edge_chars[edge]): self.snapshot.edge_targets[edge]
+            for edge in range(self.snapshot.edge_offsets[0], self.snapshot.edge_offsets[1])
+        }
+
+    def child(self, node: int, char: str) -> int | None:
+        """
+        Returns the node reached from the given node by the character.
+
+        Args:
+            node (int): The index of the current node.
+            char (str): The next character of the text.
+
+        Returns:
+            int | None: The index of the child node, or None if there is no such transition.
+        """
+        if node == 0:
+            return self._root_children.get(char)
+
+        edge_chars = self.snapshot.edge_chars
+        lo, hi = self.snapshot.edge_offsets[node], self.snapshot.edge_offsets[node + 1]
+        code_point = ord(char)
+        edge = bisect_left(edge_chars, code_point, lo, hi)
+        if edge < hi and edge_chars[edge] == code_point:
+            return self.snapshot.edge_targets[edge]
+        return None
+
+    def extract_keywords(self, text: str, span_info: bool = False) -> list[str | tuple[str, int, int]]:
+        """
+        Extracts keywords from an already normalized text.
+
+        The matching rules are the same as in `KeywordProcessor.extract_keywords`.
+
+        Args:
+            text (str): The normalized text to extract keywords from.
+            span_info (bool): If True, returns tuples with the keyword and its span. Defaults to False.
+
+        Returns:
+            list[str | tuple[str, int, int]]: A list of extracted keywords, or tuples with their spans.
+        """
+        return list(self.iter_keywords(text, span_info))
+
+    def iter_keywords(self, text: str, span_info: bool = False) -> Iterator[str | tuple[str, int, int]]:
+        """
+        Lazily yields keywords from an already normalized text, in the order of `extract_keywords`.
+
+        Args:
+            text (str): The normalized text to extract keywords from.
+            span_info (bool): If True, yields tuples with the keyword and its span. Defaults to False.
+
+        Yields:
+            str | tuple[str, int, int]: An extracted keyword, or a tuple with its span.
+        """
+        return self.iter_keywords_from_chunks((text,), span_info)
+
+    def iter_keywords_from_chunks(
+        self, chunks: Iterable[str], span_info: bool = False
+    ) -> Iterator[str | tuple[str, int, int]]:
+        """
+        Lazily yields keywords from a text split into already normalized chunks.
+
+        The state of the walk is carried across the chunks, so the matches and their spans are
+        the same as for the concatenated text, while only one chunk is held in memory at a time.
+
+        Args:
+            chunks (Iterable[str]): The normalized chunks of the text.
+            span_info (bool): If True, yields tuples with the keyword and its span. Defaults to False.
+
+        Yields:
+            str | tuple[str, int, int]: An extracted keyword, or a tuple with its span.
+        """
+        terminals = self.snapshot.terminals
+        clean_names = self.snapshot.clean_names
+        edge_offsets = self.snapshot.edge_offsets
+        edge_chars = self.snapshot.edge_chars
+        edge_targets = self.snapshot.edge_targets
+        root_children = self._root_children
+        node = 0
+        start_idx = 0
+        offset = 0
+        # A keyword that ends at the previous character, waiting for the next one to check the word boundary.
+        pending_clean_name_id = snapshot.NO_CLEAN_NAME
+
+        # The trailing non-alphanumeric sentinel closes a keyword that ends the text.
+        for chunk in chain(chunks, (" ",)):
+            for idx, char in enumerate(chunk, offset):
+                if pending_clean_name_id != snapshot.NO_CLEAN_NAME:
+                    if not char.isalnum():
+                        clean_name = clean_names[pending_clean_name_id]
+                        yield (clean_name, start_idx, idx) if span_info else clean_name
+                        node = 0
+                        start_idx = idx
+                    pending_clean_name_id = snapshot.NO_CLEAN_NAME
+
+                # The lookup of child() is inlined, since it's the hot path of the whole processor.
+                if node == 0:
+                    next_node = root_children.get(char)
+                else:
+                    lo, hi = edge_offsets[node], edge_offsets[node + 1]
+                    code_point = ord(char)
+                    edge = bisect_left(edge_chars, code_point, lo, hi)
+                    next_node = edge_targets[edge] if edge < hi and edge_chars[edge] == code_point else None
+
+                if next_node is not None:
+                    node = next_node
+                    pending_clean_name_id = terminals[node]
+                else:
+                    node = 0
+                    start_idx = idx + 1
+            offset += len(chunk)
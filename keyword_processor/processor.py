@@ -1,4 +1,31 @@
-from collections import defaultdict
+import mmap
+import multiprocessing
+import os
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import chain
+from typing import Self
+
+from . import snapshot
+from .aho_corasick import MATCH_POLICIES, AhoCorasickAutomaton
+from .compact import CompactTrie
+
+ENGINES = ("trie", "compact", "aho_corasick")
+
+# The processor of a pool worker, so that it's transferred once per process instead of once per text.
+_worker_processor: "KeywordProcessor | None" = None
+
+
+def _init_worker(keyword_processor: "KeywordProcessor") -> None:
+    global _worker_processor
+    _worker_processor = keyword_processor
+
+
+def _call_in_worker(method_name: str, text: str, *args):
+    return getattr(_worker_processor, method_name)(text, *args)
 
 
 class TrieNode:
@@ -37,23 +64,104 @@ class TrieNode:
         node.is_end_of_word = True
         node.clean_name = clean_name
 
+    @classmethod
+    def from_snapshot(cls, trie_snapshot: snapshot.Snapshot) -> "TrieNode":
+        """
+        Rebuilds the Trie from a decoded snapshot.
+
+        The nodes are created in a single pass over the flat arrays of the snapshot,
+        so no keyword has to be walked and inserted character by character.
+
+        Args:
+            trie_snapshot (snapshot.Snapshot): The decoded snapshot of the Trie.
+
+        Returns:
+            TrieNode: The root node of the rebuilt Trie.
+        """
+        nodes = [cls() for _ in range(trie_snapshot.node_count)]
+        edge_offsets = trie_snapshot.edge_offsets
+        edge_chars = trie_snapshot.edge_chars
+        edge_targets = trie_snapshot.edge_targets
+
+        for idx, node in enumerate(nodes):
+            for edge in range(edge_offsets[idx], edge_offsets[idx + 1]):
+                node.children[chr(edge_chars[edge])] = nodes[edge_targets[edge]]
+            if (clean_name_id := trie_snapshot.terminals[idx]) != snapshot.NO_CLEAN_NAME:
+                node.is_end_of_word = True
+                node.clean_name = trie_snapshot.clean_names[clean_name_id]
+
+        return nodes[0]
+
 
 class KeywordProcessor:
     """Processes and extracts keywords from text using a Trie structure.
 
     This class provides methods to add keywords, normalize text, and extract keywords from text.
+    Keywords are always added to the node-based Trie, while the matching is done by one of the engines:
+
+    - "trie" walks the node-based Trie, which is the fastest to extend with new keywords.
+    - "compact" walks the CompactTrie, which keeps the whole automaton in a few contiguous arrays.
+      It's compiled from the node-based Trie on the first extraction after the keywords change,
+      or used in place when the processor is loaded from a snapshot.
+    - "aho_corasick" runs the AhoCorasickAutomaton on top of the CompactTrie, which finds every
+      whole-word match in a single pass, including the ones the greedy Trie walk skips over.
+      The `match_policy` decides whether to keep the leftmost-longest matches or all of them.
 
     Attributes:
         case_sensitive (bool): Determines if keyword matching is case-sensitive.
+        engine (str): The engine used to extract keywords.
+        match_policy (str): The policy for overlapping matches of the "aho_corasick" engine.
         root (TrieNode): The root node of the Trie structure.
 
     Args:
         case_sensitive (bool): Specifies if the keyword matching should be case-sensitive. Defaults to False.
+        engine (str): The engine used to extract keywords: "trie", "compact" or "aho_corasick". Defaults to "trie".
+        match_policy (str): Either "longest" or "all", used by the "aho_corasick" engine. Defaults to "longest".
+
+    Raises:
+        ValueError: If the engine or the match policy is unknown.
     """
 
-    def __init__(self, case_sensitive: bool = False):
-        self.root = TrieNode()
+    def __init__(self, case_sensitive: bool = False, engine: str = "trie", match_policy: str = "longest"):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown keyword processor engine: {engine}. Choose one of: {', '.join(ENGINES)}.")
+        if match_policy not in MATCH_POLICIES:
+            raise ValueError(f"Unknown match policy: {match_policy}. Choose one of: {', '.join(MATCH_POLICIES)}.")
+        self._root: TrieNode | None = TrieNode()
+        self._compact_trie: CompactTrie | None = None
         self.case_sensitive = case_sensitive
+        self.engine = engine
+        self.match_policy = match_policy
+
+    def __reduce__(self):
+        # Pickle the processor as its binary snapshot, which is much smaller than the graph of nodes
+        # and is the only way to pickle the engines backed by memory views.
+        return self.__class__.loads, (self.dumps(), self.engine, self.match_policy)
+
+    @property
+    def root(self) -> TrieNode:
+        # Processors loaded straight into the compact engine materialize the node-based Trie only when needed.
+        if self._root is None:
+            self._root = TrieNode.from_snapshot(self._compact_trie.snapshot)
+        return self._root
+
+    @root.setter
+    def root(self, root: TrieNode) -> None:
+        self._root = root
+        self._compact_trie = None
+
+    @property
+    def compact_trie(self) -> CompactTrie:
+        """
+        Returns the CompactTrie with the current keywords, compiling it if the keywords have changed.
+
+        Returns:
+            CompactTrie: The array-backed Trie.
+        """
+        if self._compact_trie is None:
+            compact_trie_class = AhoCorasickAutomaton if self.engine == "aho_corasick" else CompactTrie
+            self._compact_trie = compact_trie_class(self.dumps())
+        return self._compact_trie
 
     def _normalize(self, text: str) -> str:
         """
@@ -78,6 +186,7 @@ class KeywordProcessor:
         clean_name = clean_name or keyword
         keyword = self._normalize(keyword)
         self.root.insert(keyword, clean_name)
+        self._compact_trie = None
 
     def add_keywords_from_dict(self, keyword_dict: dict[str, list[str]]) -> None:
         """
@@ -90,6 +199,84 @@ class KeywordProcessor:
             for keyword in keywords:
                 self.add_keyword(keyword, clean_name)
 
+    def dumps(self) -> bytes:
+        """
+        Serializes the keywords into a compact binary snapshot, e.g. to store it in a cache.
+
+        Returns:
+            bytes: The binary snapshot of the Trie.
+        """
+        if self._root is None:
+            return bytes(self._compact_trie.data)
+        return snapshot.encode(self._root, self.case_sensitive)
+
+    @classmethod
+    def loads(cls, data: bytes | bytearray | memoryview, engine: str = "trie", match_policy: str = "longest") -> Self:
+        """
+        Creates a processor from a binary snapshot made by `dumps`.
+
+        With the "compact" and "aho_corasick" engines, the arrays of the snapshot are used
+        in place and no Python object is created per Trie node.
+
+        Args:
+            data (bytes | bytearray | memoryview): The binary snapshot of the Trie.
+            engine (str): The engine used to extract keywords. Defaults to "trie".
+            match_policy (str): The policy for overlapping matches. Defaults to "longest".
+
+        Raises:
+            ValueError: If the data isn't a valid snapshot, or the engine or the match policy is unknown.
+
+        Returns:
+            KeywordProcessor: The processor with all the keywords from the snapshot.
+        """
+        if engine in ("compact", "aho_corasick"):
+            compact_trie = (AhoCorasickAutomaton if engine == "aho_corasick" else CompactTrie)(data)
+            keyword_processor = cls(compact_trie.snapshot.case_sensitive, engine, match_policy)
+            keyword_processor._root = None
+            keyword_processor._compact_trie = compact_trie
+            return keyword_processor
+
+        trie_snapshot = snapshot.decode(data)
+        keyword_processor = cls(trie_snapshot.case_sensitive, engine, match_policy)
+        keyword_processor.root = TrieNode.from_snapshot(trie_snapshot)
+        return keyword_processor
+
+    def dump(self, path: str | os.PathLike) -> None:
+        """
+        Writes the binary snapshot of the keywords to a file.
+
+        Args:
+            path (str | os.PathLike): The path of the snapshot file.
+        """
+        with open(path, "wb") as file:
+            file.write(self.dumps())
+
+    @classmethod
+    def load(cls, path: str | os.PathLike, engine: str = "trie", match_policy: str = "longest") -> Self:
+        """
+        Creates a processor from a snapshot file written by `dump`, memory-mapping it instead of reading.
+
+        Args:
+            path (str | os.PathLike): The path of the snapshot file.
+            engine (str): The engine used to extract keywords. Defaults to "trie".
+            match_policy (str): The policy for overlapping matches. Defaults to "longest".
+
+        Raises:
+            ValueError: If the file isn't a valid snapshot, or the engine or the match policy is unknown.
+
+        Returns:
+            KeywordProcessor: The processor with all the keywords from the snapshot.
+        """
+        with open(path, "rb") as file:
+            mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if engine in ("compact", "aho_corasick"):
+            # These engines read the arrays in place, so the file stays mapped while the processor is alive.
+            return cls.loads(mapped_file, engine, match_policy)
+
+        with mapped_file:
+            return cls.loads(mapped_file, engine, match_policy)
+
     def extract_keywords(self, text: str, span_info=False) -> list[str | tuple[str, int, int]]:
         """
         Extracts keywords from a text. This method navigates through the Trie structure
@@ -118,22 +305,205 @@ class KeywordProcessor:
                                             containing the keyword and its span
                                             (start and end indices) in the text.
         """
+        return list(self.iter_keywords(text, span_info))
+
+    def iter_keywords(self, text: str, span_info: bool = False) -> Iterator[str | tuple[str, int, int]]:
+        """
+        Lazily yields keywords from a text, in the order of `extract_keywords`.
+
+        Useful when the matches are only aggregated, since no intermediate list is built.
+
+        Args:
+            text (str): The text to extract keywords from.
+            span_info (bool): If True, yields tuples with the keyword and its span. Defaults to False.
+
+        Yields:
+            str | tuple[str, int, int]: An extracted keyword, or a tuple with its span.
+        """
         normalized_text = self._normalize(text)
-        results = []
-        node = self.root
+        if self.engine == "aho_corasick":
+            return self.compact_trie.iter_keywords(normalized_text, span_info, self.match_policy)
+        if self.engine == "compact":
+            return self.compact_trie.iter_keywords(normalized_text, span_info)
+        return self._iter_trie_keywords((normalized_text,), span_info)
+
+    def iter_keywords_from_chunks(
+        self, chunks: Iterable[str], span_info: bool = False
+    ) -> Iterator[str | tuple[str, int, int]]:
+        """
+        Lazily yields keywords from a text split into chunks, e.g. the pages of a PDF.
+
+        Each chunk is normalized on its own, and the state of the engine, including the
+        word-boundary context, is carried across the chunks. Hence the matches and their
+        spans are the same as for the concatenated text, while the memory used doesn't grow
+        with the size of the document.
+
+        Args:
+            chunks (Iterable[str]): The consecutive chunks of the text.
+            span_info (bool): If True, yields tuples with the keyword and its span. Defaults to False.
+
+        Yields:
+            str | tuple[str, int, int]: An extracted keyword, or a tuple with its span.
+        """
+        normalized_chunks = (self._normalize(chunk) for chunk in chunks)
+        if self.engine == "aho_corasick":
+            return self.compact_trie.iter_keywords_from_chunks(normalized_chunks, span_info, self.match_policy)
+        if self.engine == "compact":
+            return self.compact_trie.iter_keywords_from_chunks(normalized_chunks, span_info)
+        return self._iter_trie_keywords(normalized_chunks, span_info)
+
+    def _iter_trie_keywords(
+        self, normalized_chunks: Iterable[str], span_info: bool
+    ) -> Iterator[str | tuple[str, int, int]]:
+        root = self.root
+        node = root
         start_idx = 0
+        offset = 0
+        # A node that ends a keyword at the previous character, waiting for the next one to check the word boundary.
+        pending_node = None
+
+        # The trailing non-alphanumeric sentinel closes a keyword that ends the text.
+        for chunk in chain(normalized_chunks, (" ",)):
+            for idx, char in enumerate(chunk, offset):
+                if pending_node is not None:
+                    if not char.isalnum():
+                        yield (pending_node.clean_name, start_idx, idx) if span_info else pending_node.clean_name
+                        node = root
+                        start_idx = idx
+                    pending_node = None
+
+                if char in node.children:
+                    node = node.children[char]
+                    if node.is_end_of_word:
+                        pending_node = node
+                else:
+                    node = root
+                    start_idx = idx + 1
+            offset += len(chunk)
+
+    def count_keywords(self, text: str) -> Counter[str]:
+        """
+        Counts the occurrences of each keyword in a text.
+
+        The matches are counted as they are found, so neither the list of keywords
+        nor their spans are ever materialized.
+
+        Args:
+            text (str): The text to count keywords in.
+
+        Returns:
+            Counter[str]: The number of occurrences of each clean name found in the text.
+        """
+        return Counter(self.iter_keywords(text))
+
+    def distinct_keywords(self, text: str) -> set[str]:
+        """
+        Returns the keywords found in a text at least once.
+
+        Args:
+            text (str): The text to extract keywords from.
+
+        Returns:
+            set[str]: The clean names found in the text.
+        """
+        return set(self.iter_keywords(text))
+
+    def extract_keywords_many(
+        self,
+        texts: Iterable[str],
+        span_info: bool = False,
+        processes: int | None = 1,
+        chunksize: int = 16,
+        pool: ProcessPoolExecutor | None = None,
+    ) -> list[list[str | tuple[str, int, int]]]:
+        """
+        Extracts keywords from many texts, optionally spreading them across a pool of processes.
+
+        The pool workers receive the processor once at startup: they inherit it from the parent
+        process where the "fork" start method is available, or unpickle it from its binary
+        snapshot otherwise. The texts are then sent to the workers in chunks. To process many
+        batches of texts, start the pool once with `worker_pool` and pass it to every call.
+
+        Args:
+            texts (Iterable[str]): The texts to extract keywords from.
+            span_info (bool): If True, returns tuples with the keyword and its span. Defaults to False.
+            processes (int | None): The number of worker processes. If 1, the texts are processed in
+                                    the current process; if None, as many processes as there are CPUs
+                                    are used. Defaults to 1.
+            chunksize (int): The number of texts sent to a worker at once. Defaults to 16.
+            pool (ProcessPoolExecutor | None): A pool started by `worker_pool` to reuse instead of starting
+                                               a new one, in which case `processes` is ignored. Defaults to None.
+
+        Returns:
+            list[list[str | tuple[str, int, int]]]: The extracted keywords of each text, in the order of the texts.
+        """
+        if pool is None and processes == 1:
+            return [self.extract_keywords(text, span_info) for text in texts]
+        function = partial(_call_in_worker, "extract_keywords")
+        return self._map_in_pool(function, texts, processes, chunksize, pool, span_info)
+
+    def count_keywords_many(
+        self,
+        texts: Iterable[str],
+        processes: int | None = 1,
+        chunksize: int = 16,
+        pool: ProcessPoolExecutor | None = None,
+    ) -> list[Counter[str]]:
+        """
+        Counts keywords in many texts, optionally spreading them across a pool of processes.
+
+        It's the counting counterpart of `extract_keywords_many`, which also spares the pool
+        from sending every single match back to the parent process.
+
+        Args:
+            texts (Iterable[str]): The texts to count keywords in.
+            processes (int | None): The number of worker processes, as in `extract_keywords_many`. Defaults to 1.
+            chunksize (int): The number of texts sent to a worker at once. Defaults to 16.
+            pool (ProcessPoolExecutor | None): A pool started by `worker_pool`, as in `extract_keywords_many`.
+                                               Defaults to None.
+
+        Returns:
+            list[Counter[str]]: The keyword counts of each text, in the order of the texts.
+        """
+        if pool is None and processes == 1:
+            return [self.count_keywords(text) for text in texts]
+        return self._map_in_pool(partial(_call_in_worker, "count_keywords"), texts, processes, chunksize, pool)
+
+    @contextmanager
+    def worker_pool(self, processes: int | None = None) -> Iterator[ProcessPoolExecutor]:
+        """
+        Starts a pool of processes that hold this processor, to be reused by many calls of the `*_many` methods.
+
+        Starting the pool and sending the processor to its workers is paid once, instead of on every call.
+
+        Args:
+            processes (int | None): The number of worker processes. If None, as many processes as there
+                                    are CPUs are used. Defaults to None.
+
+        Yields:
+            ProcessPoolExecutor: The pool, which is shut down on exit.
+        """
+        # Compile the engine before forking, so that the workers don't have to do it each on their own.
+        if self.engine != "trie":
+            _ = self.compact_trie
+
+        start_methods = multiprocessing.get_all_start_methods()
+        mp_context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+        with ProcessPoolExecutor(processes, mp_context, initializer=_init_worker, initargs=(self,)) as pool:
+            yield pool
+
+    def _map_in_pool(
+        self,
+        function: partial,
+        texts: Iterable[str],
+        processes: int | None,
+        chunksize: int,
+        pool: ProcessPoolExecutor | None,
+        *args,
+    ):
+        if pool is None:
+            with self.worker_pool(processes) as pool:
+                return self._map_in_pool(function, texts, processes, chunksize, pool, *args)
 
-        for idx, char in enumerate(normalized_text):
-            if char in node.children:
-                node = node.children[char]
-                if node.is_end_of_word and (idx == len(normalized_text) - 1 or not normalized_text[idx + 1].isalnum()):
-                    end_idx = idx + 1
-                    match = (node.clean_name, start_idx, end_idx) if span_info else node.clean_name
-                    results.append(match)
-                    node = self.root
-                    start_idx = end_idx
-            else:
-                node = self.root
-                start_idx = idx + 1
-
-        return results
+        texts = list(texts)
+        return list(pool.map(function, texts, *([arg] * len(texts) for arg in args), chunksize=chunksize))
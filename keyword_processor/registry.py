@@ -0,0 +1,78 @@
+from collections.abc import Callable, Hashable
+from threading import Lock
+
+from .processor import KeywordProcessor
+
+
+class MatcherRegistry:
+    """A process-wide registry of compiled KeywordProcessor instances.
+
+    Building a Trie from thousands of keywords is far more expensive than matching a
+    single text against it, so the registry keeps one compiled processor per name for
+    the lifetime of the process. Every entry is tagged with a version token supplied by
+    the caller, and the processor is rebuilt only when that token changes.
+
+    Attributes:
+        hits (int): Number of lookups served by an up-to-date processor.
+        misses (int): Number of lookups that required a processor to be built.
+        rebuilds (int): Number of misses that replaced an outdated processor.
+    """
+
+    def __init__(self) -> None:
+        self._matchers: dict[str, tuple[Hashable, KeywordProcessor]] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def get(self, name: str, version: Hashable, build: Callable[[], KeywordProcessor]) -> KeywordProcessor:
+        """
+        Returns the processor registered under the name, building it if it's missing or outdated.
+
+        Args:
+            name (str): The name of the processor, e.g. "skills".
+            version (Hashable): The version token of the keywords the processor is built from.
+            build (Callable[[], KeywordProcessor]): A function that builds a fresh processor.
+
+        Returns:
+            KeywordProcessor: The compiled processor for the requested version.
+        """
+        entry = self._matchers.get(name)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            # Another thread might have built the processor while this one was waiting for the lock.
+            entry = self._matchers.get(name)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+
+            keyword_processor = build()
+            self._matchers[name] = (version, keyword_processor)
+            self.misses += 1
+            if entry is not None:
+                self.rebuilds += 1
+            return keyword_processor
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the hit, miss and rebuild counters of the registry.
+
+        Returns:
+            dict[str, int]: The counters of the registry.
+        """
+        return {"hits": self.hits, "misses": self.misses, "rebuilds": self.rebuilds}
+
+    def clear(self) -> None:
+        """
+        Drops all registered processors and resets the counters.
+        """
+        with self._lock:
+            self._matchers.clear()
+            self.hits = self.misses = self.rebuilds = 0
+
+
+matcher_registry = MatcherRegistry()
@@ -0,0 +1,171 @@
+"""A compact binary snapshot format of the KeywordProcessor's Trie.
+
+The snapshot stores the Trie as flat arrays instead of a graph of Python objects, so that
+it can be cached in Redis or written to disk and loaded back without inserting keywords
+one by one. All integers are little-endian, and every section is 4-byte aligned, which
+allows the arrays to be used in place from a memory-mapped file.
+
+Layout:
+    header: magic (4s), format version (H), flags (H), node count (I), edge count (I),
+            clean name count (I), clean names size in bytes (I)
+    edge offsets: node count + 1 unsigned ints, edges of node N are [offsets[N], offsets[N + 1])
+    edge chars: edge count unsigned ints with the code points of the edges, sorted per node
+    edge targets: edge count unsigned ints with the indices of the child nodes
+    terminals: node count signed ints with the clean name id of the node, or -1
+    clean name offsets: clean name count + 1 unsigned ints into the clean names section
+    clean names: UTF-8 encoded clean names, padded to 4 bytes
+"""
+import struct
+import sys
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .processor import TrieNode
+
+MAGIC = b"KWPS"
+FORMAT_VERSION = 1
+FLAG_CASE_SENSITIVE = 1
+
+HEADER = struct.Struct("<4sHHIIII")
+NO_CLEAN_NAME = -1
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """The decoded arrays of a Trie snapshot.
+
+    Attributes:
+        case_sensitive (bool): Whether the keywords were added in case-sensitive mode.
+        edge_offsets (memoryview): Offsets of each node's edges in the edge arrays.
+        edge_chars (memoryview): Code points of the edges, sorted within each node.
+        edge_targets (memoryview): Indices of the nodes the edges lead to.
+        terminals (memoryview): Clean name ids of the nodes, or -1 for non-terminal nodes.
+        clean_names (list[str]): Clean names referenced by the terminal nodes.
+    """
+
+    case_sensitive: bool
+    edge_offsets: memoryview
+    edge_chars: memoryview
+    edge_targets: memoryview
+    terminals: memoryview
+    clean_names: list[str]
+
+    @property
+    def node_count(self) -> int:
+        return len(self.terminals)
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(buffer: memoryview, typecode: str) -> memoryview:
+    if sys.byteorder == "big":
+        values = array(typecode, buffer)
+        values.byteswap()
+        return memoryview(values)
+    return buffer.cast(typecode)
+
+
+def encode(root: "TrieNode", case_sensitive: bool) -> bytes:
+    """
+    Encodes the Trie into a binary snapshot.
+
+    Nodes are numbered in breadth-first order starting with the root, and the edges of
+    each node are sorted by code point, so that they can be binary searched.
+
+    Args:
+        root (TrieNode): The root node of the Trie.
+        case_sensitive (bool): Whether the keywords were added in case-sensitive mode.
+
+    Returns:
+        bytes: The binary snapshot.
+    """
+    edge_offsets = array("I", [0])
+    edge_chars = array("I")
+    edge_targets = array("I")
+    terminals = array("i")
+    clean_name_ids: dict[str, int] = {}
+
+    queue = deque([root])
+    node_count = 1
+    while queue:
+        node = queue.popleft()
+        for char in sorted(node.children):
+            edge_chars.append(ord(char))
+            edge_targets.append(node_count)
+            queue.append(node.children[char])
+            node_count += 1
+        edge_offsets.append(len(edge_chars))
+        if node.is_end_of_word:
+            terminals.append(clean_name_ids.setdefault(node.clean_name, len(clean_name_ids)))
+        else:
+            terminals.append(NO_CLEAN_NAME)
+
+    clean_name_offsets = array("I", [0])
+    encoded_names = bytearray()
+    for clean_name in clean_name_ids:
+        encoded_names += clean_name.encode()
+        clean_name_offsets.append(len(encoded_names))
+    encoded_names += b"\0" * (-len(encoded_names) % 4)
+
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        FLAG_CASE_SENSITIVE if case_sensitive else 0,
+        len(terminals),
+        len(edge_chars),
+        len(clean_name_ids),
+        clean_name_offsets[-1],
+    )
+    sections = (edge_offsets, edge_chars, edge_targets, terminals, clean_name_offsets)
+    return header + b"".join(_to_little_endian(section) for section in sections) + bytes(encoded_names)
+
+
+def decode(data: bytes | bytearray | memoryview) -> Snapshot:
+    """
+    Decodes a binary snapshot without copying its arrays.
+
+    Args:
+        data (bytes | bytearray | memoryview): The binary snapshot, e.g. a memory-mapped file.
+
+    Raises:
+        ValueError: If the data isn't a snapshot or was written by an unsupported format version.
+
+    Returns:
+        Snapshot: The decoded arrays of the Trie.
+    """
+    buffer = memoryview(data).cast("B")
+    if len(buffer) < HEADER.size:
+        raise ValueError("The data is too short to be a keyword processor snapshot.")
+
+    magic, version, flags, node_count, edge_count, name_count, names_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("The data is not a keyword processor snapshot.")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported keyword processor snapshot version: {version}.")
+
+    arrays_size = 4 * (2 * node_count + 2 * edge_count + name_count + 2)
+    if len(buffer) < HEADER.size + arrays_size + names_size:
+        raise ValueError("The keyword processor snapshot is truncated.")
+
+    sections = []
+    offset = HEADER.size
+    for typecode, length in (("I", node_count + 1), ("I", edge_count), ("I", edge_count), ("i", node_count)):
+        sections.append(_from_little_endian(buffer[offset : offset + length * 4], typecode))
+        offset += length * 4
+    clean_name_offsets = _from_little_endian(buffer[offset : offset + (name_count + 1) * 4], "I")
+    offset += (name_count + 1) * 4
+
+    encoded_names = bytes(buffer[offset : offset + names_size])
+    clean_names = [
+        encoded_names[clean_name_offsets[idx] : clean_name_offsets[idx + 1]].decode() for idx in range(name_count)
+    ]
+
+    return Snapshot(bool(flags & FLAG_CASE_SENSITIVE), *sections, clean_names)
@@ -1,6 +1,10 @@
+import pickle
+from collections import Counter
+from unittest.mock import patch
+
 import pytest
 
-from keyword_processor import KeywordProcessor
+from keyword_processor import KeywordProcessor, MatcherRegistry
 
 
 class TestKeywordProcessor:
@@ -39,15 +43,283 @@ class TestKeywordProcessor:
             assert node.is_end_of_word
             assert node.clean_name == "Programming"
 
-    def test_extract_keywords(self, processor):
+    @pytest.mark.parametrize("engine", ["trie", "compact"])
+    def test_extract_keywords(self, engine):
+        processor = KeywordProcessor(engine=engine)
         processor.add_keyword("python", "Python Programming")
         processor.add_keyword("java", "Java Programming")
         extracted_keywords = processor.extract_keywords("I love Python and Java.")
         assert extracted_keywords == ["Python Programming", "Java Programming"]
 
-    def test_extract_keywords_with_span_info(self, processor):
+    @pytest.mark.parametrize("engine", ["trie", "compact"])
+    def test_extract_keywords_with_span_info(self, engine):
+        processor = KeywordProcessor(engine=engine)
         processor.add_keyword("python", "Python Programming")
         extracted_keywords = processor.extract_keywords("I love Python.", span_info=True)
         assert extracted_keywords == [("Python Programming", 7, 13)]
         extracted_keywords = processor.extract_keywords("I love Python.", span_info=True)
         assert extracted_keywords == [("Python Programming", 7, 13)]
+
+
+class TestCompactEngine:
+    keyword_dict = {"Python": ["python", "py3"], "C++": ["c++"], "Java": ["java", "javascript"], "Go": ["go"]}
+    texts = [
+        "Python, py3, C++ and golang or go.",
+        "jjava javascript java-script xpython python3 py3",
+        "go",
+        "",
+    ]
+
+    @pytest.fixture
+    def trie_processor(self):
+        processor = KeywordProcessor()
+        processor.add_keywords_from_dict(self.keyword_dict)
+        return processor
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            KeywordProcessor(engine="unknown")
+
+    @pytest.mark.parametrize("text", texts)
+    def test_compact_engine_matches_trie_engine(self, trie_processor, text):
+        compact_processor = KeywordProcessor.loads(trie_processor.dumps(), engine="compact")
+        assert compact_processor.extract_keywords(text, span_info=True) == trie_processor.extract_keywords(
+            text, span_info=True
+        )
+
+    def test_compact_engine_is_recompiled_after_adding_keywords(self, trie_processor):
+        compact_processor = KeywordProcessor.loads(trie_processor.dumps(), engine="compact")
+        assert compact_processor.extract_keywords("Rust and Go") == ["Go"]
+        compact_processor.add_keyword("rust", "Rust")
+        assert compact_processor.extract_keywords("Rust and Go") == ["Rust", "Go"]
+
+    def test_load_compact_engine_from_file(self, trie_processor, tmp_path):
+        path = tmp_path / "skills.kwps"
+        trie_processor.dump(path)
+        compact_processor = KeywordProcessor.load(path, engine="compact")
+        assert compact_processor.extract_keywords(self.texts[0]) == trie_processor.extract_keywords(self.texts[0])
+        assert compact_processor.dumps() == trie_processor.dumps()
+
+
+class TestAhoCorasickEngine:
+    keyword_dict = {
+        "Go": ["go"],
+        "Golang": ["go lang"],
+        "Machine Learning": ["machine learning"],
+        "Learning": ["learning"],
+        ".NET": [".net"],
+        "C++": ["c++"],
+    }
+
+    @pytest.fixture
+    def processor(self):
+        processor = KeywordProcessor(engine="aho_corasick")
+        processor.add_keywords_from_dict(self.keyword_dict)
+        return processor
+
+    def test_unknown_match_policy(self):
+        with pytest.raises(ValueError):
+            KeywordProcessor(engine="aho_corasick", match_policy="unknown")
+
+    def test_finds_keyword_starting_inside_partial_match(self, processor):
+        trie_processor = KeywordProcessor()
+        trie_processor.add_keywords_from_dict(self.keyword_dict)
+        assert trie_processor.extract_keywords("go go lang") == ["Go", "Go"]
+        assert processor.extract_keywords("go go lang", span_info=True) == [("Go", 0, 2), ("Golang", 3, 10)]
+
+    def test_matches_whole_words_only(self, processor):
+        assert processor.extract_keywords("gogo ago goes, go! c++x c++") == ["Go", "C++"]
+
+    def test_matches_keywords_starting_with_non_alphanumeric_character(self, processor):
+        assert processor.extract_keywords("ASP.NET and .net") == [".NET", ".NET"]
+
+    def test_longest_match_policy(self, processor):
+        assert processor.extract_keywords("machine learning") == ["Machine Learning"]
+
+    def test_all_match_policy(self):
+        processor = KeywordProcessor(engine="aho_corasick", match_policy="all")
+        processor.add_keywords_from_dict(self.keyword_dict)
+        assert processor.extract_keywords("go go lang machine learning", span_info=True) == [
+            ("Go", 0, 2),
+            ("Go", 3, 5),
+            ("Golang", 3, 10),
+            ("Machine Learning", 11, 27),
+            ("Learning", 19, 27),
+        ]
+
+    def test_longest_match_policy_matches_all_matches_filtered(self, processor):
+        text = "go lang machine learning, c++ go go lang learning .net machine go"
+        all_matches = KeywordProcessor.loads(processor.dumps(), engine="aho_corasick", match_policy="all")
+        longest_matches, last_end_idx = [], 0
+        for match in sorted(
+            all_matches.extract_keywords(text, span_info=True), key=lambda match: (match[1], -match[2])
+        ):
+            if match[1] >= last_end_idx:
+                longest_matches.append(match)
+                last_end_idx = match[2]
+        assert processor.extract_keywords(text, span_info=True) == longest_matches
+
+    def test_loads_aho_corasick_engine(self, processor):
+        restored = KeywordProcessor.loads(processor.dumps(), engine="aho_corasick", match_policy="all")
+        assert restored.extract_keywords("machine learning") == ["Machine Learning", "Learning"]
+
+
+@pytest.mark.parametrize("engine", ["trie", "compact", "aho_corasick"])
+class TestExtractKeywordsMany:
+    texts = ["I love Python.", "Java and Python", "", "Nothing to see here"]
+
+    @pytest.fixture
+    def processor(self, engine):
+        processor = KeywordProcessor(engine=engine)
+        processor.add_keywords_from_dict({"Python": ["python"], "Java": ["java"]})
+        return processor
+
+    def test_extract_keywords_many(self, processor):
+        assert processor.extract_keywords_many(iter(self.texts)) == [["Python"], ["Java", "Python"], [], []]
+
+    def test_extract_keywords_many_with_process_pool(self, processor):
+        expected = [processor.extract_keywords(text, span_info=True) for text in self.texts]
+        assert processor.extract_keywords_many(self.texts, span_info=True, processes=2, chunksize=1) == expected
+
+    def test_pickle_processor(self, processor):
+        restored = pickle.loads(pickle.dumps(processor))
+        assert restored.engine == processor.engine
+        assert restored.extract_keywords(self.texts[1]) == processor.extract_keywords(self.texts[1])
+
+
+@pytest.mark.parametrize("engine", ["trie", "compact", "aho_corasick"])
+class TestCountKeywords:
+    texts = ["Python, Java and python again.", "", "Nothing to see here"]
+
+    @pytest.fixture
+    def processor(self, engine):
+        processor = KeywordProcessor(engine=engine)
+        processor.add_keywords_from_dict({"Python": ["python"], "Java": ["java"]})
+        return processor
+
+    def test_iter_keywords_is_lazy(self, processor):
+        keywords = processor.iter_keywords(self.texts[0], span_info=True)
+        assert next(keywords) == ("Python", 0, 6)
+        assert list(keywords) == processor.extract_keywords(self.texts[0], span_info=True)[1:]
+
+    def test_count_keywords(self, processor):
+        assert processor.count_keywords(self.texts[0]) == Counter({"Python": 2, "Java": 1})
+        assert processor.count_keywords(self.texts[2]) == Counter()
+
+    def test_distinct_keywords(self, processor):
+        assert processor.distinct_keywords(self.texts[0]) == {"Python", "Java"}
+
+    def test_count_keywords_many(self, processor):
+        expected = [processor.count_keywords(text) for text in self.texts]
+        assert processor.count_keywords_many(iter(self.texts)) == expected
+        assert processor.count_keywords_many(self.texts, processes=2, chunksize=1) == expected
+
+    def test_count_keywords_many_with_worker_pool(self, processor):
+        expected = [processor.count_keywords(text) for text in self.texts]
+        with processor.worker_pool(processes=2) as pool:
+            # The pool is reused by every batch instead of starting a new one for each of them.
+            with patch("keyword_processor.processor.ProcessPoolExecutor") as mock_executor:
+                assert processor.count_keywords_many(self.texts[:2], pool=pool) == expected[:2]
+                assert processor.count_keywords_many(self.texts[2:], pool=pool, chunksize=1) == expected[2:]
+        assert mock_executor.call_count == 0
+
+
+@pytest.mark.parametrize("engine", ["trie", "compact", "aho_corasick"])
+class TestIterKeywordsFromChunks:
+    text = "Go lang, Machine Learning and c++ in go. Golang!"
+
+    @pytest.fixture
+    def processor(self, engine):
+        processor = KeywordProcessor(engine=engine)
+        processor.add_keywords_from_dict(TestAhoCorasickEngine.keyword_dict)
+        return processor
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 100])
+    def test_chunks_match_whole_text(self, processor, chunk_size):
+        chunks = (self.text[idx : idx + chunk_size] for idx in range(0, len(self.text), chunk_size))
+        expected = processor.extract_keywords(self.text, span_info=True)
+        assert list(processor.iter_keywords_from_chunks(chunks, span_info=True)) == expected
+
+    def test_keyword_is_not_matched_across_word_boundary_of_chunks(self, processor):
+        assert list(processor.iter_keywords_from_chunks(["go", "es c+", "+x"])) == []
+        assert list(processor.iter_keywords_from_chunks(["go", "", " c+", "+"])) == ["Go", "C++"]
+
+    def test_empty_chunks(self, processor):
+        assert list(processor.iter_keywords_from_chunks([])) == []
+        assert list(processor.iter_keywords_from_chunks(["", ""])) == []
+
+
+class TestKeywordProcessorSnapshot:
+    keyword_dict = {"Python": ["python", "py3"], "C++": ["c++", "cpp"], "Go": ["go", "golang"], "Жук": ["жук"]}
+    text = "Python, py3, C++ and golang or go, but not gopher. Жук."
+
+    @pytest.fixture
+    def processor(self):
+        processor = KeywordProcessor()
+        processor.add_keywords_from_dict(self.keyword_dict)
+        return processor
+
+    def test_loads_restores_keywords(self, processor):
+        restored = KeywordProcessor.loads(processor.dumps())
+        assert restored.extract_keywords(self.text, span_info=True) == processor.extract_keywords(
+            self.text, span_info=True
+        )
+
+    def test_loads_restores_case_sensitivity(self):
+        processor = KeywordProcessor(case_sensitive=True)
+        processor.add_keyword("Python")
+        restored = KeywordProcessor.loads(processor.dumps())
+        assert restored.case_sensitive
+        assert restored.extract_keywords("python Python") == ["Python"]
+
+    def test_load_memory_maps_file(self, processor, tmp_path):
+        path = tmp_path / "skills.kwps"
+        processor.dump(path)
+        restored = KeywordProcessor.load(path)
+        assert restored.extract_keywords(self.text) == processor.extract_keywords(self.text)
+
+    def test_dumps_of_empty_processor(self):
+        assert KeywordProcessor.loads(KeywordProcessor().dumps()).extract_keywords("Python") == []
+
+    @pytest.mark.parametrize("data", [b"", b"KWPS", b"NOPE" + bytes(20), b"KWPS\x02\x00" + bytes(18)])
+    def test_loads_rejects_invalid_data(self, data):
+        with pytest.raises(ValueError):
+            KeywordProcessor.loads(data)
+
+    def test_loads_rejects_truncated_data(self, processor):
+        with pytest.raises(ValueError):
+            KeywordProcessor.loads(processor.dumps()[:-8])
+
+
+class TestMatcherRegistry:
+    @pytest.fixture
+    def registry(self):
+        return MatcherRegistry()
+
+    @staticmethod
+    def build():
+        processor = KeywordProcessor()
+        processor.add_keyword("python", "Python")
+        return processor
+
+    def test_get_builds_processor_once_per_version(self, registry):
+        first = registry.get("skills", "v1", self.build)
+        second = registry.get("skills", "v1", self.build)
+        assert first is second
+        assert first.extract_keywords("I love Python.") == ["Python"]
+        assert registry.stats == {"hits": 1, "misses": 1, "rebuilds": 0}
+
+    def test_get_rebuilds_processor_when_version_changes(self, registry):
+        first = registry.get("skills", "v1", self.build)
+        second = registry.get("skills", "v2", self.build)
+        assert first is not second
+        assert registry.stats == {"hits": 0, "misses": 2, "rebuilds": 1}
+
+    def test_get_keeps_processors_separate_by_name(self, registry):
+        assert registry.get("skills", "v1", self.build) is not registry.get("jobs", "v1", self.build)
+
+    def test_clear(self, registry):
+        first = registry.get("skills", "v1", self.build)
+        registry.clear()
+        assert registry.stats == {"hits": 0, "misses": 0, "rebuilds": 0}
+        assert registry.get("skills", "v1", self.build) is not first
@@ -1,45 +1,45 @@
-from collections.abc import Generator
+from collections.abc import Generator, Iterable, Iterator
+from heapq import nlargest
+from itertools import chain
 from operator import itemgetter
 from tempfile import SpooledTemporaryFile
 
-from django.core.cache import cache
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from pypdf import PdfReader
 
-from keyword_processor import KeywordProcessor
-from scrapers.models import Skill, Vacancy
+from core.utils.skills import get_skills_matcher
+from core.utils.vacancies import get_vacancy_shards
 
 
-def extract_text_from_resume(resume_in_memory: SpooledTemporaryFile | InMemoryUploadedFile) -> str:
-    # Extract text from a PDF resume.
+def iter_text_from_resume(resume_in_memory: SpooledTemporaryFile | InMemoryUploadedFile) -> Iterator[str]:
+    # Extract text from a PDF resume page by page, so that the whole document is never held in memory at once.
     reader = PdfReader(resume_in_memory)
-    text_from_resume = "\n\n".join([page.extract_text() for page in reader.pages])
-    return text_from_resume
+    for page_number, page in enumerate(reader.pages):
+        if page_number:
+            yield "\n\n"
+        yield page.extract_text()
 
 
-def find_skills_in_resume(text_from_resume: str) -> set[str]:
-    # Find unique skills in resume text using the KeywordProcessor for skill extraction.
-    skills_from_db = cache.get("skills_from_db")
-    if skills_from_db is None:
-        skills_from_db = list(Skill.objects.values_list("clean_name", "unclean_names"))
-        cache.set("skills_from_db", skills_from_db, 12 * 60 * 60)
+def extract_text_from_resume(resume_in_memory: SpooledTemporaryFile | InMemoryUploadedFile) -> str:
+    # Extract text from a PDF resume.
+    text_from_resume = "".join(iter_text_from_resume(resume_in_memory))
+    return text_from_resume
 
-    keyword_processor = KeywordProcessor()
-    dict_of_skills = {clean_name: unclean_names for clean_name, unclean_names in skills_from_db}
-    keyword_processor.add_keywords_from_dict(dict_of_skills)
 
-    skills_from_resume = set(keyword_processor.extract_keywords(text_from_resume))
+def find_skills_in_resume(text_from_resume: str | Iterable[str]) -> set[str]:
+    # Find unique skills in resume text, given as a whole or in chunks, using the KeywordProcessor for skill extraction.
+    keyword_processor = get_skills_matcher()
+    if isinstance(text_from_resume, str):
+        return keyword_processor.distinct_keywords(text_from_resume)
+    skills_from_resume = set(keyword_processor.iter_keywords_from_chunks(text_from_resume))
     return skills_from_resume
 
 
 def find_suitable_vacancies(skills_in_resume: set[str]) -> Generator[dict[str, str], None, None]:
-    # Find vacancies that require the skills from the resume.
+    # Find vacancies that require the skills from the resume by scanning all of them.
+    # It's the reference for find_tailored_vacancies(), which gets the same result from the skill matrix.
     skills_in_resume_lower = {skill.lower() for skill in skills_in_resume}
-    # Attempt to retrieve cached vacancies, if not available, query the database and cache them.
-    vacancies = cache.get("vacancies")
-    if vacancies is None:
-        vacancies = list(Vacancy.objects.values("url", "title", "rated_skills"))
-        cache.set("vacancies", vacancies, 12 * 60 * 60)
+    vacancies = chain.from_iterable(shard.vacancies for shard in get_vacancy_shards())
 
     # Generator expression to filter vacancies based on the presence of resume skills.
     suitable_vacancies = (
@@ -49,7 +49,7 @@ def find_suitable_vacancies(skills_in_resume: set[str]) -> Generator[dict[str, s
 
 
 def sort_suitable_vacancies(
-    skills_in_resume: set[str], suitable_vacancies: Generator[dict[str, str], None, None]
+    skills_in_resume: set[str], suitable_vacancies: Generator[dict[str, str], None, None], limit: int | None = None
 ) -> list[dict[str, str | int]]:
     # Sort the vacancies by how many skills from the resume match the vacancy's requirements.
     weighted_vacancies = (
@@ -61,14 +61,53 @@ def sort_suitable_vacancies(
         for vacancy in suitable_vacancies
     )
 
-    # Sort by the most relevant vacancies and return their titles with links.
-    return sorted(weighted_vacancies, key=itemgetter("skills_frequency"), reverse=True)
+    # Sort by the most relevant vacancies and return their titles with links. With a limit, only the top
+    # vacancies are kept in a bounded heap, and nlargest() breaks ties by the original order, just as sorted() does.
+    if limit is None:
+        return sorted(weighted_vacancies, key=itemgetter("skills_frequency"), reverse=True)
+    return nlargest(limit, weighted_vacancies, key=itemgetter("skills_frequency"))
 
 
-def analyze_resume(resume_in_memory: SpooledTemporaryFile | InMemoryUploadedFile) -> list[dict[str, str | int]]:
+def find_tailored_vacancies(
+    skills_in_resume: set[str], limit: int | None = None, scoring: str = "count"
+) -> list[dict[str, str | int]]:
+    # Find and sort the vacancies that require the skills from the resume by multiplying the skill matrices
+    # of the cached shards by the skills, instead of scanning every vacancy. With the "count" scoring, the result is the same
+    # as of sort_suitable_vacancies(), while the "frequency" scoring also weighs how often the vacancy mentions them.
+    shards = get_vacancy_shards()
+
+    # Vacancies are suitable if they require any of the lowercased skills, as in find_suitable_vacancies(),
+    # while only the exactly matching skills are scored, as in sort_suitable_vacancies().
+    lowercased_skills = {skill.lower() for skill in skills_in_resume}
+    skills_frequency = {}
+    for shard_idx, shard in enumerate(shards):
+        suitable_positions = shard.vacancy_matrix.score(lowercased_skills)
+        scores = shard.vacancy_matrix.score(skills_in_resume, scoring)
+        for position in suitable_positions:
+            skills_frequency[shard_idx, position] = scores.get(position, 0)
+
+    # Rank the positions first, so that the dicts are created only for the vacancies that are returned.
+    # Ties are broken by the shard and the position in it, which is the order of the full scan.
+    if limit is None:
+        ranked = sorted(skills_frequency, key=lambda key: (-skills_frequency[key], key))
+    else:
+        ranked = nlargest(limit, skills_frequency, key=lambda key: (skills_frequency[key], -key[0], -key[1]))
+
+    return [
+        {
+            "url": shards[shard_idx].urls[position],
+            "title": shards[shard_idx].titles[position],
+            "skills_frequency": skills_frequency[shard_idx, position],
+        }
+        for shard_idx, position in ranked
+    ]
+
+
+def analyze_resume(
+    resume_in_memory: SpooledTemporaryFile | InMemoryUploadedFile, limit: int | None = None, scoring: str = "count"
+) -> list[dict[str, str | int]]:
     # Main pipeline function for processing the uploaded resume and finding suitable vacancies.
-    text_from_resume = extract_text_from_resume(resume_in_memory)
+    text_from_resume = iter_text_from_resume(resume_in_memory)
     skills_in_resume = find_skills_in_resume(text_from_resume)
-    suitable_vacancies = find_suitable_vacancies(skills_in_resume)
-    tailored_vacancies = sort_suitable_vacancies(skills_in_resume, suitable_vacancies)
+    tailored_vacancies = find_tailored_vacancies(skills_in_resume, limit, scoring)
     return tailored_vacancies
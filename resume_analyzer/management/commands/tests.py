@@ -2,6 +2,9 @@ import pytest
 from django.core.cache import cache
 from django.core.management import call_command
 
+from core.utils.skills import SKILLS_CHANGED_KEY, get_skills_version
+from core.utils.vacancies import VACANCIES_MANIFEST_KEY
+
 
 @pytest.mark.django_db
 class TestWarmupCache:
@@ -9,12 +12,27 @@ class TestWarmupCache:
         cache.clear()
         # Make sure the initial cache is clean.
         skills_from_db = cache.get("skills_from_db")
-        vacancies = cache.get("vacancies")
+        manifest = cache.get(VACANCIES_MANIFEST_KEY)
         assert skills_from_db is None
-        assert vacancies is None
+        assert manifest is None
         call_command("warmup_cache")
         # Check that cache is updated.
         skills_from_db = cache.get("skills_from_db")
-        vacancies = cache.get("vacancies")
+        manifest = cache.get(VACANCIES_MANIFEST_KEY)
         assert skills_from_db is not None
-        assert vacancies is not None
+        assert manifest is not None
+        assert all(cache.get(f"vacancy_shard:{day.isoformat()}:{token}") for day, token in manifest.items())
+
+    def test_warmup_swaps_skills_matcher_when_skills_changed(self):
+        call_command("warmup_cache")
+        skills_version = get_skills_version()
+        call_command("warmup_cache")
+        assert get_skills_version() == skills_version
+
+        cache.set(SKILLS_CHANGED_KEY, True, None)
+        call_command("warmup_cache")
+        assert get_skills_version() != skills_version
+        assert cache.get(SKILLS_CHANGED_KEY) is None
+        # The previous snapshot is kept for the processes that have just read its version.
+        assert cache.get(f"skills_matcher:{skills_version}") is not None
+        assert cache.get(f"skills_matcher:{get_skills_version()}") is not None
@@ -1,25 +1,23 @@
 from django.core.cache import cache
 from django.core.management.base import BaseCommand
 
-from scrapers.models import Skill, Vacancy
+from core.utils.skills import SKILLS_CHANGED_KEY, get_skills_matcher, get_skills_version, refresh_skills_matcher
+from core.utils.vacancies import get_vacancy_shards
 
 
 class Command(BaseCommand):
-    help = "Keep cache updated with vacancies and skills."
+    help = "Swap in freshly built snapshots of skills and vacancies whenever they change."
 
     def handle(self, *args, **options):
-        # Ensure that only the necessary fields are loaded.
-        skills_cache_key = "skills_from_db"
-        vacancies_cache_key = "vacancies"
+        # Rebuild the skills matcher if the skills have changed or its snapshot is missing. The flag is checked
+        # again after each rebuild, since the skills could have changed once more in the meantime.
+        snapshot_missing = cache.get(f"skills_matcher:{get_skills_version()}") is None
+        while cache.delete(SKILLS_CHANGED_KEY) or snapshot_missing:
+            refresh_skills_matcher()
+            snapshot_missing = False
 
-        # Update skills in cache if they're not already cached.
-        if not cache.get(skills_cache_key):
-            skills_from_db = Skill.objects.values_list("clean_name", "unclean_names")
-            # Convert QuerySet to list to evaluate it before caching.
-            cache.set(skills_cache_key, list(skills_from_db), 12 * 60 * 60)
+        # Load the matcher of the current version, which also warms up this process.
+        get_skills_matcher()
 
-        # Update vacancies in cache if they're not already cached.
-        if not cache.get(vacancies_cache_key):
-            vacancies = Vacancy.objects.values("url", "title", "rated_skills")
-            # Convert QuerySet to list to evaluate it before caching.
-            cache.set(vacancies_cache_key, list(vacancies), 12 * 60 * 60)
+        # Make sure the shards of vacancies and their skill matrices are cached, rebuilding only the missing ones.
+        get_vacancy_shards()
@@ -1,10 +1,24 @@
 from celery import shared_task
+from django.core.cache import cache
 from django.core.management import call_command
 
 from core.utils.celery import lock_task
+from core.utils.skills import SKILLS_CHANGED_KEY
+
+# How long to wait before checking again for the skills that changed while another warmup held the lock, in seconds.
+WARMUP_RETRY_COUNTDOWN = 10
+
+
+# The lock is renewed while a cold rebuild of the shards runs, so that two warmups never overlap.
+@lock_task("lock:warmup_cache", timeout=60, auto_renew=True)
+def warmup_cache():
+    call_command("warmup_cache")
 
 
 @shared_task(ignore_result=True)
-@lock_task("lock:warmup_cache", timeout=10)
 def task_warmup_cache():
-    call_command("warmup_cache")
+    warmup_cache()
+    # The warmup enqueued by a change of the skills is skipped while another one holds the lock, and the one
+    # holding it only checks the flag before its rebuild. So run once more if the flag is still set by now.
+    if cache.get(SKILLS_CHANGED_KEY):
+        task_warmup_cache.apply_async(countdown=WARMUP_RETRY_COUNTDOWN)
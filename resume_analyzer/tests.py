@@ -1,10 +1,26 @@
+from datetime import timedelta
 from unittest.mock import call, patch
 
 import pytest
 from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse
+from django.utils import timezone
 
-from .tasks import task_warmup_cache
+from core.utils.skills import SKILLS_CHANGED_KEY, get_skills_matcher
+from core.utils.vacancies import VACANCIES_MANIFEST_KEY, cache_vacancy_shards
+from keyword_processor import matcher_registry
+from scrapers.models import Skill, Vacancy
+
+from .analyzer import (
+    extract_text_from_resume,
+    find_skills_in_resume,
+    find_suitable_vacancies,
+    find_tailored_vacancies,
+    iter_text_from_resume,
+    sort_suitable_vacancies,
+)
+from .tasks import WARMUP_RETRY_COUNTDOWN, task_warmup_cache
 
 
 @pytest.mark.django_db
@@ -40,7 +56,84 @@ class TestUploadResumeCorrect:
         assert cache.get("skills_from_db") is not None
 
     def test_uploadresumecorrect_cache_contains_vacancies(self, response):
-        assert cache.get("vacancies") is not None
+        assert cache.get(VACANCIES_MANIFEST_KEY) is not None
+
+
+@pytest.mark.django_db
+class TestSkillsMatcher:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+        matcher_registry.clear()
+
+    def test_skills_matcher_is_built_once(self):
+        assert find_skills_in_resume("Python and Django") == find_skills_in_resume("Python and Django")
+        assert matcher_registry.stats == {"hits": 1, "misses": 1, "rebuilds": 0}
+
+    def test_skills_matcher_is_swapped_when_skills_change(self, django_capture_on_commit_callbacks):
+        matcher = get_skills_matcher()
+        assert "Hunting" not in find_skills_in_resume("I enjoy skillhunting.")
+
+        with patch("scrapers.signals.task_warmup_cache.delay") as mock_delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                Skill.objects.create(clean_name="Hunting", unclean_names=["skillhunting"])
+        assert mock_delay.call_count == 1
+        # The previous matcher is served until the warmup swaps in the new one, instead of building it in a request.
+        assert get_skills_matcher() is matcher
+
+        call_command("warmup_cache")
+
+        assert get_skills_matcher() is not matcher
+        assert "Hunting" in find_skills_in_resume("I enjoy skillhunting.")
+        assert matcher_registry.stats["rebuilds"] == 1
+
+    def test_find_skills_in_resume_pages(self):
+        with open("resume_analyzer/test_resumes/correct_resume.pdf", "rb") as resume:
+            skills_in_text = find_skills_in_resume(extract_text_from_resume(resume))
+            resume.seek(0)
+            skills_in_pages = find_skills_in_resume(iter_text_from_resume(resume))
+        assert skills_in_pages == skills_in_text
+        assert find_skills_in_resume(["Pyt", "hon and Dj", "ango"]) == find_skills_in_resume("Python and Django")
+
+
+@pytest.mark.django_db
+class TestFindTailoredVacancies:
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    @pytest.mark.parametrize(
+        "skills_in_resume",
+        [set(), {"Python"}, {"Python", "Django", "SQL"}, {"Java", "Kotlin", "Docker", "Unknown skill"}, {"python"}],
+    )
+    @pytest.mark.parametrize("limit", [None, 1, 10, 200])
+    def test_matrix_matches_full_scan(self, skills_in_resume, limit):
+        Vacancy.objects.create(url="http://unique-url.com/case", title="Case", rated_skills={"python": 1, "Django": 1})
+        expected = sort_suitable_vacancies(skills_in_resume, find_suitable_vacancies(skills_in_resume))
+        assert find_tailored_vacancies(skills_in_resume, limit) == expected[:limit]
+        assert sort_suitable_vacancies(skills_in_resume, find_suitable_vacancies(skills_in_resume), limit) == (
+            expected[:limit]
+        )
+
+    def test_matrix_is_refreshed_after_database_changes(self):
+        find_tailored_vacancies({"Python"})
+        vacancy = Vacancy.objects.create(url="http://unique-url.com/new", title="New", rated_skills={"python": 1})
+        assert "http://unique-url.com/new" not in {vacancy["url"] for vacancy in find_tailored_vacancies({"Python"})}
+
+        # Scrapers append the new vacancies to the shard of their day.
+        cache_vacancy_shards(days=[timezone.localdate(vacancy.created_date)])
+        assert "http://unique-url.com/new" in {vacancy["url"] for vacancy in find_tailored_vacancies({"Python"})}
+
+        # Move the vacancy to the past, so that it's purged as outdated.
+        Vacancy.objects.filter(pk=vacancy.pk).update(created_date=vacancy.created_date - timedelta(days=8))
+        cache_vacancy_shards(
+            days=[timezone.localdate(vacancy.created_date - timedelta(days=offset)) for offset in (0, 8)]
+        )
+        call_command("purge_db")
+
+        assert "http://unique-url.com/new" not in {vacancy["url"] for vacancy in find_tailored_vacancies({"Python"})}
 
 
 @pytest.mark.django_db
@@ -78,16 +171,38 @@ class TestUploadResumeEmpty:
 
 
 @pytest.mark.django_db
+@patch("resume_analyzer.tasks.task_warmup_cache.apply_async")
 @patch("resume_analyzer.tasks.call_command")
 @patch("core.utils.celery.redis_client.lock")
 class TestWarmupCacheTask:
-    def test_task_warmup_cache(self, mock_lock, mock_call_command):
+    @pytest.fixture(autouse=True)
+    def override_redis_cache(self, settings):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cache.clear()
+
+    def test_task_warmup_cache(self, mock_lock, mock_call_command, mock_apply_async):
         mock_lock.return_value.acquire.return_value = True
         task_warmup_cache()
         assert mock_call_command.call_count == 1
         assert mock_call_command.call_args == call("warmup_cache")
+        assert mock_apply_async.call_count == 0
 
-    def test_locking_behavior(self, mock_lock, mock_call_command):
+    def test_locking_behavior(self, mock_lock, mock_call_command, mock_apply_async):
         mock_lock.return_value.acquire.return_value = False
         task_warmup_cache()
         assert mock_call_command.call_count == 0
+        assert mock_apply_async.call_count == 0
+
+    def test_skills_changed_while_locked_are_warmed_up_later(self, mock_lock, mock_call_command, mock_apply_async):
+        mock_lock.return_value.acquire.return_value = False
+        cache.set(SKILLS_CHANGED_KEY, True, None)
+        task_warmup_cache()
+        assert mock_call_command.call_count == 0
+        assert mock_apply_async.call_args == call(countdown=WARMUP_RETRY_COUNTDOWN)
+
+    def test_skills_changed_during_warmup_are_warmed_up_again(self, mock_lock, mock_call_command, mock_apply_async):
+        mock_lock.return_value.acquire.return_value = True
+        # The skills change once the warmup has checked the flag, e.g. during a cold rebuild of the shards.
+        mock_call_command.side_effect = lambda command: cache.set(SKILLS_CHANGED_KEY, True, None)
+        task_warmup_cache()
+        assert mock_apply_async.call_args == call(countdown=WARMUP_RETRY_COUNTDOWN)
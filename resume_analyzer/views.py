@@ -17,8 +17,8 @@ class UploadResumeView(BaseFormWithContextView, FormView):
     def form_valid(self, form):
         resume_in_memory = self.request.FILES["file"]
         try:
-            tailored_vacancies = analyze_resume(resume_in_memory)
-            return render(self.request, self.template_name, {"vacancies": tailored_vacancies[:LIMIT_OF_VACANCIES]})
+            tailored_vacancies = analyze_resume(resume_in_memory, limit=LIMIT_OF_VACANCIES)
+            return render(self.request, self.template_name, {"vacancies": tailored_vacancies})
         except PdfStreamError:
             return self.form_invalid(form)
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Job, Search, Skill, Vacancy
+from .models import Job, Search, Skill, SkillAggregate, Vacancy
 
 
 class VacancyAdmin(admin.ModelAdmin):
@@ -30,7 +30,16 @@ class SkillAdmin(admin.ModelAdmin):
     )
 
 
+class SkillAggregateAdmin(admin.ModelAdmin):
+    list_display = (
+        "job",
+        "number_of_vacancies",
+        "updated_date",
+    )
+
+
 admin.site.register(Vacancy, VacancyAdmin)
 admin.site.register(Job)
 admin.site.register(Search, SearchAdmin)
 admin.site.register(Skill, SkillAdmin)
+admin.site.register(SkillAggregate, SkillAggregateAdmin)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ScrapersConfig(AppConfig):
     name = "scrapers"
+
+    def ready(self):
+        from . import signals  # noqa
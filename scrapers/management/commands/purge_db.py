@@ -3,7 +3,10 @@ import logging
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from core.utils.common import precompute_tailored_skills
+from core.utils.vacancies import cache_vacancy_shards, drop_vacancy_shards
 from scrapers.models import Vacancy
+from scrapers.views import LIMIT_OF_SKILLS
 
 logger = logging.getLogger("django")
 
@@ -17,4 +20,9 @@ class Command(BaseCommand):
         outdated_vacancies = Vacancy.objects.filter(created_date__lte=past)
         amount = outdated_vacancies.count()
         outdated_vacancies.delete()
+        # Drop the cached shards of the days that are purged entirely and rebuild the one of the day purged in part,
+        # then drop the deleted vacancies from the skills of the job titles and the cached search results.
+        drop_vacancy_shards(before=timezone.localdate(past))
+        cache_vacancy_shards(days=[timezone.localdate(past)])
+        precompute_tailored_skills(limits=(LIMIT_OF_SKILLS, None))
         logger.info(f"🗂️ Database successfully cleaned from {amount} outdated vacancies.")
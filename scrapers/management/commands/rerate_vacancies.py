@@ -0,0 +1,59 @@
+import logging
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from core.utils.common import precompute_tailored_skills
+from core.utils.skills import get_skills_matcher
+from core.utils.vacancies import cache_vacancy_shards
+from scrapers.models import Vacancy
+from scrapers.views import LIMIT_OF_SKILLS
+
+logger = logging.getLogger("django")
+
+
+class Command(BaseCommand):
+    help = "Re-rate the skills of all vacancies, e.g. after the list of skills has changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=None,
+            help="Number of processes to extract skills with, all CPU cores by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of vacancies to load from the database and update at once.",
+        )
+
+    def handle(self, *args, **options):
+        keyword_processor = get_skills_matcher()
+        vacancies = Vacancy.objects.only("id", "content").order_by("id")
+        vacancies_rated = 0
+        last_id = None
+
+        # Start the pool once for all the batches, so that the matcher is sent to its workers only once.
+        processes = options["processes"]
+        with keyword_processor.worker_pool(processes) if processes != 1 else nullcontext() as pool:
+            while True:
+                # Paginate by the primary key to avoid slow offsets on a large table.
+                batch = list((vacancies.filter(id__gt=last_id) if last_id else vacancies)[: options["batch_size"]])
+                if not batch:
+                    break
+
+                contents = (vacancy.content for vacancy in batch)
+                all_rated_skills = keyword_processor.count_keywords_many(contents, pool=pool)
+                for vacancy, rated_skills in zip(batch, all_rated_skills):
+                    vacancy.rated_skills = rated_skills
+                Vacancy.objects.bulk_update(batch, ["rated_skills"])
+
+                vacancies_rated += len(batch)
+                last_id = batch[-1].id
+
+        # Rebuild all the cached shards of vacancies and the skills of the job titles with the new ratings.
+        cache_vacancy_shards()
+        precompute_tailored_skills(limits=(LIMIT_OF_SKILLS, None))
+        logger.info(f"⭐ Skills of {vacancies_rated} vacancies successfully re-rated.")
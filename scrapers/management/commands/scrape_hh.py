@@ -7,3 +7,6 @@ class Command(GenericScrapingCommand):
 
     scraper_class = HHScraper
     site_name = "hh.ru"
+    requests_per_second = 2
+    max_workers = 4
+    concurrent_job_titles = 3
@@ -7,3 +7,6 @@ class Command(GenericScrapingCommand):
 
     scraper_class = IndeedScraper
     site_name = "indeed.com"
+    requests_per_second = 0.5
+    max_workers = 2
+    concurrent_job_titles = 1
@@ -7,3 +7,5 @@ class Command(GenericScrapingCommand):
 
     scraper_class = SHScraper
     site_name = "simplyhired.com"
+    requests_per_second = 1
+    max_workers = 2
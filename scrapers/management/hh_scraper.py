@@ -4,12 +4,15 @@ from playwright.sync_api import Page
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 from .shared.base_scraper import BaseScraper
+from .shared.utils import BrowserPool, PageFetcher
 
 logger = logging.getLogger("django")
 
 
 class HHScraper(BaseScraper):
-    def __init__(self, job_title: str):
+    def __init__(
+        self, job_title: str, browser_pool: BrowserPool | None = None, page_fetcher: PageFetcher | None = None
+    ):
         selectors = {
             "link": "a[href*='hh.ru/vacancy']",
             "title": '[data-qa="vacancy-title"]',
@@ -22,6 +25,8 @@ class HHScraper(BaseScraper):
             selectors,
             query_params,
             self.hh_next_page_logic,
+            browser_pool,
+            page_fetcher,
         )
 
     def hh_next_page_logic(self, page: Page, page_number: int):
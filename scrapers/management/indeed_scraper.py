@@ -4,6 +4,7 @@ from playwright.sync_api import ElementHandle, Page
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 from .shared.base_scraper import BaseScraper
+from .shared.utils import BrowserPool, PageFetcher
 
 logger = logging.getLogger("django")
 
@@ -20,7 +21,9 @@ logger = logging.getLogger("django")
 
 
 class IndeedScraper(BaseScraper):
-    def __init__(self, job_title: str):
+    def __init__(
+        self, job_title: str, browser_pool: BrowserPool | None = None, page_fetcher: PageFetcher | None = None
+    ):
         selectors = {
             "link": "a[href*='/rc/clk']",
             "title": '[data-testid="jobsearch-JobInfoHeader-title"]',
@@ -33,6 +36,8 @@ class IndeedScraper(BaseScraper):
             selectors,
             query_params,
             self.indeed_next_page_logic,
+            browser_pool,
+            page_fetcher,
         )
 
     def format_link(self, vacancy: ElementHandle):
@@ -4,12 +4,15 @@ from playwright.sync_api import ElementHandle, Page
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 from .shared.base_scraper import BaseScraper
+from .shared.utils import BrowserPool, PageFetcher
 
 logger = logging.getLogger("django")
 
 
 class SHScraper(BaseScraper):
-    def __init__(self, job_title: str):
+    def __init__(
+        self, job_title: str, browser_pool: BrowserPool | None = None, page_fetcher: PageFetcher | None = None
+    ):
         selectors = {
             "link": "a[href*='/job/']",
             "title": '[data-testid="viewJobTitle"]',
@@ -22,6 +25,8 @@ class SHScraper(BaseScraper):
             selectors,
             query_params,
             self.sh_next_page_logic,
+            browser_pool,
+            page_fetcher,
         )
 
     def format_link(self, vacancy: ElementHandle):
@@ -1,8 +1,8 @@
 import logging
 from abc import ABC, abstractmethod
-from collections import Counter
 from urllib.parse import urlencode
 
+from bs4 import BeautifulSoup
 from playwright.sync_api import ElementHandle, Page
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from tenacity import RetryError, Retrying, stop_after_attempt, wait_random_exponential
@@ -37,13 +37,30 @@ class AbstractScraper(ABC):
         Processes the content of a vacancy to extract and count relevant skills.
         """
 
+    @abstractmethod
+    def process_all_vacancy_contents(
+        self, vacancies_without_skills: list[dict[str, str]], keyword_processor: KeywordProcessor
+    ):
+        """
+        Processes the contents of many vacancies at once to extract and count relevant skills.
+        """
+
 
 class BaseScraper(AbstractScraper):
     """
     A base class for web scraping using Playwright.
+
+    Vacancy pages are fetched over plain HTTP first if a page fetcher is given, since many of them are
+    rendered on the server, and in the browser only if the title or content is missing from the HTML.
     """
 
-    def __init__(self, job_title, search_url, selectors, query_params, next_page_logic):
+    # After this many pages in a row lacking the selectors in their HTML, the site is assumed to render
+    # its pages by scripts or block plain HTTP clients, so the rest of the pages are fetched in the browser.
+    max_http_misses_in_row = 5
+
+    def __init__(
+        self, job_title, search_url, selectors, query_params, next_page_logic, browser_pool=None, page_fetcher=None
+    ):
         """
         Args:
             job_title (str): The job title to run scrapers with.
@@ -51,12 +68,30 @@ class BaseScraper(AbstractScraper):
             selectors (dict): CSS selectors for various elements to scrape.
             query_params (dict): Query parameters for the URL.
             next_page_logic (function): A function to navigate to the next page in pagination.
+            browser_pool (BrowserPool | None): A browser shared by the scrapers of a command run. Defaults to None,
+                                               i.e. a new browser is launched for each page.
+            page_fetcher (PageFetcher | None): A rate-limited fetcher of vacancy pages over HTTP, tried before
+                                               the browser. Defaults to None, i.e. only the browser is used.
         """
         self.job_title = job_title
         self.search_url = search_url
         self.selectors = selectors
         self.query_params = query_params
         self.next_page_logic = next_page_logic
+        self.browser_pool = browser_pool
+        self.page_fetcher = page_fetcher
+        self.http_misses_in_row = 0
+
+    def get_page(self):
+        """
+        Returns a context manager with a page of the shared browser, or of a new one if there is no pool.
+
+        Returns:
+            ContextManager[Page]: A context manager that yields the page to navigate.
+        """
+        if self.browser_pool is not None:
+            return self.browser_pool.page()
+        return get_playwright_page()
 
     def next_page(self, page: Page, page_number: int):
         """
@@ -110,7 +145,7 @@ class BaseScraper(AbstractScraper):
         Returns:
             set: A set of all extracted vacancy URLs across all pages.
         """
-        with get_playwright_page() as page:
+        with self.get_page() as page:
             page_number = 1
             all_links = set()
             page.goto(f"{self.search_url}?{urlencode(self.query_params)}")
@@ -125,9 +160,76 @@ class BaseScraper(AbstractScraper):
                     break
             return all_links
 
+    def parse_vacancy_html(self, link: str, html: bytes | str):
+        """
+        Parses the title and content of a vacancy from the HTML of its page, using the same selectors as the browser.
+
+        Args:
+            link (str): The URL of the vacancy page.
+            html (bytes | str): The HTML of the vacancy page.
+
+        Returns:
+            dict | None: A dictionary containing vacancy details such as URL, title, and content,
+                         or None if the title or content is missing.
+        """
+        soup = BeautifulSoup(html, "lxml")
+        title = soup.select_one(self.selectors["title"])
+        content = soup.select_one(self.selectors["content"])
+        if title is None or content is None:
+            return None
+
+        # The text is joined the same way as by text_content() of the browser.
+        title, content = title.get_text().strip(), content.get_text().strip()
+        if title and content:
+            return {"url": link, "title": title, "content": content}
+
+    def fetch_vacancy_page_over_http(self, link: str):
+        """
+        Fetches and parses a vacancy page over plain HTTP, without running its scripts.
+
+        Args:
+            link (str): The URL of the vacancy page.
+
+        Returns:
+            dict | None: A dictionary containing vacancy details such as URL, title, and content,
+                         or None if the page can't be fetched or its HTML lacks them.
+        """
+        html = self.page_fetcher.fetch(link)
+        return self.parse_vacancy_html(link, html) if html else None
+
+    def is_http_enabled(self):
+        """
+        Checks if vacancy pages are still worth fetching over HTTP before the browser.
+
+        Returns:
+            bool: True if there is a page fetcher and it hasn't missed too many pages in a row.
+        """
+        return self.page_fetcher is not None and self.http_misses_in_row < self.max_http_misses_in_row
+
+    def count_http_result(self, vacancy):
+        # Track the misses in a row, after which the rest of the pages are fetched in the browser straight away.
+        self.http_misses_in_row = 0 if vacancy else self.http_misses_in_row + 1
+
     def fetch_vacancy_page(self, link: str):
         """
-        Fetches and parses the content of a specific vacancy page.
+        Fetches and parses the content of a specific vacancy page, over HTTP first if possible.
+
+        Args:
+            link (str): The URL of the vacancy page.
+
+        Returns:
+            dict: A dictionary containing vacancy details such as URL, title, and content.
+        """
+        if self.is_http_enabled():
+            vacancy = self.fetch_vacancy_page_over_http(link)
+            self.count_http_result(vacancy)
+            if vacancy:
+                return vacancy
+        return self.fetch_vacancy_page_in_browser(link)
+
+    def fetch_vacancy_page_in_browser(self, link: str):
+        """
+        Fetches and parses the content of a specific vacancy page in the browser.
 
         Args:
             link (str): The URL of the vacancy page.
@@ -136,7 +238,7 @@ class BaseScraper(AbstractScraper):
             dict: A dictionary containing vacancy details such as URL, title, and content.
         """
         try:
-            with get_playwright_page() as page:
+            with self.get_page() as page:
                 try:
                     for attempt in Retrying(stop=stop_after_attempt(3), wait=wait_random_exponential(min=0.1, max=1)):
                         with attempt:
@@ -155,22 +257,51 @@ class BaseScraper(AbstractScraper):
         except Exception as e:
             logger.error(f"Error fetching vacancy page: {link}", exc_info=e)
 
-    def fetch_all_vacancy_pages(self, links: set[str]):
+    def fetch_all_vacancy_pages(self, links: set[str], on_vacancy=None):
         """
         Fetches all vacancy pages from a set of links.
 
+        The pages are fetched concurrently over HTTP first, within the rate limit of the page fetcher,
+        and the ones that can't be parsed from their HTML are then fetched in the browser one by one.
+
         Args:
             links (set[str]): A set of vacancy page URLs.
+            on_vacancy (Callable[[dict], None] | None): A function called with each vacancy as soon as it's
+                                                        fetched, e.g. to checkpoint it. Defaults to None.
 
         Returns:
             list: A list of dictionaries, each containing details of a vacancy.
         """
         vacancies_without_skills = list()
-        # NOTE: Fetching pages concurrently results in bot detection.
-        for link in links:
-            result = self.fetch_vacancy_page(link)
+        links_for_browser = list(links)
+        if self.is_http_enabled() and links:
+            links_for_browser = list()
+            pending_links = set(links)
+            fetched_pages = self.page_fetcher.fetch_all(links)
+            for link, html in fetched_pages:
+                pending_links.discard(link)
+                vacancy = self.parse_vacancy_html(link, html) if html else None
+                self.count_http_result(vacancy)
+                if vacancy:
+                    vacancies_without_skills.append(vacancy)
+                    if on_vacancy is not None:
+                        on_vacancy(vacancy)
+                else:
+                    links_for_browser.append(link)
+                if not self.is_http_enabled():
+                    # Cancel the pages that haven't been fetched yet and leave them to the browser.
+                    fetched_pages.close()
+                    break
+            links_for_browser.extend(pending_links)
+
+        # NOTE: Fetching pages concurrently in the browser results in bot detection,
+        # besides the sync API of Playwright can only be used from the thread that started it.
+        for link in links_for_browser:
+            result = self.fetch_vacancy_page_in_browser(link)
             if result:
                 vacancies_without_skills.append(result)
+                if on_vacancy is not None:
+                    on_vacancy(result)
         return vacancies_without_skills
 
     def process_vacancy_content(self, vacancy_without_skills: dict[str, str], keyword_processor: KeywordProcessor):
@@ -186,8 +317,31 @@ class BaseScraper(AbstractScraper):
         """
         try:
             content = vacancy_without_skills["content"]
-            if keywords_found := keyword_processor.extract_keywords(content):
-                return {**vacancy_without_skills, "rated_skills": Counter(keywords_found)}
+            if rated_skills := keyword_processor.count_keywords(content):
+                return {**vacancy_without_skills, "rated_skills": rated_skills}
         except TypeError:
             logger.warning("TypeError occurred while processing vacancy content.")
             return vacancy_without_skills
+
+    def process_all_vacancy_contents(
+        self, vacancies_without_skills: list[dict[str, str]], keyword_processor: KeywordProcessor, processes: int = 1
+    ):
+        """
+        Processes the contents of many vacancies at once to extract and count relevant skills.
+
+        Args:
+            vacancies_without_skills (list[dict[str, str]]): A list of dictionaries containing vacancy details.
+            keyword_processor (KeywordProcessor): An instance of KeywordProcessor.
+            processes (int): The number of processes to spread the extraction across. Defaults to 1.
+
+        Returns:
+            list: A list of dictionaries with vacancy details and extracted skills, skipping vacancies without skills.
+        """
+        vacancies_without_skills = [vacancy for vacancy in vacancies_without_skills if vacancy is not None]
+        contents = (vacancy["content"] for vacancy in vacancies_without_skills)
+        all_rated_skills = keyword_processor.count_keywords_many(contents, processes=processes)
+        return [
+            {**vacancy_without_skills, "rated_skills": rated_skills}
+            for vacancy_without_skills, rated_skills in zip(vacancies_without_skills, all_rated_skills)
+            if rated_skills
+        ]
@@ -1,13 +1,21 @@
 import logging
 import random
+from collections.abc import Callable
+from functools import partial
 
 from django.core.management.base import BaseCommand
 from django.db import OperationalError
+from django.utils import timezone
 
-from keyword_processor import KeywordProcessor
-from scrapers.models import Job, Skill, Vacancy
+from core.utils.common import precompute_tailored_skills
+from core.utils.scraping import ScrapeCheckpoint
+from core.utils.skills import get_skills_matcher
+from core.utils.vacancies import cache_vacancy_shards
+from scrapers.models import Job, Vacancy
+from scrapers.views import LIMIT_OF_SKILLS
 
 from .base_scraper import BaseScraper
+from .utils import BrowserPool, PageFetcher
 
 logger = logging.getLogger("django")
 
@@ -24,59 +32,128 @@ class GenericScrapingCommand(BaseCommand):
     help = "Generic command for scraping job vacancies."
 
     scraper_class: type[BaseScraper]
-    keyword_processor = KeywordProcessor()
     site_name: str
+    # The pace of fetching vacancy pages over HTTP, which each site tolerates differently.
+    # It's lowered on the fly whenever the site responds with timeouts or challenge pages.
+    requests_per_second: float = 0.5
+    max_workers: int = 2
+    # How many job titles of the site are scraped at once in the orchestrated runs, see scrapers.tasks.
+    concurrent_job_titles: int = 2
 
     def handle(self, *args, **options):
         """
         The main method called when the command is run. It orchestrates the scraping process.
         """
-        logger.info(f"🚀 {self.site_name} launched to parse!")
+        # Resume the run that has stopped within the scrape window, e.g. after a worker crash.
+        checkpoint = ScrapeCheckpoint(f"scrape_checkpoint:{self.site_name}")
+        if checkpoint.start():
+            logger.info(f"⏯️ {self.site_name} resumed to parse from where it stopped!")
+        else:
+            logger.info(f"🚀 {self.site_name} launched to parse!")
 
         jobs = list(Job.objects.values_list("title", flat=True))
-        skills = {
-            skill["clean_name"]: skill["unclean_names"]
-            for skill in Skill.objects.values("clean_name", "unclean_names")
-        }
-
         # Shuffle the list of jobs each time to prevent timeout errors for
         # the same jobs and subsequent constant data loss.
         random.shuffle(jobs)
-        vacancies_parsed = 0
-
-        for job_title in jobs:
-            try:
-                existing_links = Vacancy.objects.filter(url__contains=self.site_name).values_list("url", flat=True)
-
-                scraper = self.scraper_class(job_title)
-                all_links = scraper.scan_all_search_results()
-                new_links = set(all_links) - set(existing_links)
-                vacancies_without_skills = scraper.fetch_all_vacancy_pages(new_links)
-
-                self.keyword_processor.add_keywords_from_dict(skills)
-
-                collected_jobs = [
-                    scraper.process_vacancy_content(vacancy, self.keyword_processor)
-                    for vacancy in vacancies_without_skills
-                    if vacancy is not None
-                ]
-
-                all_jobs = (
-                    Vacancy(
-                        url=job["url"],
-                        title=job["title"],
-                        content=job["content"],
-                        rated_skills=job["rated_skills"],
+        new_vacancies = self.scrape_job_titles(jobs, checkpoint=checkpoint)
+
+        # Append the new vacancies to the cached shards of their days, so that resumes are matched against them too,
+        # and refresh the skills of the job titles and the cached search results. The days are taken from
+        # the checkpoints, which include the vacancies saved before a restart.
+        if days_parsed := checkpoint.get_days():
+            cache_vacancy_shards(days_parsed)
+            precompute_tailored_skills(limits=(LIMIT_OF_SKILLS, None))
+        checkpoint.clear()
+
+        logger.info(f"💃🕺 {self.site_name} finished to parse: {len(new_vacancies)} in total!")
+
+    def scrape_job_titles(
+        self,
+        job_titles: list[str],
+        claim_links: Callable[[set[str]], set[str]] | None = None,
+        concurrency: int = 1,
+        checkpoint: ScrapeCheckpoint | None = None,
+    ) -> list[Vacancy]:
+        """
+        Scrapes the new vacancies of the job titles one by one and saves them to the database.
+
+        Args:
+            job_titles (list[str]): The job titles to scrape.
+            claim_links (Callable[[set[str]], set[str]] | None): A function that leaves out the links that other
+                                                                 work units of an orchestrated run have already
+                                                                 taken. Defaults to None.
+            concurrency (int): How many scrapings of the site share its rate, e.g. the work units of the site
+                               scraped at once. Defaults to 1.
+            checkpoint (ScrapeCheckpoint | None): The started checkpoints to save the progress of each job title to
+                                                  and resume it from. Defaults to None.
+
+        Returns:
+            list[Vacancy]: The new vacancies.
+        """
+        # Load the compiled skills matcher once per run instead of inserting every skill for each job title.
+        keyword_processor = get_skills_matcher()
+        new_vacancies = []
+
+        # Launch the browser once for the whole run, instead of once per page, and fetch the vacancy pages
+        # rendered on the server over kept-alive HTTP connections, without the browser at all.
+        page_fetcher = PageFetcher(
+            requests_per_second=self.requests_per_second / concurrency, max_workers=self.max_workers
+        )
+        with BrowserPool() as browser_pool, page_fetcher:
+            for job_title in job_titles:
+                if checkpoint is not None and checkpoint.is_completed(job_title):
+                    logger.info(f"⏭️ {job_title} – already parsed from {self.site_name} in this run")
+                    continue
+
+                try:
+                    existing_links = Vacancy.objects.filter(url__contains=self.site_name).values_list("url", flat=True)
+                    existing_links = set(existing_links)
+
+                    scraper = self.scraper_class(job_title, browser_pool=browser_pool, page_fetcher=page_fetcher)
+                    new_links, fetched_vacancies, on_vacancy = None, [], None
+                    if checkpoint is not None:
+                        new_links = checkpoint.get_links(job_title)
+                        # The vacancies saved before the restart are among the existing links by now.
+                        fetched_vacancies = [
+                            vacancy
+                            for link, vacancy in checkpoint.get_pages(job_title).items()
+                            if link not in existing_links
+                        ]
+                        on_vacancy = partial(checkpoint.save_page, job_title)
+
+                    if new_links is None:
+                        all_links = scraper.scan_all_search_results()
+                        new_links = set(all_links) - existing_links
+                        if claim_links is not None:
+                            new_links = claim_links(new_links)
+                        if checkpoint is not None:
+                            checkpoint.save_links(job_title, new_links)
+
+                    links_to_fetch = new_links - existing_links - {vacancy["url"] for vacancy in fetched_vacancies}
+                    vacancies_without_skills = fetched_vacancies + scraper.fetch_all_vacancy_pages(
+                        links_to_fetch, on_vacancy=on_vacancy
                     )
-                    for job in collected_jobs
-                    if job is not None
-                )
-                new_vacancies = Vacancy.objects.bulk_create(all_jobs)
-                number_of_new_vacancies = len(new_vacancies)
-                vacancies_parsed += number_of_new_vacancies
-                logger.info(f"👍 {job_title} – {number_of_new_vacancies} vacancies parsed from {self.site_name}")
-
-            except OperationalError:
-                logger.warning(f"Got an OperationalError for {job_title}.")
-
-        logger.info(f"💃🕺 {self.site_name} finished to parse: {vacancies_parsed} in total!")
+
+                    collected_jobs = scraper.process_all_vacancy_contents(vacancies_without_skills, keyword_processor)
+
+                    all_jobs = [
+                        Vacancy(
+                            url=job["url"],
+                            title=job["title"],
+                            content=job["content"],
+                            rated_skills=job["rated_skills"],
+                        )
+                        for job in collected_jobs
+                    ]
+                    if checkpoint is not None:
+                        checkpoint.save_days({timezone.localdate(vacancy.created_date) for vacancy in all_jobs})
+                    job_vacancies = Vacancy.objects.bulk_create(all_jobs)
+                    new_vacancies.extend(job_vacancies)
+                    if checkpoint is not None:
+                        checkpoint.complete(job_title)
+                    logger.info(f"👍 {job_title} – {len(job_vacancies)} vacancies parsed from {self.site_name}")
+
+                except OperationalError:
+                    logger.warning(f"Got an OperationalError for {job_title}.")
+
+        return new_vacancies
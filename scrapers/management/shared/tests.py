@@ -1,15 +1,32 @@
-from unittest.mock import Mock, create_autospec
+import gzip
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from unittest.mock import Mock, create_autospec, patch
+from urllib.parse import quote, unquote
+from uuid import uuid4
 
 import pytest
-from django.core.management import call_command
+from django.core.management import call_command, load_command_class
 from django.db import OperationalError
 from django.utils import timezone
 from playwright.sync_api import Error, Page
 
+from core.utils.celery import redis_client
+from core.utils.scraping import ScrapeCheckpoint
+from keyword_processor import KeywordProcessor
 from scrapers.models import Vacancy
+from scrapers.views import LIMIT_OF_SKILLS
 
+from ..hh_scraper import HHScraper
+from ..indeed_scraper import IndeedScraper
+from ..sh_scraper import SHScraper
 from .base_scraper import BaseScraper
-from .utils import get_playwright_page, get_user_agent
+from .utils import BrowserPool, HttpClient, PageFetcher, TokenBucket, get_playwright_page, get_user_agent
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
 
 
 def test_get_playwright_page():
@@ -21,6 +38,389 @@ def test_get_playwright_page():
         _ = page.title()
 
 
+class TestBrowserPool:
+    @pytest.fixture
+    def mock_playwright(self, monkeypatch):
+        mock_sync_playwright = Mock()
+        monkeypatch.setattr("scrapers.management.shared.utils.sync_playwright", mock_sync_playwright)
+        playwright = mock_sync_playwright.return_value.start.return_value
+        browser = playwright.firefox.launch.return_value
+        browser.is_connected.return_value = True
+        # Every new page is a separate object, which isn't closed until the test closes it.
+        browser.new_context.return_value.new_page.side_effect = lambda: Mock(**{"is_closed.return_value": False})
+        return playwright
+
+    def test_browser_is_launched_once(self, mock_playwright):
+        with BrowserPool(pages_per_context=10) as browser_pool:
+            pages = []
+            for _ in range(5):
+                with browser_pool.page() as page:
+                    pages.append(page)
+        assert mock_playwright.firefox.launch.call_count == 1
+        assert len(set(map(id, pages))) == 1
+        assert browser_pool.pages_served == 5
+        assert browser_pool.contexts_created == 1
+        mock_playwright.firefox.launch.return_value.close.assert_called_once()
+        mock_playwright.stop.assert_called_once()
+
+    def test_context_is_rotated(self, mock_playwright):
+        browser = mock_playwright.firefox.launch.return_value
+        with BrowserPool(pages_per_context=2) as browser_pool:
+            for _ in range(5):
+                with browser_pool.page():
+                    pass
+        assert browser_pool.contexts_created == 3
+        assert browser.new_context.call_count == 3
+        assert all("user_agent" in call_args.kwargs for call_args in browser.new_context.call_args_list)
+        assert browser.new_context.return_value.close.call_count == 3
+        assert mock_playwright.firefox.launch.call_count == 1
+
+    def test_closed_page_and_disconnected_browser_are_replaced(self, mock_playwright):
+        browser = mock_playwright.firefox.launch.return_value
+        with BrowserPool() as browser_pool:
+            with browser_pool.page() as page:
+                page.is_closed.return_value = True
+            with browser_pool.page() as new_page:
+                assert new_page is not page
+            browser.is_connected.return_value = False
+            with browser_pool.page():
+                pass
+        assert mock_playwright.firefox.launch.call_count == 2
+        assert browser_pool.contexts_created == 2
+
+    def test_unused_pool_does_not_launch_browser(self, mock_playwright):
+        with BrowserPool():
+            pass
+        assert mock_playwright.firefox.launch.call_count == 0
+
+    def test_scraper_gets_pages_from_pool(self):
+        browser_pool = Mock()
+        scraper = BaseScraper("Python developer", "https://example.com", {}, {}, None, browser_pool)
+        assert scraper.get_page() is browser_pool.page.return_value
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    # Serves the fixture pages over kept-alive connections, recording the client port of each request.
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        path = unquote(self.path.split("?")[0])
+        if path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/vacancy")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if path == "/challenge":
+            self.send_error(503)
+            return
+        if path == "/truncated":
+            body = gzip.compress((FIXTURES_DIR / "sh_vacancy.html").read_bytes())[:-100]
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path not in ("/vacancy", "/vacancy/разработчик", "/close"):
+            self.send_error(404)
+            return
+
+        body = (FIXTURES_DIR / "sh_vacancy.html").read_bytes()
+        self.send_response(200)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if path == "/close":
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    server.client_ports = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestHttpClient:
+    def test_connection_is_kept_alive(self, server):
+        with HttpClient() as http_client:
+            pages = [http_client.get(f"{server.url}/vacancy") for _ in range(3)]
+        assert pages == [(FIXTURES_DIR / "sh_vacancy.html").read_bytes()] * 3
+        assert len(set(server.client_ports)) == 1
+        assert http_client.connections_opened == 1
+
+    def test_redirect_is_followed(self, server):
+        with HttpClient() as http_client:
+            assert http_client.get(f"{server.url}/redirect") == (FIXTURES_DIR / "sh_vacancy.html").read_bytes()
+        assert http_client.requests_sent == 2
+
+    def test_error_response_returns_none(self, server):
+        with HttpClient() as http_client:
+            assert http_client.get(f"{server.url}/missing") is None
+
+    def test_closed_connection_is_reopened(self, server):
+        with HttpClient() as http_client:
+            assert http_client.get(f"{server.url}/close")
+            assert http_client.get(f"{server.url}/vacancy")
+            # A connection dropped without notice fails on the next request and is retried on a new one.
+            next(iter(http_client._connections.values())).sock.close()
+            assert http_client.get(f"{server.url}/vacancy")
+        assert len(set(server.client_ports)) == 3
+        assert http_client.connections_opened == 3
+
+
+@pytest.mark.parametrize(
+    "scraper_class, fixture_name, expected_title, expected_phrase",
+    [
+        (HHScraper, "hh_vacancy.html", "Python-разработчик", "Опыт работы с PostgreSQL и Redis"),
+        (IndeedScraper, "indeed_vacancy.html", "Python Developer - job post", "Familiarity with AWS and Kubernetes"),
+        (SHScraper, "sh_vacancy.html", "Python Developer", "Experience with Flask or FastAPI"),
+    ],
+)
+def test_parse_vacancy_html(scraper_class, fixture_name, expected_title, expected_phrase):
+    scraper = scraper_class("Python developer")
+
+    vacancy = scraper.parse_vacancy_html("link_1", (FIXTURES_DIR / fixture_name).read_bytes())
+
+    assert vacancy["url"] == "link_1"
+    assert vacancy["title"] == expected_title
+    assert expected_phrase in vacancy["content"]
+    assert "window." not in vacancy["content"]
+
+
+class FakeClock:
+    # A monotonic clock that only moves when the code under test sleeps.
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    def test_requests_are_spaced_out_after_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+
+        delays = [bucket.acquire() for _ in range(5)]
+
+        assert delays == [0, 0, 0.5, 0.5, 0.5]
+        assert clock.now == 1.5
+
+    def test_idle_time_refills_up_to_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, burst=2, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+
+        clock.now += 60
+
+        assert [bucket.acquire() for _ in range(3)] == [0, 0, 1]
+
+    def test_jitter_is_added_to_waits(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, burst=10, jitter=0.5, clock=clock, sleep=clock.sleep)
+
+        delays = [bucket.acquire() for _ in range(5)]
+
+        assert all(0 <= delay <= 0.5 for delay in delays)
+
+    def test_penalties_back_off_and_rewards_recover(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, min_backoff=5, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+
+        bucket.penalize()
+        assert bucket.rate == 0.5
+        # The next request waits for the regular interval plus the pause.
+        assert bucket.acquire() == pytest.approx(2 + 5)
+
+        bucket.penalize()
+        assert bucket.rate == 0.25
+        assert bucket.backoff == 20
+        assert bucket.acquire() == pytest.approx(4 + 10)
+
+        for _ in range(20):
+            bucket.reward()
+        assert bucket.rate == 1
+        assert bucket.backoff == 5
+
+    def test_rate_is_not_lowered_below_minimum(self):
+        bucket = TokenBucket(rate=1, max_backoff=10)
+
+        for _ in range(10):
+            bucket.penalize()
+
+        assert bucket.rate == bucket.min_rate == 1 / 8
+        assert bucket.backoff == 10
+
+
+class TestPageFetcher:
+    @pytest.fixture
+    def page_fetcher(self):
+        with PageFetcher(requests_per_second=1000, max_workers=2, jitter=0) as page_fetcher:
+            yield page_fetcher
+
+    def test_fetch(self, server, page_fetcher):
+        assert page_fetcher.fetch(f"{server.url}/vacancy") == (FIXTURES_DIR / "sh_vacancy.html").read_bytes()
+        assert page_fetcher.fetch(f"{server.url}/missing") is None
+
+    def test_fetch_non_ascii_url(self, server, page_fetcher):
+        page = (FIXTURES_DIR / "sh_vacancy.html").read_bytes()
+        assert page_fetcher.fetch(f"{server.url}/vacancy/разработчик") == page
+        # The escaped characters aren't escaped twice.
+        assert page_fetcher.fetch(f"{server.url}/vacancy/{quote('разработчик')}") == page
+
+    def test_malformed_response_is_miss(self, server, page_fetcher):
+        assert page_fetcher.fetch(f"{server.url}/truncated") is None
+        assert page_fetcher.buckets[f"127.0.0.1:{server.server_address[1]}"].rate == 500
+
+    def test_challenge_slows_host_down(self, server, page_fetcher):
+        assert page_fetcher.fetch(f"{server.url}/challenge") is None
+
+        bucket = page_fetcher.buckets[f"127.0.0.1:{server.server_address[1]}"]
+        assert bucket.rate == 500
+
+    @pytest.mark.parametrize(
+        "status, body, expected",
+        [
+            (200, (FIXTURES_DIR / "sh_vacancy.html").read_bytes(), False),
+            (429, b"", True),
+            (200, b"<html><head><title>Just a moment...</title></head></html>", True),
+            (200, b'<script src="/cdn-cgi/challenge-platform/h/b/orchestrate/jsch/v1"></script>', True),
+        ],
+    )
+    def test_is_challenge(self, page_fetcher, status, body, expected):
+        assert page_fetcher.is_challenge(status, body) is expected
+
+    def test_connection_error_slows_host_down(self, page_fetcher, monkeypatch):
+        monkeypatch.setattr(HttpClient, "fetch", Mock(side_effect=TimeoutError))
+
+        assert page_fetcher.fetch("http://example.com/vacancy") is None
+        assert page_fetcher.buckets["example.com"].rate == 500
+
+    def test_fetch_all_reuses_threads_and_connections(self, server, page_fetcher):
+        urls = [f"{server.url}/vacancy?id={idx}" for idx in range(6)]
+
+        first_pages = dict(page_fetcher.fetch_all(urls))
+        second_pages = dict(page_fetcher.fetch_all([*urls, f"{server.url}/missing"]))
+
+        assert set(first_pages) == set(urls)
+        assert all(first_pages.values())
+        assert second_pages[f"{server.url}/missing"] is None
+        assert len(set(server.client_ports)) <= page_fetcher.max_workers
+
+    def test_fetch_all_is_cancelled_on_close(self, page_fetcher, monkeypatch):
+        # Each page takes a while, so that most of them are still queued when the iterator is closed.
+        monkeypatch.setattr(page_fetcher, "fetch", Mock(side_effect=lambda url: time.sleep(0.05) or b"page"))
+        fetched_pages = page_fetcher.fetch_all([f"link_{idx}" for idx in range(100)])
+
+        next(fetched_pages)
+        fetched_pages.close()
+        page_fetcher.close()
+
+        assert page_fetcher.fetch.call_count < 100
+
+
+class TestFetchVacancyPage:
+    @pytest.fixture
+    def scraper(self):
+        scraper = HHScraper("Python developer", browser_pool=Mock(), page_fetcher=Mock())
+        scraper.fetch_vacancy_page_in_browser = Mock(
+            side_effect=lambda link: {"url": link, "title": "Job", "content": "Text"}
+        )
+        return scraper
+
+    def test_server_rendered_page_is_fetched_without_browser(self, scraper):
+        scraper.page_fetcher.fetch.return_value = (FIXTURES_DIR / "hh_vacancy.html").read_bytes()
+
+        vacancy = scraper.fetch_vacancy_page("link_1")
+
+        assert vacancy["title"] == "Python-разработчик"
+        scraper.fetch_vacancy_page_in_browser.assert_not_called()
+        scraper.browser_pool.page.assert_not_called()
+
+    @pytest.mark.parametrize("response", [(FIXTURES_DIR / "client_rendered_vacancy.html").read_bytes(), None])
+    def test_browser_is_fallback(self, scraper, response):
+        scraper.page_fetcher.fetch.return_value = response
+
+        vacancy = scraper.fetch_vacancy_page("link_1")
+
+        assert vacancy == {"url": "link_1", "title": "Job", "content": "Text"}
+        scraper.fetch_vacancy_page_in_browser.assert_called_once_with("link_1")
+
+    def test_http_is_skipped_after_misses_in_row(self, scraper):
+        scraper.page_fetcher.fetch.return_value = (FIXTURES_DIR / "client_rendered_vacancy.html").read_bytes()
+
+        for idx in range(scraper.max_http_misses_in_row + 3):
+            scraper.fetch_vacancy_page(f"link_{idx}")
+
+        assert scraper.page_fetcher.fetch.call_count == scraper.max_http_misses_in_row
+        assert scraper.fetch_vacancy_page_in_browser.call_count == scraper.max_http_misses_in_row + 3
+
+    def test_scraper_without_page_fetcher_uses_browser(self, scraper):
+        scraper.page_fetcher = None
+
+        scraper.fetch_vacancy_page("link_1")
+
+        scraper.fetch_vacancy_page_in_browser.assert_called_once_with("link_1")
+
+    def test_fetch_all_vacancy_pages_falls_back_to_browser_for_misses(self, scraper):
+        pages = {
+            "link_1": (FIXTURES_DIR / "hh_vacancy.html").read_bytes(),
+            "link_2": (FIXTURES_DIR / "client_rendered_vacancy.html").read_bytes(),
+            "link_3": None,
+        }
+        scraper.page_fetcher.fetch_all.side_effect = lambda links: ((link, pages[link]) for link in links)
+
+        vacancies = scraper.fetch_all_vacancy_pages(set(pages))
+
+        assert {vacancy["url"]: vacancy["title"] for vacancy in vacancies} == {
+            "link_1": "Python-разработчик",
+            "link_2": "Job",
+            "link_3": "Job",
+        }
+        assert {call_args.args[0] for call_args in scraper.fetch_vacancy_page_in_browser.call_args_list} == {
+            "link_2",
+            "link_3",
+        }
+
+    def test_fetch_all_vacancy_pages_stops_http_after_misses_in_row(self, scraper):
+        links = {f"link_{idx}" for idx in range(20)}
+        fetched_links = []
+
+        def fetch_all(links):
+            for link in links:
+                fetched_links.append(link)
+                yield link, None
+
+        scraper.page_fetcher.fetch_all.side_effect = fetch_all
+
+        vacancies = scraper.fetch_all_vacancy_pages(links)
+
+        assert len(fetched_links) == scraper.max_http_misses_in_row
+        assert {vacancy["url"] for vacancy in vacancies} == links
+
+
 @pytest.mark.parametrize(
     "os_name, expected_agent",
     [("darwin", "Mac"), ("windows", "Windows"), ("linux", "Linux")],
@@ -31,8 +431,66 @@ def test_get_user_agent(monkeypatch, os_name, expected_agent):
     assert expected_agent in user_agent
 
 
+def test_process_all_vacancy_contents():
+    keyword_processor = KeywordProcessor()
+    keyword_processor.add_keywords_from_dict({"Python": ["python"], "Django": ["django"]})
+    scraper = BaseScraper("Python developer", "https://example.com", {}, {}, None)
+    vacancies_without_skills = [
+        {"url": "link_1", "title": "Job 1", "content": "Python, Django and more Python"},
+        None,
+        {"url": "link_2", "title": "Job 2", "content": "No skills here"},
+    ]
+
+    collected_jobs = scraper.process_all_vacancy_contents(vacancies_without_skills, keyword_processor)
+
+    assert collected_jobs == [
+        {
+            "url": "link_1",
+            "title": "Job 1",
+            "content": "Python, Django and more Python",
+            "rated_skills": {"Python": 2, "Django": 1},
+        }
+    ]
+
+
+@pytest.mark.django_db
+def test_rerate_vacancies_command(caplog):
+    vacancy = Vacancy.objects.create(
+        url="http://unique-url.com/rerate",
+        content="Python developer with Django",
+        rated_skills={"Outdated skill": 1},
+    )
+
+    call_command("rerate_vacancies", processes=1, batch_size=100)
+
+    vacancy.refresh_from_db()
+    assert vacancy.rated_skills == {"Python": 1, "Django": 1}
+    assert "vacancies successfully re-rated" in caplog.text
+
+
 @pytest.mark.django_db
-def test_purge_db_command(caplog):
+def test_rerate_vacancies_command_starts_pool_once():
+    vacancy = Vacancy.objects.create(
+        url="http://unique-url.com/rerate",
+        content="Python developer with Django",
+        rated_skills={"Outdated skill": 1},
+    )
+
+    with patch.object(
+        KeywordProcessor, "worker_pool", autospec=True, side_effect=KeywordProcessor.worker_pool
+    ) as mock_worker_pool:
+        call_command("rerate_vacancies", processes=2, batch_size=100)
+
+    assert mock_worker_pool.call_count == 1
+    assert Vacancy.objects.count() > 100
+    vacancy.refresh_from_db()
+    assert vacancy.rated_skills == {"Python": 1, "Django": 1}
+
+
+@pytest.mark.django_db
+def test_purge_db_command(monkeypatch, caplog):
+    mock_precompute = Mock()
+    monkeypatch.setattr("scrapers.management.commands.purge_db.precompute_tailored_skills", mock_precompute)
     past_date = timezone.now() - timezone.timedelta(days=8)
     recent_date = timezone.now() - timezone.timedelta(days=1)
 
@@ -52,6 +510,8 @@ def test_purge_db_command(caplog):
     assert Vacancy.objects.filter(created_date=past_date).count() == 0
     assert Vacancy.objects.filter(created_date=recent_date).count() == 1
     assert "Database successfully cleaned from" in caplog.text
+    # The skills of the job titles are refreshed when the command is run by hand too.
+    mock_precompute.assert_called_once_with(limits=(LIMIT_OF_SKILLS, None))
 
 
 @pytest.mark.parametrize(
@@ -64,27 +524,54 @@ def test_purge_db_command(caplog):
 )
 @pytest.mark.django_db
 class TestScrapingCommands:
+    @pytest.fixture(autouse=True)
+    def checkpoint_prefix(self, monkeypatch):
+        # Keep the checkpoints of the tests apart, since they may run in parallel.
+        prefix = f"test_{uuid4().hex}"
+        monkeypatch.setattr(
+            "scrapers.management.shared.generic_command.ScrapeCheckpoint",
+            lambda key: ScrapeCheckpoint(f"{prefix}:{key}"),
+        )
+        return prefix
+
+    @pytest.fixture(autouse=True)
+    def mock_precompute(self, monkeypatch):
+        mock_precompute = Mock()
+        monkeypatch.setattr("scrapers.management.shared.generic_command.precompute_tailored_skills", mock_precompute)
+        return mock_precompute
+
     @pytest.fixture
     def mock_scraper(self):
         mock = create_autospec(BaseScraper, instance=True)
         mock.scan_all_search_results.return_value = {"link_1", "link_2"}
         mock.fetch_all_vacancy_pages.return_value = [{"url": "link_1", "title": "Job 1", "content": "Content 1"}]
-        mock.process_vacancy_content.return_value = {
-            "url": "link_1",
-            "title": "Job 1",
-            "content": "Content 1",
-            "rated_skills": {"Skill 1": 1, "Skill 2": 2},
-        }
+        mock.process_all_vacancy_contents.return_value = [
+            {
+                "url": "link_1",
+                "title": "Job 1",
+                "content": "Content 1",
+                "rated_skills": {"Skill 1": 1, "Skill 2": 2},
+            }
+        ]
         return mock
 
-    def test_handle_normal_operation(self, monkeypatch, site_name, command_name, scraper_path, mock_scraper, caplog):
+    def test_handle_normal_operation(
+        self, monkeypatch, site_name, command_name, scraper_path, mock_scraper, mock_precompute, caplog
+    ):
         monkeypatch.setattr("scrapers.models.Job.objects.values_list", Mock(return_value=["Developer", "Designer"]))
         monkeypatch.setattr("scrapers.models.Vacancy.objects.bulk_create", Mock(return_value=[]))
-        monkeypatch.setattr(scraper_path, Mock(return_value=mock_scraper))
+        scraper_class = Mock(return_value=mock_scraper)
+        monkeypatch.setattr(scraper_path, scraper_class)
 
         call_command(command_name)
 
         assert f"vacancies parsed from {site_name}" in caplog.text
+        # The skills of the job titles are refreshed when the command is run by hand too.
+        mock_precompute.assert_called_once_with(limits=(LIMIT_OF_SKILLS, None))
+        # All the scrapers of the run share the same browser pool and page fetcher.
+        browser_pools = {id(call_args.kwargs["browser_pool"]) for call_args in scraper_class.call_args_list}
+        page_fetchers = {id(call_args.kwargs["page_fetcher"]) for call_args in scraper_class.call_args_list}
+        assert len(browser_pools) == len(page_fetchers) == 1
 
     def test_handle_with_operational_error(
         self, monkeypatch, site_name, command_name, scraper_path, mock_scraper, caplog
@@ -97,3 +584,79 @@ class TestScrapingCommands:
 
         assert "Got an OperationalError for" in caplog.text
         assert f"💃🕺 {site_name} finished to parse" in caplog.text
+
+    def test_handle_resumes_stopped_run(
+        self, monkeypatch, site_name, command_name, scraper_path, mock_scraper, checkpoint_prefix, caplog
+    ):
+        checkpoint = ScrapeCheckpoint(f"{checkpoint_prefix}:scrape_checkpoint:{site_name}")
+        checkpoint.start()
+        checkpoint.save_links("Developer", set())
+        # The vacancies of the job title were inserted before the restart.
+        yesterday = timezone.localdate() - timedelta(days=1)
+        checkpoint.save_days([yesterday])
+        checkpoint.complete("Developer")
+        monkeypatch.setattr("scrapers.models.Job.objects.values_list", Mock(return_value=["Developer", "Designer"]))
+        monkeypatch.setattr("scrapers.models.Vacancy.objects.bulk_create", Mock(return_value=[]))
+        scraper_class = Mock(return_value=mock_scraper)
+        monkeypatch.setattr(f"scrapers.management.commands.{command_name}.Command.scraper_class", scraper_class)
+        mock_cache_vacancy_shards = Mock()
+        monkeypatch.setattr(
+            "scrapers.management.shared.generic_command.cache_vacancy_shards", mock_cache_vacancy_shards
+        )
+
+        call_command(command_name)
+
+        assert f"{site_name} resumed to parse" in caplog.text
+        assert f"Developer – already parsed from {site_name}" in caplog.text
+        assert [call_args.args for call_args in scraper_class.call_args_list] == [("Designer",)]
+        # The shards of the days of the vacancies saved before the restart are rebuilt too.
+        mock_cache_vacancy_shards.assert_called_once_with({yesterday, timezone.localdate()})
+        # The next run starts afresh.
+        assert not redis_client.exists(checkpoint.key)
+
+
+@pytest.mark.django_db
+def test_scrape_job_titles_in_orchestrated_run():
+    mock_scraper = create_autospec(BaseScraper, instance=True)
+    mock_scraper.scan_all_search_results.return_value = {"link_1", "link_2"}
+    mock_scraper.fetch_all_vacancy_pages.return_value = []
+    mock_scraper.process_all_vacancy_contents.return_value = []
+    scraper_class = Mock(return_value=mock_scraper)
+    command = load_command_class("scrapers", "scrape_hh")
+    command.scraper_class = scraper_class
+
+    command.scrape_job_titles(["Developer"], claim_links=lambda links: links - {"link_2"}, concurrency=2)
+
+    assert mock_scraper.fetch_all_vacancy_pages.call_args.args == ({"link_1"},)
+    # The work units of the site scraped at once share its rate.
+    page_fetcher = scraper_class.call_args.kwargs["page_fetcher"]
+    assert page_fetcher.requests_per_second == command.requests_per_second / 2
+
+
+@pytest.mark.django_db
+def test_scrape_job_titles_resumes_from_checkpoint():
+    checkpoint = ScrapeCheckpoint(f"test_scrape_checkpoint:{uuid4().hex}")
+    checkpoint.start()
+    fetched_vacancy = {"url": "link_1", "title": "Job 1", "content": "Content 1"}
+    checkpoint.save_links("Developer", {"link_1", "link_2", "link_3"})
+    checkpoint.save_page("Developer", fetched_vacancy)
+    mock_scraper = create_autospec(BaseScraper, instance=True)
+    mock_scraper.fetch_all_vacancy_pages.return_value = [{"url": "link_2", "title": "Job 2", "content": "Content 2"}]
+    mock_scraper.process_all_vacancy_contents.return_value = []
+    command = load_command_class("scrapers", "scrape_hh")
+    command.scraper_class = Mock(return_value=mock_scraper)
+
+    try:
+        command.scrape_job_titles(["Developer"], checkpoint=checkpoint)
+
+        # Neither the search is scanned again nor the fetched pages are refetched.
+        mock_scraper.scan_all_search_results.assert_not_called()
+        assert mock_scraper.fetch_all_vacancy_pages.call_args.args == ({"link_2", "link_3"},)
+        vacancies_without_skills = mock_scraper.process_all_vacancy_contents.call_args.args[0]
+        assert [vacancy["url"] for vacancy in vacancies_without_skills] == ["link_1", "link_2"]
+        # The pages fetched from now on are saved as they come.
+        on_vacancy = mock_scraper.fetch_all_vacancy_pages.call_args.kwargs["on_vacancy"]
+        assert on_vacancy.args == ("Developer",)
+        assert checkpoint.is_completed("Developer")
+    finally:
+        checkpoint.clear()
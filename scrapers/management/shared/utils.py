@@ -1,8 +1,19 @@
+import gzip
+import logging
 import platform
-from contextlib import contextmanager
+import random
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, suppress
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from threading import Lock, local
+from urllib.parse import quote, urljoin, urlsplit
 
 from faker import Faker
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import Browser, BrowserContext, Error, Page, Playwright, sync_playwright
+
+logger = logging.getLogger("django")
 
 
 def get_user_agent():
@@ -40,3 +51,456 @@ def get_playwright_page():
         context.close()
         browser.close()
         playwright.stop()
+
+
+class BrowserPool:
+    """A Playwright browser shared by all the pages of a scraper run.
+
+    Launching Firefox takes seconds, while navigating an already open page takes a fraction
+    of that, so the pool starts Playwright and the browser once, on the first page requested,
+    and hands out the same page for every navigation. The context, and with it the user agent
+    and cookies, is replaced after a number of pages, so that a long run doesn't look like a
+    single visitor. A closed page or a disconnected browser is replaced on the next request.
+
+    The pool isn't thread-safe, just like the sync API of Playwright it's built on.
+
+    Attributes:
+        pages_per_context (int): How many pages are served by a context before it's replaced.
+        contexts_created (int): Number of contexts created so far.
+        pages_served (int): Number of pages served so far.
+
+    Args:
+        pages_per_context (int): How many pages are served by a context before it's replaced. Defaults to 50.
+    """
+
+    def __init__(self, pages_per_context: int = 50) -> None:
+        self.pages_per_context = pages_per_context
+        self.contexts_created = 0
+        self.pages_served = 0
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+        self._context: BrowserContext | None = None
+        self._page: Page | None = None
+        self._context_pages_served = 0
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _close_context(self) -> None:
+        if self._context is not None:
+            # Closing the context closes its page too. It's already gone if the browser has disconnected.
+            with suppress(Error):
+                self._context.close()
+        self._context = self._page = None
+
+    def _new_context(self) -> None:
+        self._close_context()
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        if self._browser is None or not self._browser.is_connected():
+            self._browser = self._playwright.firefox.launch(headless=True)
+        self._context = self._browser.new_context(
+            user_agent=get_user_agent(), viewport={"width": 1920, "height": 1080}
+        )
+        self._context_pages_served = 0
+        self.contexts_created += 1
+
+    @contextmanager
+    def page(self) -> Iterator[Page]:
+        """
+        Yields the page of the current context, rotating the context when it has served enough pages.
+
+        Yields:
+            Page: The page to navigate.
+        """
+        browser_disconnected = self._browser is not None and not self._browser.is_connected()
+        if self._context is None or browser_disconnected or self._context_pages_served >= self.pages_per_context:
+            self._new_context()
+        if self._page is None or self._page.is_closed():
+            self._page = self._context.new_page()
+
+        self._context_pages_served += 1
+        self.pages_served += 1
+        yield self._page
+
+    def close(self) -> None:
+        """
+        Closes the context and the browser, and stops Playwright.
+        """
+        try:
+            self._close_context()
+            if self._browser is not None:
+                self._browser.close()
+        finally:
+            if self._playwright is not None:
+                self._playwright.stop()
+            self._browser = self._playwright = None
+
+
+class HttpClient:
+    """A lightweight HTTP client that keeps a connection alive to each host.
+
+    Unlike a browser, it doesn't run scripts or load the resources of a page, so it only suits
+    pages whose content is rendered on the server, but it fetches them in a fraction of the time
+    of a navigation. The connection to a host is reused between requests, saving the TCP and TLS
+    handshakes, and is reopened once if the server has closed it in the meantime.
+
+    The client isn't thread-safe.
+
+    Attributes:
+        timeout (float): The timeout of connecting and reading, in seconds.
+        max_redirects (int): How many redirects are followed before giving up on a URL.
+        headers (dict[str, str]): The headers sent with every request.
+        requests_sent (int): Number of requests sent so far, including redirects and retries.
+        connections_opened (int): Number of connections opened so far.
+
+    Args:
+        timeout (float): The timeout of connecting and reading, in seconds. Defaults to 10.
+        max_redirects (int): How many redirects are followed before giving up on a URL. Defaults to 5.
+    """
+
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, timeout: float = 10, max_redirects: int = 5) -> None:
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.headers = {
+            "User-Agent": get_user_agent(),
+            "Accept": "text/html,application/xhtml+xml",
+            "Accept-Encoding": "gzip",
+            "Accept-Language": "en-US,en;q=0.9",
+        }
+        self.requests_sent = 0
+        self.connections_opened = 0
+        self._connections: dict[tuple[str, str], HTTPConnection] = {}
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_connection(self, scheme: str, netloc: str) -> HTTPConnection:
+        if (connection := self._connections.get((scheme, netloc))) is None:
+            connection_class = HTTPSConnection if scheme == "https" else HTTPConnection
+            connection = self._connections[scheme, netloc] = connection_class(netloc, timeout=self.timeout)
+            self.connections_opened += 1
+        return connection
+
+    def _drop_connection(self, scheme: str, netloc: str) -> None:
+        if (connection := self._connections.pop((scheme, netloc), None)) is not None:
+            connection.close()
+
+    def _request(self, url: str) -> tuple[int, str | None, bytes]:
+        # Send a GET request and read the whole response, so that the connection can be reused.
+        parts = urlsplit(url)
+        path = f"{parts.path or '/'}?{parts.query}" if parts.query else parts.path or "/"
+        # Percent-encode the non-ASCII characters of the path, which http.client can't send as they are,
+        # leaving the reserved and already escaped ones intact.
+        path = quote(path, safe="/?#[]@!$&'()*+,;=:%~")
+        for attempt in range(2):
+            connection = self._get_connection(parts.scheme, parts.netloc)
+            try:
+                self.requests_sent += 1
+                connection.request("GET", path, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, HTTPException):
+                # A kept-alive connection may have been closed by the server, so it's retried once on a new one.
+                self._drop_connection(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+            else:
+                if response.will_close:
+                    self._drop_connection(parts.scheme, parts.netloc)
+                if response.getheader("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                return response.status, response.getheader("Location"), body
+
+    def fetch(self, url: str) -> tuple[int, bytes]:
+        """
+        Fetches a page, following redirects.
+
+        Args:
+            url (str): The URL of the page.
+
+        Raises:
+            OSError: If the connection fails or times out twice in a row.
+            HTTPException: If the response can't be parsed twice in a row.
+
+        Returns:
+            tuple[int, bytes]: The status and body of the last response, which is a redirect if there were too many.
+        """
+        for _ in range(self.max_redirects + 1):
+            status, location, body = self._request(url)
+            if status not in self.REDIRECT_STATUSES or not location:
+                break
+            url = urljoin(url, location)
+        return status, body
+
+    def get(self, url: str) -> bytes | None:
+        """
+        Fetches the body of a page, following redirects.
+
+        Args:
+            url (str): The URL of the page.
+
+        Raises:
+            OSError: If the connection fails or times out twice in a row.
+            HTTPException: If the response can't be parsed twice in a row.
+
+        Returns:
+            bytes | None: The body of the page, or None if it responded with an error or redirected too many times.
+        """
+        status, body = self.fetch(url)
+        return body if 200 <= status < 300 else None
+
+    def close(self) -> None:
+        """
+        Closes all the open connections.
+        """
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+
+class TokenBucket:
+    """A token bucket that spaces out the requests to a host, slowing down when the host pushes back.
+
+    Every request takes a token, and tokens are refilled at the rate up to the burst size. A caller
+    that finds the bucket empty reserves the next token and sleeps until it's due, so concurrent
+    callers are served in the order they came. A random jitter is added on top of each wait, so
+    that the requests don't arrive at a machine-like pace.
+
+    The rate adapts to how the host responds: a timeout or a challenge page halves it and pauses
+    the bucket, for twice as long on each penalty in a row, while every successful request brings
+    the rate back by a tenth of the configured one.
+
+    Attributes:
+        base_rate (float): The configured rate, in requests per second.
+        rate (float): The current rate, in requests per second.
+        min_rate (float): The rate isn't lowered below this on penalties.
+        burst (int): The maximum number of tokens in the bucket.
+        jitter (float): The maximum random delay added to each wait, in seconds.
+        backoff (float): The pause on the next penalty, in seconds.
+
+    Args:
+        rate (float): The rate of requests per second.
+        burst (int): The maximum number of tokens in the bucket. Defaults to 1.
+        jitter (float): The maximum random delay added to each wait, in seconds. Defaults to 0.
+        min_backoff (float): The pause on the first penalty in a row, in seconds. Defaults to 5.
+        max_backoff (float): The longest pause on penalties, in seconds. Defaults to 5 minutes.
+        clock (Callable[[], float]): The monotonic clock. Defaults to time.monotonic.
+        sleep (Callable[[float], None]): The function to wait with. Defaults to time.sleep.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        jitter: float = 0,
+        min_backoff: float = 5,
+        max_backoff: float = 5 * 60,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.base_rate = self.rate = rate
+        self.min_rate = rate / 8
+        self.burst = burst
+        self.jitter = jitter
+        self.min_backoff = self.backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._lock = Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> float:
+        """
+        Takes a token, sleeping until it's available.
+
+        Returns:
+            float: How long the caller has slept, in seconds.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            # A negative balance is the queue of callers that reserved the upcoming tokens.
+            delay = max(0.0, -self._tokens / self.rate)
+        delay += random.uniform(0, self.jitter)  # nosec B311
+        if delay > 0:
+            self._sleep(delay)
+        return delay
+
+    def penalize(self) -> None:
+        """
+        Halves the rate and pauses the bucket, e.g. after a timeout or a challenge page.
+        """
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0) - self.backoff * self.rate
+            self.backoff = min(self.max_backoff, self.backoff * 2)
+
+    def reward(self) -> None:
+        """
+        Brings the rate back towards the configured one after a successful request.
+        """
+        with self._lock:
+            self._refill()
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+            self.backoff = self.min_backoff
+
+
+class PageFetcher:
+    """Fetches pages over HTTP with a small pool of threads, within a rate limit of each host.
+
+    Each thread has its own kept-alive `HttpClient`, while the requests to a host are spaced out
+    by its `TokenBucket`, so the concurrency only hides the latency of the responses instead of
+    raising the rate the host sees. Timeouts, connection errors and challenge pages of bot
+    protection slow the host down, see `TokenBucket.penalize`.
+
+    Attributes:
+        requests_per_second (float): The rate of requests to each host.
+        max_workers (int): The number of threads fetching the pages.
+        buckets (dict[str, TokenBucket]): The rate limits by hosts.
+
+    Args:
+        requests_per_second (float): The rate of requests to each host. Defaults to 1.
+        max_workers (int): The number of threads fetching the pages. Defaults to 2.
+        burst (int): The number of requests to a host that can be sent at once. Defaults to 1.
+        jitter (float): The maximum random delay added before each request, in seconds. Defaults to 0.5.
+        timeout (float): The timeout of connecting and reading, in seconds. Defaults to 10.
+    """
+
+    CHALLENGE_STATUSES = (403, 429, 503)
+    # Markers of the challenge pages served by bot protections instead of the content, looked for at the top of a page.
+    CHALLENGE_MARKERS = (b"challenge-platform", b"cf-chl", b"<title>just a moment", b"px-captcha", b"hcaptcha.com")
+
+    def __init__(
+        self,
+        requests_per_second: float = 1,
+        max_workers: int = 2,
+        burst: int = 1,
+        jitter: float = 0.5,
+        timeout: float = 10,
+    ) -> None:
+        self.requests_per_second = requests_per_second
+        self.max_workers = max_workers
+        self.burst = burst
+        self.jitter = jitter
+        self.timeout = timeout
+        self.buckets: dict[str, TokenBucket] = {}
+        self._buckets_lock = Lock()
+        self._local = local()
+        self._clients: list[HttpClient] = []
+        self._executor: ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> "PageFetcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_bucket(self, host: str) -> TokenBucket:
+        with self._buckets_lock:
+            if (bucket := self.buckets.get(host)) is None:
+                bucket = self.buckets[host] = TokenBucket(self.requests_per_second, self.burst, self.jitter)
+            return bucket
+
+    def _get_client(self) -> HttpClient:
+        # The clients aren't thread-safe, so each thread keeps its own connections.
+        if (http_client := getattr(self._local, "http_client", None)) is None:
+            http_client = self._local.http_client = HttpClient(timeout=self.timeout)
+            with self._buckets_lock:
+                self._clients.append(http_client)
+        return http_client
+
+    def is_challenge(self, status: int, body: bytes) -> bool:
+        """
+        Checks if a response is a challenge of bot protection or rate limiting instead of the page.
+
+        Args:
+            status (int): The status of the response.
+            body (bytes): The body of the response.
+
+        Returns:
+            bool: True if the response is a challenge.
+        """
+        head = body[: 16 * 1024].lower()
+        return status in self.CHALLENGE_STATUSES or any(marker in head for marker in self.CHALLENGE_MARKERS)
+
+    def fetch(self, url: str) -> bytes | None:
+        """
+        Fetches the body of a page once the rate limit of its host allows it.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            bytes | None: The body of the page, or None if it failed, responded with an error or a challenge.
+        """
+        bucket = self._get_bucket(urlsplit(url).netloc)
+        bucket.acquire()
+        try:
+            status, body = self._get_client().fetch(url)
+        # Any failure of a page is a miss that is left to the browser, e.g. a truncated gzip body,
+        # so that a single bad link doesn't abort the whole run.
+        except Exception as e:
+            bucket.penalize()
+            logger.warning(f"Error fetching page over HTTP: {url} ({e!r})")
+            return None
+
+        if self.is_challenge(status, body):
+            bucket.penalize()
+            logger.warning(
+                f"Got a challenge instead of page: {url} ({status}), slowing down to {bucket.rate:.2f} rps."
+            )
+            return None
+        bucket.reward()
+        return body if 200 <= status < 300 else None
+
+    def fetch_all(self, urls: Iterable[str]) -> Iterator[tuple[str, bytes | None]]:
+        """
+        Lazily fetches many pages concurrently, yielding them as soon as they are fetched.
+
+        The pages that haven't been started yet are cancelled once the iterator is closed.
+
+        Args:
+            urls (Iterable[str]): The URLs of the pages.
+
+        Yields:
+            tuple[str, bytes | None]: The URL and body of a page, see `fetch`.
+        """
+        if self._executor is None:
+            # The threads outlive a single call, so that their connections are reused by the next ones.
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="page_fetcher")
+
+        futures = {self._executor.submit(self.fetch, url): url for url in urls}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        """
+        Stops the threads and closes their connections.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        with self._buckets_lock:
+            for http_client in self._clients:
+                http_client.close()
+            self._clients.clear()
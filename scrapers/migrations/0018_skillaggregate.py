@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("scrapers", "0017_enable_pg_trgm_20231107_1639"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SkillAggregate",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("number_of_vacancies", models.PositiveIntegerField()),
+                ("rated_skills", models.JSONField()),
+                ("updated_date", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "job",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="skill_aggregate", to="scrapers.job"
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -2,12 +2,22 @@ import uuid
 from urllib.parse import urlencode
 
 from django.contrib.postgres.indexes import GinIndex
-from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.search import SearchQuery, SearchVectorField
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 
 
+class VacancyQuerySet(models.QuerySet):
+    def search(self, query: str) -> "VacancyQuerySet":
+        """Filter vacancies by a full-text query, which is served by the GIN index on the search vector."""
+        return self.filter(search_vector=SearchQuery(query))
+
+    def for_skills(self) -> "VacancyQuerySet":
+        """Load only the rated skills, skipping the large content and search vector columns."""
+        return self.only("id", "rated_skills")
+
+
 class Vacancy(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     url = models.URLField(max_length=255, unique=True)
@@ -17,6 +27,8 @@ class Vacancy(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     search_vector = SearchVectorField(null=True)
 
+    objects = VacancyQuerySet.as_manager()
+
     def __str__(self):
         """Return human-readable vacancy title for the record in the admin."""
         return self.title
@@ -55,6 +67,18 @@ class Job(models.Model):
         ordering = ["title"]
 
 
+class SkillAggregate(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name="skill_aggregate")
+    number_of_vacancies = models.PositiveIntegerField()
+    rated_skills = models.JSONField()
+    updated_date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        """Return human-readable job title of the aggregate for the record in the admin."""
+        return self.job.title
+
+
 class Search(models.Model):
     id = models.BigAutoField(primary_key=True)
     query = models.CharField(max_length=255)
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.utils.skills import SKILLS_CHANGED_KEY
+from resume_analyzer.tasks import task_warmup_cache
+
+from .models import Skill
+
+
+def schedule_skills_refresh():
+    # Mark the skills as changed before enqueuing the warmup, so that a warmup that is already running picks it up once done.
+    cache.set(SKILLS_CHANGED_KEY, True, None)
+    task_warmup_cache.delay()
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def refresh_skills_matcher_on_change(sender, raw=False, **kwargs):
+    # Swap every process to a freshly built skills matcher once the change is committed. Fixtures loaded
+    # with loaddata are skipped, since the warmup builds the matcher anyway when its snapshot is missing.
+    if raw:
+        return
+    transaction.on_commit(schedule_skills_refresh)
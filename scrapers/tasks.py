@@ -1,28 +1,147 @@
+import random
+
 from celery import shared_task
-from django.core.management import call_command
+from celery.utils.log import get_task_logger
+from django.core.management import call_command, load_command_class
+from django.utils import timezone
+
+from core.utils.celery import keep_lock_renewed, lock_task, redis_client
+from core.utils.common import precompute_tailored_skills
+from core.utils.scraping import ScrapeRun, acquire_site_slot
+from core.utils.vacancies import cache_vacancy_shards
+
+from .models import Job
+from .views import LIMIT_OF_SKILLS
+
+logger = get_task_logger(__name__)
 
-from core.utils.celery import lock_task
+# The scraping tasks are acknowledged once done, so that the task of a crashed worker is delivered again and resumes
+# from the checkpoints, while their locks are renewed as long as they run, so that the lock of a crashed worker is
+# freed within a minute instead of expiring in the middle of a long run. The runs last longer than the default
+# consumer timeout of RabbitMQ, which has to be raised, see docker-compose.yml. Otherwise the broker redelivers a task
+# that is still running, and the copy is merely skipped by the lock, while the channel of the worker is closed.
+
+# The commands that scrape each site in the orchestrated runs.
+SCRAPING_COMMANDS = {"hh.ru": "scrape_hh", "indeed.com": "scrape_indeed", "simplyhired.com": "scrape_sh"}
+
+
+@shared_task(ignore_result=True)
+@lock_task("lock:precompute_tailored_skills", timeout=60)
+def task_precompute_tailored_skills():
+    # Warm up the searches for every job title, which the sitemap links to, both for the web page and the full list.
+    precompute_tailored_skills(limits=(LIMIT_OF_SKILLS, None))
 
 
 @shared_task(ignore_result=True)
 @lock_task("lock:purge_db", timeout=60)
 def task_purge_db():
+    # The command refreshes the skills of the job titles itself, since it's also run by hand.
     call_command("purge_db")
 
 
-@shared_task(ignore_result=True)
-@lock_task("lock:scrape_hh", timeout=60)
+def scrape_site(site: str):
+    # A site scraped by its own task during an orchestrated run would be scraped at up to twice its rate.
+    if (current_run := ScrapeRun.get_current()) is not None:
+        logger.info(f"Skipping {site}, since scraping run {current_run.run_id} is in progress.")
+        return
+
+    # The command refreshes the skills of the job titles itself, since it's also run by hand.
+    call_command(SCRAPING_COMMANDS[site])
+
+
+@shared_task(ignore_result=True, acks_late=True, reject_on_worker_lost=True)
+@lock_task("lock:scrape_hh", timeout=60, auto_renew=True)
 def task_scrape_hh():
-    call_command("scrape_hh")
+    scrape_site("hh.ru")
 
 
-@shared_task(ignore_result=True)
-@lock_task("lock:scrape_indeed", timeout=60)
+@shared_task(ignore_result=True, acks_late=True, reject_on_worker_lost=True)
+@lock_task("lock:scrape_indeed", timeout=60, auto_renew=True)
 def task_scrape_indeed():
-    call_command("scrape_indeed")
+    scrape_site("indeed.com")
 
 
-@shared_task(ignore_result=True)
-@lock_task("lock:scrape_sh", timeout=60)
+@shared_task(ignore_result=True, acks_late=True, reject_on_worker_lost=True)
+@lock_task("lock:scrape_sh", timeout=60, auto_renew=True)
 def task_scrape_sh():
-    call_command("scrape_sh")
+    scrape_site("simplyhired.com")
+
+
+@shared_task(ignore_result=True)
+@lock_task("lock:scrape_all", timeout=60)
+def task_scrape_all():
+    # Fan out every site and job title as a separate work unit onto the scraping queue, see CELERY_TASK_ROUTES.
+    if (current_run := ScrapeRun.get_current()) is not None:
+        logger.info(f"Scraping run {current_run.run_id} is still in progress.")
+        return
+    # Nor is a run started while a site is scraped by its own task, see scrape_site().
+    busy_sites = [site for site, command in SCRAPING_COMMANDS.items() if redis_client.exists(f"lock:{command}")]
+    if busy_sites:
+        logger.info(f"Scraping run is skipped, since {', '.join(busy_sites)} is being scraped by its own task.")
+        return
+
+    job_titles = list(Job.objects.values_list("title", flat=True))
+    units = [(site, job_title) for site in SCRAPING_COMMANDS for job_title in job_titles]
+    # Shuffle the units to interleave the sites and prevent timeout errors for the same jobs each time.
+    random.shuffle(units)
+    run = ScrapeRun.start(units)
+    for site, job_title in units:
+        task_scrape_job_title.delay(run.run_id, site, job_title)
+    logger.info(f"🚀 Scraping run {run.run_id} launched with {len(units)} work units.")
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=None, acks_late=True, reject_on_worker_lost=True)
+def task_scrape_job_title(self, run_id: str, site: str, job_title: str):
+    # Scrape a single job title of a site within the limit of the site's work units scraped at once.
+    command = load_command_class("scrapers", SCRAPING_COMMANDS[site])
+    slot = acquire_site_slot(site, command.concurrent_job_titles)
+    if slot is None:
+        # The units of the other sites are taken by the workers in the meantime.
+        raise self.retry(countdown=random.uniform(10, 30))  # nosec B311
+
+    run = ScrapeRun(run_id)
+    checkpoint = run.get_checkpoint(site)
+    # A work unit delivered again after a worker crash resumes its job title, or skips it if it has been completed.
+    checkpoint.start()
+    new_vacancies, failed = [], False
+    try:
+        # A slow unit keeps its slot however long it takes, so that the limit of the site holds.
+        with keep_lock_renewed(slot, slot.timeout / 3):
+            new_vacancies = command.scrape_job_titles(
+                [job_title],
+                claim_links=run.claim_links,
+                concurrency=command.concurrent_job_titles,
+                checkpoint=checkpoint,
+            )
+    except Exception as e:
+        failed = True
+        logger.error(f"Error scraping {job_title} from {site}.", exc_info=e)
+    finally:
+        if slot.owned():
+            slot.release()
+
+    days = {timezone.localdate(vacancy.created_date) for vacancy in new_vacancies}
+    finished, total = run.finish_unit(site, job_title, len(new_vacancies), days, failed)
+    logger.info(f"📈 Scraping run {run_id}: {finished}/{total} work units finished.")
+    if finished == total:
+        task_finish_scrape_run.delay(run_id)
+
+
+@shared_task(ignore_result=True)
+def task_finish_scrape_run(run_id: str):
+    # Append the new vacancies of the run to the cached shards once, instead of after every work unit.
+    run = ScrapeRun(run_id)
+    # The checkpoints include the days of the units delivered again after their vacancies had been inserted.
+    checkpoints = [run.get_checkpoint(site) for site in SCRAPING_COMMANDS]
+    if days := run.get_days().union(*(checkpoint.get_days() for checkpoint in checkpoints)):
+        cache_vacancy_shards(days)
+    for checkpoint in checkpoints:
+        checkpoint.clear()
+    run.finish()
+    task_precompute_tailored_skills.delay()
+
+    for site, progress in run.get_progress()["sites"].items():
+        logger.info(
+            f"💃🕺 {site} finished to parse: {progress['vacancies']} in total, "
+            f"{progress['failed']}/{progress['total']} job titles failed."
+        )
@@ -1,16 +1,35 @@
+from datetime import timedelta
 from pathlib import Path
-from unittest.mock import call, patch
+from unittest.mock import Mock, call, patch
 from urllib.parse import urlencode, urlparse
+from uuid import uuid4
 
 import pytest
+from celery.exceptions import Retry
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from core.tasks import save_query_with_metadata
+from core.utils.celery import redis_client
+from core.utils.scraping import ScrapeRun
 
 from .apps import ScrapersConfig
-from .models import Job, Search, Skill, Vacancy
-from .tasks import task_purge_db, task_scrape_hh, task_scrape_indeed, task_scrape_sh
-from .views import SearchResultsListView
+from .models import Job, Search, Skill, SkillAggregate, Vacancy
+from .tasks import (
+    SCRAPING_COMMANDS,
+    task_finish_scrape_run,
+    task_precompute_tailored_skills,
+    task_purge_db,
+    task_scrape_all,
+    task_scrape_hh,
+    task_scrape_indeed,
+    task_scrape_job_title,
+    task_scrape_sh,
+)
+from .views import LIMIT_OF_SKILLS, SearchResultsListView
 
 
 @pytest.mark.django_db
@@ -72,6 +91,34 @@ class TestSearchResultsListView:
     def test_searchresultslistview_does_not_contain_incorrect_html(self, response):
         assert "Hi there! I should not be on the page." not in response.rendered_content
 
+    def test_searchresultslistview_without_query(self, rf, monkeypatch):
+        monkeypatch.setattr(save_query_with_metadata, "delay", lambda query, user_agent, ip_address: None)
+        response = SearchResultsListView.as_view()(rf.get(self.url))
+        assert response.status_code == 200
+        assert response.context_data["number_of_vacancies"] == 0
+
+
+@pytest.mark.django_db
+class TestVacancyQuerySet:
+    # Columns that are large and never needed by the read paths of search results and tailored skills.
+    large_columns = {"content", "search_vector"}
+
+    def test_for_skills_skips_large_columns(self, fetched_columns):
+        assert list(Vacancy.objects.search("python developer").for_skills())
+        assert set(fetched_columns) == {"id", "rated_skills"}
+
+    def test_search_results_do_not_load_large_columns(self, rf, monkeypatch, settings, fetched_columns):
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        monkeypatch.setattr(save_query_with_metadata, "delay", lambda query, user_agent, ip_address: None)
+        request = rf.get(reverse("search-results"), {"q": "python"})
+        with CaptureQueriesContext(connection) as context:
+            response = SearchResultsListView.as_view()(request).render()
+        assert len(context.captured_queries) == 2
+        assert response.context_data["number_of_vacancies"] > 0
+        # Neither the content nor the search vector of the vacancies is fetched from the database.
+        assert fetched_columns
+        assert not self.large_columns & set(fetched_columns)
+
 
 @pytest.mark.django_db
 class TestVacancyModel:
@@ -108,6 +155,14 @@ class TestJobModel:
         assert query in parsed_url.query
 
 
+@pytest.mark.django_db
+class TestSkillAggregateModel:
+    def test_skillaggregatemodel_str_method(self):
+        job = Job.objects.create(title="Test job")
+        skill_aggregate = SkillAggregate.objects.create(job=job, number_of_vacancies=0, rated_skills=[])
+        assert str(skill_aggregate) == job.title
+
+
 @pytest.mark.django_db
 class TestSearchModel:
     def test_searchmodel_str_method(self):
@@ -159,6 +214,14 @@ class TestScraperTasks:
             task()
             assert mock_call_command.call_count == 0
 
+    def test_skipped_during_orchestrated_run(self, mock_lock, mock_call_command, monkeypatch, caplog):
+        mock_lock.return_value.acquire.return_value = True
+        monkeypatch.setattr("scrapers.tasks.ScrapeRun.get_current", Mock(return_value=ScrapeRun("test_run")))
+        for task in [task_scrape_hh, task_scrape_indeed, task_scrape_sh]:
+            task()
+        assert mock_call_command.call_count == 0
+        assert "Skipping hh.ru, since scraping run test_run is in progress." in caplog.text
+
 
 @patch("scrapers.tasks.call_command")
 @patch("core.utils.celery.redis_client.lock")
@@ -173,3 +236,200 @@ class TestPurgeDBTask:
         mock_lock.return_value.acquire.return_value = False
         task_purge_db()
         assert mock_call_command.call_count == 0
+
+
+class TestOrchestratedScraping:
+    @pytest.fixture(autouse=True)
+    def current_run_key(self, monkeypatch):
+        # Keep the runs of each test apart, since the tests share the Redis server.
+        current_run_key = f"test_scrape_run:{uuid4().hex}"
+        monkeypatch.setattr("core.utils.scraping.CURRENT_SCRAPE_RUN_KEY", current_run_key)
+        monkeypatch.setattr("core.utils.celery.redis_client.lock", Mock())
+        yield
+        redis_client.delete(current_run_key)
+
+    @pytest.fixture
+    def command(self, monkeypatch):
+        command = Mock(concurrent_job_titles=2)
+        command.scrape_job_titles.return_value = [Vacancy(created_date=timezone.now())]
+        monkeypatch.setattr("scrapers.tasks.load_command_class", Mock(return_value=command))
+        return command
+
+    @pytest.fixture
+    def slot(self, monkeypatch):
+        slot = Mock(timeout=60)
+        monkeypatch.setattr("scrapers.tasks.acquire_site_slot", Mock(return_value=slot))
+        return slot
+
+    @pytest.mark.django_db
+    @patch("scrapers.tasks.task_scrape_job_title.delay")
+    def test_task_scrape_all_fans_out_units(self, mock_scrape_job_title):
+        job_titles = set(Job.objects.values_list("title", flat=True))
+
+        task_scrape_all()
+        # Another run doesn't start while the current one is in progress.
+        task_scrape_all()
+
+        units = [call_args.args for call_args in mock_scrape_job_title.call_args_list]
+        assert len(units) == len(SCRAPING_COMMANDS) * len(job_titles)
+        assert {(site, job_title) for _, site, job_title in units} == {
+            (site, job_title) for site in SCRAPING_COMMANDS for job_title in job_titles
+        }
+        run = ScrapeRun.get_current()
+        assert {run_id for run_id, _, _ in units} == {run.run_id}
+        assert run.get_progress()["total"] == len(units)
+
+    @patch("scrapers.tasks.task_scrape_job_title.delay")
+    def test_task_scrape_all_skipped_while_site_scraped_by_its_own_task(self, mock_scrape_job_title, monkeypatch):
+        monkeypatch.setattr("scrapers.tasks.redis_client.exists", lambda key: key == "lock:scrape_indeed")
+
+        task_scrape_all()
+
+        assert mock_scrape_job_title.call_count == 0
+        assert ScrapeRun.get_current() is None
+
+    @patch("scrapers.tasks.task_finish_scrape_run.delay")
+    def test_task_scrape_job_title(self, mock_finish_scrape_run, command, slot):
+        run = ScrapeRun.start([("hh.ru", "Python developer"), ("indeed.com", "Python developer")])
+
+        task_scrape_job_title(run.run_id, "hh.ru", "Python developer")
+
+        assert command.scrape_job_titles.call_args.args == (["Python developer"],)
+        assert command.scrape_job_titles.call_args.kwargs["concurrency"] == 2
+        command.scrape_job_titles.call_args.kwargs["claim_links"](["link_1"])
+        assert run.claim_links(["link_1"]) == set()
+        slot.release.assert_called_once()
+        assert mock_finish_scrape_run.call_count == 0
+
+        task_scrape_job_title(run.run_id, "indeed.com", "Python developer")
+
+        mock_finish_scrape_run.assert_called_once_with(run.run_id)
+        assert run.get_progress()["sites"]["hh.ru"]["vacancies"] == 1
+
+    @patch("scrapers.tasks.task_finish_scrape_run.delay")
+    def test_task_scrape_job_title_counts_failed_unit(self, mock_finish_scrape_run, command, slot, caplog):
+        run = ScrapeRun.start([("hh.ru", "Python developer")])
+        command.scrape_job_titles.side_effect = Exception("Simulated Failure")
+
+        task_scrape_job_title(run.run_id, "hh.ru", "Python developer")
+
+        assert "Error scraping Python developer from hh.ru." in caplog.text
+        assert run.get_progress()["sites"]["hh.ru"]["failed"] == 1
+        slot.release.assert_called_once()
+        mock_finish_scrape_run.assert_called_once_with(run.run_id)
+
+    @patch("scrapers.tasks.task_finish_scrape_run.delay")
+    def test_task_scrape_job_title_does_not_release_lost_slot(self, mock_finish_scrape_run, command, slot):
+        run = ScrapeRun.start([("hh.ru", "Python developer")])
+        # The slot has been lost, e.g. its renewal failed, and taken by another unit.
+        slot.owned.return_value = False
+
+        task_scrape_job_title(run.run_id, "hh.ru", "Python developer")
+
+        assert slot.release.call_count == 0
+        mock_finish_scrape_run.assert_called_once_with(run.run_id)
+
+    @patch("scrapers.tasks.task_finish_scrape_run.delay")
+    def test_task_scrape_job_title_delivered_again(self, mock_finish_scrape_run, command, slot):
+        run = ScrapeRun.start([("hh.ru", "Python developer"), ("indeed.com", "Python developer")])
+
+        task_scrape_job_title(run.run_id, "hh.ru", "Python developer")
+        task_scrape_job_title(run.run_id, "hh.ru", "Python developer")
+
+        # The checkpoint lets the command skip the completed job title, while the run counts it once.
+        assert command.scrape_job_titles.call_args.kwargs["checkpoint"].key == run.get_checkpoint("hh.ru").key
+        assert run.get_progress()["finished"] == 1
+        assert mock_finish_scrape_run.call_count == 0
+
+    def test_task_scrape_job_title_waits_for_site_slot(self, command, monkeypatch):
+        monkeypatch.setattr("scrapers.tasks.acquire_site_slot", Mock(return_value=None))
+        run = ScrapeRun.start([("hh.ru", "Python developer")])
+
+        with pytest.raises(Retry):
+            task_scrape_job_title(run.run_id, "hh.ru", "Python developer")
+
+        assert command.scrape_job_titles.call_count == 0
+        assert run.get_progress()["finished"] == 0
+
+    @patch("scrapers.tasks.task_precompute_tailored_skills.delay")
+    @patch("scrapers.tasks.cache_vacancy_shards")
+    def test_task_finish_scrape_run(self, mock_cache_vacancy_shards, mock_precompute, caplog):
+        run = ScrapeRun.start([("hh.ru", "Python developer"), ("indeed.com", "Python developer")])
+        run.finish_unit("hh.ru", "Python developer", 3, [timezone.localdate()])
+        # A unit delivered again after its vacancies had been inserted finds none new, but its checkpoint has the days.
+        checkpoint = run.get_checkpoint("indeed.com")
+        checkpoint.start()
+        checkpoint.save_days([timezone.localdate() - timedelta(days=1)])
+        run.finish_unit("indeed.com", "Python developer", 0, [])
+
+        task_finish_scrape_run(run.run_id)
+
+        mock_cache_vacancy_shards.assert_called_once_with(
+            {timezone.localdate(), timezone.localdate() - timedelta(days=1)}
+        )
+        assert checkpoint.get_days() == set()
+        assert mock_precompute.call_count == 1
+        assert ScrapeRun.get_current() is None
+        assert "hh.ru finished to parse: 3 in total" in caplog.text
+
+
+@pytest.mark.django_db
+@patch("core.utils.celery.redis_client.lock")
+class TestPrecomputeTailoredSkillsTask:
+    def test_task_precompute_tailored_skills(self, mock_lock):
+        mock_lock.return_value.acquire.return_value = True
+        with patch("scrapers.tasks.precompute_tailored_skills") as mock_precompute:
+            task_precompute_tailored_skills()
+        assert mock_precompute.call_args == call(limits=(LIMIT_OF_SKILLS, None))
+
+    def test_job_title_search_reads_skills_from_cache(self, mock_lock, rf, monkeypatch, settings):
+        # Make room for the skills of every job title, so that the cache doesn't cull its version key.
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "OPTIONS": {"MAX_ENTRIES": 10_000},
+            }
+        }
+        cache.clear()
+        mock_lock.return_value.acquire.return_value = True
+        task_precompute_tailored_skills()
+
+        monkeypatch.setattr(save_query_with_metadata, "delay", lambda query, user_agent, ip_address: None)
+        job = Job.objects.get(title__iexact="python developer")
+        request = rf.get(reverse("search-results"), {"q": job.title})
+        with CaptureQueriesContext(connection) as context:
+            response = SearchResultsListView.as_view()(request)
+            response.render()
+        assert response.context_data["number_of_vacancies"] == job.skill_aggregate.number_of_vacancies > 0
+        assert len(context.captured_queries) == 0
+
+    def test_job_title_with_special_characters_reads_skills_from_cache(
+        self, mock_lock, client, rf, monkeypatch, settings
+    ):
+        settings.CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "OPTIONS": {"MAX_ENTRIES": 10_000},
+            }
+        }
+        cache.clear()
+        job = Job.objects.create(title="R&D engineer")
+        mock_lock.return_value.acquire.return_value = True
+        task_precompute_tailored_skills()
+
+        monkeypatch.setattr(save_query_with_metadata, "delay", lambda query, user_agent, ip_address: None)
+        request = rf.get(reverse("search-results"), {"q": job.title})
+        with CaptureQueriesContext(connection) as context:
+            response = SearchResultsListView.as_view()(request)
+            response.render()
+            api_response = client.get(
+                reverse("tailored-skills-list"), {"q": job.title, "limit": LIMIT_OF_SKILLS}, secure=True
+            )
+        # The query matches the job title and its cache key, instead of its escaped form.
+        assert response.context_data["number_of_vacancies"] == job.skill_aggregate.number_of_vacancies
+        assert api_response.json()["number_of_vacancies"] == job.skill_aggregate.number_of_vacancies
+        assert len(context.captured_queries) == 0
+        # The query is escaped once where it's rendered.
+        assert "R&amp;D engineer" in response.rendered_content
+        assert "R&amp;amp;D engineer" not in response.rendered_content
+        assert api_response.json()["vacancy_name"] == "R&amp;D engineer"
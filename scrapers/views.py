@@ -1,8 +1,7 @@
-from django.contrib.postgres.search import SearchQuery
 from django.views.generic import ListView
 
 from core.tasks import save_query_with_metadata
-from core.utils.common import parse_request, sort_skills
+from core.utils.common import get_cached_tailored_skills, parse_request
 
 from .models import Vacancy
 
@@ -16,8 +15,7 @@ class SearchResultsListView(ListView):
 
     def get_queryset(self):
         query = self.request.GET.get("q", "")
-        search_query = SearchQuery(query)
-        return Vacancy.objects.filter(search_vector=search_query)
+        return Vacancy.objects.search(query).for_skills()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -26,12 +24,12 @@ class SearchResultsListView(ListView):
         save_query_with_metadata.delay(query, user_agent, ip_address)
 
         queryset = context["vacancies"]
-        tailored_skills = sort_skills(queryset)[:LIMIT_OF_SKILLS]
+        number_of_vacancies, tailored_skills = get_cached_tailored_skills(query, queryset, LIMIT_OF_SKILLS)
 
         context.update(
             {
                 "vacancy_name": query,
-                "number_of_vacancies": queryset.count(),
+                "number_of_vacancies": number_of_vacancies,
                 "rated_skills": tailored_skills,
             }
         )